@@ -1,6 +1,23 @@
-import json
+# The client classes are imported on first access (PEP 562), so importing the package
+# (or a light module like il2_rest.enumerations) does not load requests and cryptography.
+_LAZY_ATTRIBUTES = {
+    'RestNode': 'client',
+    'RestNetwork': 'client',
+    'RestChain': 'client',
+}
 
-from .client import RestNode
-from .client import RestNetwork
-from .client import RestChain
+__all__ = list(_LAZY_ATTRIBUTES)
 
+
+def __getattr__(name) :
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None :
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() :
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,358 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Local broker keeping warm connections to the nodes for short-lived client processes.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+import socketserver
+
+
+# Message: sizes of the JSON header and of the body, followed by both
+_SIZES = struct.Struct('>II')
+
+# Headers describing the transfer between the broker and the node, not the body sent to the client
+_TRANSFER_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding', 'content-length'}
+
+# Builtin exceptions sent back to the client with the same type
+_BUILTIN_ERRORS = {error.__name__ : error for error in (ValueError, TypeError, FileNotFoundError, PermissionError)}
+
+
+def default_socket_path() :
+    """
+    Get the default path of the broker socket: the `IL2_BROKER` environment variable or
+    a file of the current user in the runtime (or temporary) folder.
+
+    Returns:
+        :obj:`str`: Path to the Unix socket.
+    """
+    if os.environ.get('IL2_BROKER') :
+        return os.environ['IL2_BROKER']
+    folder = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(folder, f'il2-broker-{os.getuid()}.sock')
+
+
+def _read_exactly(f, size) :
+    data = f.read(size)
+    if len(data) < size :
+        raise EOFError('Connection closed by the broker peer')
+    return data
+
+def _read_message(f) :
+    header_size, body_size = _SIZES.unpack(_read_exactly(f, _SIZES.size))
+    header = json.loads(_read_exactly(f, header_size))
+    return header, _read_exactly(f, body_size)
+
+def _write_message(f, header, body=b'') :
+    data = json.dumps(header).encode('utf-8')
+    f.write(_SIZES.pack(len(data), len(body)) + data)
+    f.write(body)
+    f.flush()
+
+
+class _Handler(socketserver.StreamRequestHandler) :
+    def handle(self) :
+        while True :
+            try :
+                header, body = _read_message(self.rfile)
+            except (EOFError, ConnectionError) :
+                return
+            reply, content = self.server.broker._execute(header, body)
+            _write_message(self.wfile, reply, content)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer) :
+    daemon_threads = True
+
+
+class NodeBroker :
+    """
+    Broker process holding authenticated connections to the nodes, shared by short-lived client processes.
+
+    Creating a :obj:`il2_rest.RestNode` decrypts the PKCS#12 certificate, writes it to a temporary PEM
+    file and needs a new TLS handshake for the first request. The broker keeps a node (and its pool
+    of connections) for each certificate and node address, and the clients in thin mode
+    (:obj:`il2_rest.RestNode` with `broker_path`) forward their requests to it through a Unix socket.
+
+    The socket is only accessible by the user running the broker, and each request carries the
+    certificate password, so the broker only uses a certificate for clients that can open it.
+    The response bodies are buffered, so very large documents are better downloaded directly.
+
+    Args:
+        path (:obj:`str`, optional): Path to the Unix socket (default: :obj:`default_socket_path`).
+        idle_timeout (:obj:`float`, optional): Time in seconds after which an unused node is discarded.
+        node_factory (:obj:`callable`, optional): Function creating the nodes (default: :obj:`il2_rest.RestNode`).
+            It is called with the `cert_file`, `cert_pass`, `address`, `port` and `verify_ca` keyword arguments.
+
+    Example:
+        Run the broker with the ``il2-broker`` command (or :obj:`NodeBroker.serve_forever`) and create the clients with `broker_path`:
+
+        >>> node = RestNode(cert_file='admin.pfx', cert_pass='password', port=32020, broker_path=default_socket_path())
+        >>> node.chains
+    """
+    def __init__(self, path=None, idle_timeout=600, node_factory=None) :
+        self.path = path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self.__node_factory = node_factory
+        # Nodes by connection options: [node, last time used]
+        self.__nodes = {}
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__created = 0
+        self.__requests = 0
+
+    @property
+    def stats(self) :
+        """:obj:`dict`: Number of warm nodes, of nodes created and of requests forwarded."""
+        with self.__lock :
+            return {'nodes': len(self.__nodes), 'created': self.__created, 'requests': self.__requests}
+
+    def node(self, cert_file, cert_pass, address='localhost', port=None, verify_ca=True) :
+        """
+        Get the node for some connection options, creating it if there is no warm node.
+
+        Args:
+            cert_file (:obj:`str`): Path to the .pfx certificate.
+            cert_pass (:obj:`str`): Password of the .pfx certificate.
+            address (:obj:`str`, optional): Address of the node.
+            port (:obj:`int`, optional): Port number to connect.
+            verify_ca (:obj:`bool`, optional): If True, checks CA.
+
+        Returns:
+            :obj:`il2_rest.RestNode`: Node.
+        """
+        key = (os.path.realpath(os.path.expanduser(cert_file)), hashlib.sha256(cert_pass.encode()).digest(), address, port, verify_ca)
+        now = time.monotonic()
+        with self.__lock :
+            self.__requests += 1
+            for other in [k for k, (_, used) in self.__nodes.items() if now - used > self.idle_timeout] :
+                del self.__nodes[other]
+            entry = self.__nodes.get(key)
+            if entry is not None :
+                entry[1] = now
+                return entry[0]
+        # The certificate is decrypted without holding the lock
+        node = self.__create_node(cert_file=key[0], cert_pass=cert_pass, address=address, port=port, verify_ca=verify_ca)
+        with self.__lock :
+            entry = self.__nodes.get(key)
+            if entry is None :
+                entry = self.__nodes[key] = [node, now]
+                self.__created += 1
+            return entry[0]
+
+    def __create_node(self, **options) :
+        if self.__node_factory is not None :
+            return self.__node_factory(**options)
+        from .client import RestNode
+        return RestNode(**options)
+
+    def _execute(self, header, body) :
+        try :
+            node = self.node(**header['node'])
+            timeout = header.get('timeout')
+            response = node._get_session().request(
+                method=header['method'],
+                url=header['url'],
+                headers=header.get('headers'),
+                params=header.get('params'),
+                data=body if header.get('has_body') else None,
+                timeout=tuple(timeout) if isinstance(timeout, list) else (timeout or (node._connect_timeout, node._read_timeout)),
+            )
+            content = response.content
+        except Exception as e :
+            return {'error': type(e).__name__, 'message': str(e)}, b''
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _TRANSFER_HEADERS}
+        return {'status': response.status_code, 'reason': response.reason, 'url': response.url, 'headers': headers}, content
+
+    def serve_forever(self) :
+        """ Listen on the socket and serve the clients until :obj:`NodeBroker.shutdown` is called."""
+        if os.path.exists(self.path) :
+            os.unlink(self.path)
+        # Only the current user can connect to the socket
+        umask = os.umask(0o177)
+        try :
+            self.__server = _Server(self.path, _Handler)
+        finally :
+            os.umask(umask)
+        self.__server.broker = self
+        try :
+            self.__server.serve_forever()
+        finally :
+            self.__server.server_close()
+            if os.path.exists(self.path) :
+                os.unlink(self.path)
+
+    def start(self) :
+        """
+        Serve the clients in a background thread.
+
+        Returns:
+            :obj:`threading.Thread`: Thread serving the clients.
+        """
+        thread = threading.Thread(target=self.serve_forever, name='il2-broker', daemon=True)
+        thread.start()
+        while self.__server is None and thread.is_alive() :
+            time.sleep(0.01)
+        return thread
+
+    def shutdown(self) :
+        """ Stop serving the clients and discard the nodes."""
+        if self.__server is not None :
+            self.__server.shutdown()
+        with self.__lock :
+            self.__nodes.clear()
+
+
+class BrokerSession :
+    """
+    Session forwarding the requests of a node client in thin mode to a :obj:`NodeBroker`.
+
+    It implements the part of :obj:`requests.Session` used by :obj:`il2_rest.RestNode`. The request bodies
+    are read before they are sent and the responses are returned with their content already read.
+
+    Args:
+        path (:obj:`str`): Path to the broker Unix socket.
+        cert_file (:obj:`str`): Path to the .pfx certificate.
+        cert_pass (:obj:`str`): Password of the .pfx certificate.
+        address (:obj:`str`, optional): Address of the node.
+        port (:obj:`int`, optional): Port number to connect.
+        verify_ca (:obj:`bool`, optional): If True, checks CA.
+    """
+    def __init__(self, path, cert_file, cert_pass, address='localhost', port=None, verify_ca=True) :
+        self.path = path
+        self.__node = {'cert_file': os.path.realpath(os.path.expanduser(cert_file)), 'cert_pass': cert_pass,
+                       'address': address, 'port': port, 'verify_ca': verify_ca}
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None, **kwargs) :
+        """
+        Send a request through the broker.
+
+        Args:
+            method (:obj:`str`): HTTP method.
+            url (:obj:`str`): URL.
+            params (:obj:`dict`, optional): Query parameters.
+            data (:obj:`bytes`/:obj:`str`/file/iterable of :obj:`bytes`, optional): Body.
+            headers (:obj:`dict`, optional): Headers.
+            timeout (:obj:`float`/:obj:`tuple`, optional): Connect and read timeouts used by the broker.
+            json (optional): Body to be sent as JSON (instead of `data`).
+
+        Returns:
+            :obj:`requests.Response`: Response.
+
+        Raises:
+            requests.ConnectionError: If the broker is not running.
+        """
+        import requests
+        headers = dict(headers or {})
+        if kwargs.get('json') is not None :
+            data = json.dumps(kwargs['json'], allow_nan=False)
+            if not any(name.lower() == 'content-type' for name in headers) :
+                headers['Content-Type'] = 'application/json'
+        body = self.__read_body(data)
+        header = {'node': self.__node, 'method': method, 'url': url, 'params': params or None, 'headers': headers,
+                  'timeout': list(timeout) if isinstance(timeout, tuple) else timeout, 'has_body': body is not None}
+        try :
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock :
+                sock.connect(self.path)
+                with sock.makefile('rwb') as f :
+                    _write_message(f, header, body or b'')
+                    reply, content = _read_message(f)
+        except (OSError, EOFError) as e :
+            raise requests.ConnectionError(f'Broker not available at {self.path}: {e}')
+        if 'error' in reply :
+            error = getattr(requests.exceptions, reply['error'], None)
+            if not (isinstance(error, type) and issubclass(error, requests.RequestException)) :
+                error = _BUILTIN_ERRORS.get(reply['error'], requests.RequestException)
+            raise error(reply['message'])
+        return self.__response(reply, content)
+
+    def get(self, url, **kwargs) :
+        """ Send a GET request (see :obj:`BrokerSession.request`)."""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) :
+        """ Send a POST request (see :obj:`BrokerSession.request`)."""
+        return self.request('POST', url, **kwargs)
+
+    def close(self) :
+        """ Nothing to be closed, each request uses a new connection to the broker."""
+
+    @staticmethod
+    def __read_body(data) :
+        if data is None or isinstance(data, bytes) :
+            return data
+        if isinstance(data, str) :
+            return data.encode('utf-8')
+        if hasattr(data, 'read') :
+            return data.read()
+        return b''.join(data)
+
+    @staticmethod
+    def __response(reply, content) :
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        response = requests.Response()
+        response.status_code = reply['status']
+        response.reason = reply['reason']
+        response.url = reply['url']
+        response.headers = CaseInsensitiveDict(reply['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+        response.raw = io.BytesIO(content)
+        return response
+
+
+def main(argv=None) :
+    """ Entry point of the `il2-broker` command."""
+    parser = argparse.ArgumentParser(prog='il2-broker', description='Keep warm connections to InterlockLedger nodes for short-lived clients.')
+    parser.add_argument('--socket', default=default_socket_path(), help='Path to the Unix socket (default: IL2_BROKER environment variable)')
+    parser.add_argument('--idle-timeout', type=float, default=600, help='Seconds after which an unused node connection is discarded')
+    args = parser.parse_args(argv)
+    broker = NodeBroker(args.socket, idle_timeout=args.idle_timeout)
+    print(f'Listening on {broker.path}', file=sys.stderr)
+    try :
+        broker.serve_forever()
+    except KeyboardInterrupt :
+        pass
+    return 0
+
+
+if __name__ == '__main__' :
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Client-side caches used to avoid redundant requests to the InterlockLedger node.
+"""
+
+import time
+import threading
+import collections
+
+
+_MISSING = object()
+
+
+class CacheStats :
+    """
+    Counters of a cache.
+
+    Attributes:
+        hits (:obj:`int`): Number of lookups answered by the cache.
+        misses (:obj:`int`): Number of lookups not found in the cache.
+        evictions (:obj:`int`): Number of items removed to make room for new items.
+    """
+    def __init__(self) :
+        self.reset()
+
+    def reset(self) :
+        """ Set all counters to zero."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def lookups(self) :
+        """:obj:`int`: Total number of lookups."""
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self) :
+        """:obj:`float`: Ratio of lookups answered by the cache."""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def __str__(self) :
+        return f"hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions} (hit ratio: {self.hit_ratio:.2%})"
+
+
+class TTLCache :
+    """
+    Cache where items expire after a fixed time to live.
+
+    Args:
+        ttl (:obj:`float`): Time to live of the items in seconds. If 0, nothing is cached.
+        clock (:obj:`callable`, optional): Function returning the current time in seconds.
+
+    Attributes:
+        ttl (:obj:`float`): Time to live of the items in seconds.
+        stats (:obj:`CacheStats`): Cache counters.
+    """
+    def __init__(self, ttl, clock=time.monotonic) :
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.__clock = clock
+        self.__items = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None) :
+        """
+        Get a cached item.
+
+        Args:
+            key: Item key.
+            default: Value returned if the item is not cached or has expired.
+        """
+        with self.__lock :
+            item = self.__items.get(key)
+            if item is not None and item[0] > self.__clock() :
+                self.stats.hits += 1
+                return item[1]
+            if item is not None :
+                del self.__items[key]
+            self.stats.misses += 1
+            return default
+
+    def put(self, key, value) :
+        """ Add an item to the cache."""
+        if not self.ttl :
+            return
+        with self.__lock :
+            self.__items[key] = (self.__clock() + self.ttl, value)
+
+    def get_or_load(self, key, loader) :
+        """
+        Get a cached item or load it with `loader()` and cache the result.
+
+        Args:
+            key: Item key.
+            loader (:obj:`callable`): Function that returns the value if it is not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING :
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING) :
+        """ Remove an item (or all items if `key` is omitted) from the cache."""
+        with self.__lock :
+            if key is _MISSING :
+                self.__items.clear()
+            else :
+                self.__items.pop(key, None)
+
+    def __len__(self) :
+        return len(self.__items)
+
+
+class LRUCache :
+    """
+    Least recently used cache for immutable items.
+
+    A second level store can be used to keep the items after they are evicted from memory
+    (e.g. a :obj:`shelve.Shelf` to persist them on disk). Items are written through to the
+    store, and found items are promoted back to memory.
+
+    Args:
+        maxsize (:obj:`int`, optional): Maximum number of items kept in memory. If 0, only the store is used.
+            If `None`, the number of items is not limited.
+        store (:obj:`collections.abc.MutableMapping`, optional): Second level store.
+        max_bytes (:obj:`int`, optional): Maximum total size of the items kept in memory, as measured by `sizeof`.
+        sizeof (:obj:`callable`, optional): Function returning the size of an item (default: :obj:`len`).
+
+    Attributes:
+        maxsize (:obj:`int`): Maximum number of items kept in memory.
+        max_bytes (:obj:`int`): Maximum total size of the items kept in memory.
+        store (:obj:`collections.abc.MutableMapping`): Second level store.
+        stats (:obj:`CacheStats`): Cache counters.
+    """
+    def __init__(self, maxsize=128, store=None, max_bytes=None, sizeof=len) :
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.store = store
+        self.stats = CacheStats()
+        self.__sizeof = sizeof
+        self.__items = collections.OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.RLock()
+
+    @property
+    def currbytes(self) :
+        """:obj:`int`: Total size of the items kept in memory (only measured if `max_bytes` is defined)."""
+        return self.__bytes
+
+    def get(self, key, default=None) :
+        """
+        Get a cached item.
+
+        Args:
+            key: Item key.
+            default: Value returned if the item is not cached.
+        """
+        with self.__lock :
+            if key in self.__items :
+                self.__items.move_to_end(key)
+                self.stats.hits += 1
+                return self.__items[key][0]
+            if self.store is not None :
+                value = self.store.get(key, _MISSING)
+                if value is not _MISSING :
+                    self.stats.hits += 1
+                    self.__put_memory(key, value)
+                    return value
+            self.stats.misses += 1
+            return default
+
+    def put(self, key, value) :
+        """ Add an item to the cache (and to the second level store)."""
+        with self.__lock :
+            self.__put_memory(key, value)
+            if self.store is not None :
+                self.store[key] = value
+
+    def __put_memory(self, key, value) :
+        if self.maxsize == 0 :
+            return
+        size = 0
+        if self.max_bytes is not None :
+            size = self.__sizeof(value)
+            if size > self.max_bytes :
+                return
+        self.__remove(key)
+        self.__items[key] = (value, size)
+        self.__bytes += size
+        while ((self.maxsize is not None and len(self.__items) > self.maxsize) 
+                or (self.max_bytes is not None and self.__bytes > self.max_bytes)) :
+            self.__bytes -= self.__items.popitem(last=False)[1][1]
+            self.stats.evictions += 1
+
+    def __remove(self, key) :
+        item = self.__items.pop(key, None)
+        if item is not None :
+            self.__bytes -= item[1]
+
+    def get_or_load(self, key, loader) :
+        """
+        Get a cached item or load it with `loader()` and cache the result.
+
+        Args:
+            key: Item key.
+            loader (:obj:`callable`): Function that returns the value if it is not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING :
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING) :
+        """ Remove an item (or all items if `key` is omitted) from memory. The second level store is not changed."""
+        with self.__lock :
+            if key is _MISSING :
+                self.__items.clear()
+                self.__bytes = 0
+            else :
+                self.__remove(key)
+
+    def close(self) :
+        """ Close the second level store, if it can be closed."""
+        with self.__lock :
+            if self.store is not None and hasattr(self.store, 'close') :
+                self.store.close()
+            self.store = None
+
+    def __contains__(self, key) :
+        with self.__lock :
+            return key in self.__items or (self.store is not None and key in self.store)
+
+    def __len__(self) :
+        return len(self.__items)
+
+
+class ResponseCache :
+    """
+    Cache of the responses of slow-changing endpoints.
+
+    Responses are reused during their time to live. After that, if the node sent a validator
+    (`ETag` or `Last-Modified` header), the response is revalidated with a conditional request
+    (`If-None-Match`/`If-Modified-Since`) and kept if the node answers `304 Not Modified`.
+    Otherwise it is requested again.
+
+    Args:
+        ttl (:obj:`float`): Time in seconds the responses are used without asking the node.
+        clock (:obj:`callable`, optional): Function returning the current time in seconds.
+
+    Attributes:
+        ttl (:obj:`float`): Time in seconds the responses are used without asking the node.
+        stats (:obj:`CacheStats`): Cache counters. Responses revalidated by the node count as hits.
+        revalidations (:obj:`int`): Number of conditional requests answered with `304 Not Modified`.
+    """
+    def __init__(self, ttl, clock=time.monotonic) :
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.revalidations = 0
+        self.__clock = clock
+        # url -> [expiration time, etag, last modified, text]
+        self.__items = {}
+        self.__lock = threading.Lock()
+
+    def get(self, url, fetch) :
+        """
+        Get the text of a response.
+
+        Args:
+            url (:obj:`str`): Request URL (with the query string, if any).
+            fetch (:obj:`callable`): Function that requests the URL with the given extra headers (:obj:`dict`)
+                and returns the :obj:`requests.Response`.
+
+        Returns:
+            :obj:`str`: Response text.
+        """
+        with self.__lock :
+            item = self.__items.get(url)
+            if item is not None and item[0] > self.__clock() :
+                self.stats.hits += 1
+                return item[3]
+        headers = {}
+        if item is not None :
+            if item[1] :
+                headers['If-None-Match'] = item[1]
+            if item[2] :
+                headers['If-Modified-Since'] = item[2]
+        response = fetch(headers)
+        with self.__lock :
+            if response.status_code == 304 and item is not None :
+                self.stats.hits += 1
+                self.revalidations += 1
+                item[0] = self.__clock() + self.ttl
+                return item[3]
+            self.stats.misses += 1
+            text = response.text
+            self.__items[url] = [self.__clock() + self.ttl, response.headers.get('ETag'), response.headers.get('Last-Modified'), text]
+            return text
+
+    def invalidate(self, url=_MISSING) :
+        """ Remove a response (or all responses if `url` is omitted) from the cache."""
+        with self.__lock :
+            if url is _MISSING :
+                self.__items.clear()
+            else :
+                self.__items.pop(url, None)
+
+    def __len__(self) :
+        return len(self.__items)
@@ -0,0 +1,244 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Cached and indexed catalog of the apps of the network.
+"""
+
+import json
+import time
+import bisect
+import hashlib
+import itertools
+import threading
+
+from .models import AppsModel
+from .util import LimitedRange, LimitedRangeSet
+from .payloads import PayloadCodec
+
+
+class AppCatalog :
+    """
+    Catalog of the apps valid in the network with lookup indexes.
+
+    The apps are requested to the node only after the time to live of the catalog (through the
+    response cache of the node, if enabled). If the response did not change since the last request,
+    the apps are not parsed again and the indexes are kept.
+
+    Args:
+        node (:obj:`il2_rest.RestNode`): Node client.
+        ttl (:obj:`float`, optional): Time in seconds before the apps are requested again. If 0, they are requested on each access.
+        clock (:obj:`callable`, optional): Function returning the current time in seconds.
+
+    Example:
+        >>> catalog = AppCatalog(node)
+        >>> catalog.app_of_tag(300).name
+        'InterlockLedger Core'
+        >>> codec = catalog.codec(300)
+    """
+    def __init__(self, node, ttl=60, clock=time.monotonic) :
+        self.node = node
+        self.ttl = ttl
+        self.__clock = clock
+        self.__lock = threading.RLock()
+        self.__expires = None
+        self.__digest = None
+        self.__apps = None
+        self.__by_id = {}
+        self.__models = {}
+        self.__codecs = {}
+        self.__range_starts = []
+        self.__range_ends = []
+        self.__range_max_ends = []
+        self.__range_apps = []
+        self.__reserved = LimitedRangeSet()
+
+    @property
+    def apps(self) :
+        """:obj:`il2_rest.models.AppsModel`: Apps valid in the network."""
+        return self.__current()
+
+    def refresh(self, force=False) :
+        """
+        Request the apps to the node, rebuilding the indexes if they changed.
+
+        Args:
+            force (:obj:`bool`, optional): If True, the indexes are rebuilt even if the apps did not change.
+
+        Returns:
+            :obj:`bool`: True if the indexes were rebuilt.
+        """
+        text = self.node._get_cached_text('/apps')
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        with self.__lock :
+            self.__expires = self.__clock() + self.ttl
+            if digest == self.__digest and not force :
+                return False
+            self.__index(AppsModel.from_json(json.loads(text)))
+            self.__digest = digest
+            return True
+
+    def __current(self) :
+        with self.__lock :
+            if self.__apps is None or self.__clock() >= self.__expires :
+                self.refresh()
+            return self.__apps
+
+    def __index(self, apps) :
+        by_id = {}
+        for app in apps.validApps :
+            by_id.setdefault(app.id, []).append(app)
+        models = {}
+        ranges = []
+        for versions in by_id.values() :
+            versions.sort()
+            # The data models and reserved tags of the latest version are used
+            latest = versions[-1]
+            for model in latest.dataModels :
+                models[model.payloadTagId] = model
+            ranges.extend((r.start, r.end, latest) for r in latest.reservedILTagIds)
+        ranges.sort(key=lambda r : r[0])
+        self.__apps = apps
+        self.__by_id = by_id
+        self.__models = models
+        self.__codecs = {}
+        self.__range_starts = [r[0] for r in ranges]
+        self.__range_ends = [r[1] for r in ranges]
+        self.__range_max_ends = list(itertools.accumulate(self.__range_ends, max))
+        self.__range_apps = [r[2] for r in ranges]
+        self.__reserved = LimitedRangeSet(LimitedRange(r[0], end=r[1]) for r in ranges)
+
+    def app(self, app_id, app_version=None) :
+        """
+        Get an app by id.
+
+        Args:
+            app_id (:obj:`int`): App id.
+            app_version (:obj:`packaging.version.Version`/:obj:`str`, optional): App version. If omitted, returns the latest version.
+
+        Returns:
+            :obj:`il2_rest.models.AppsModel.PublishedApp`: App or `None` if it is not in the catalog.
+        """
+        with self.__lock :
+            self.__current()
+            versions = self.__by_id.get(app_id)
+            if not versions :
+                return None
+            if app_version is None :
+                return versions[-1]
+            for app in versions :
+                if app.appVersion == app_version or str(app.appVersion) == str(app_version) :
+                    return app
+            return None
+
+    def data_model(self, payload_tag_id) :
+        """
+        Get the data model of a payload.
+
+        Args:
+            payload_tag_id (:obj:`int`): Payload tag id.
+
+        Returns:
+            :obj:`il2_rest.models.DataModel`: Data model or `None` if no app defines the payload.
+        """
+        with self.__lock :
+            self.__current()
+            return self.__models.get(payload_tag_id)
+
+    def codec(self, payload_tag_id) :
+        """
+        Get the codec of a payload, compiled once per catalog version (see :obj:`il2_rest.payloads.PayloadCodec`).
+
+        Args:
+            payload_tag_id (:obj:`int`): Payload tag id.
+
+        Returns:
+            :obj:`il2_rest.payloads.PayloadCodec`: Codec or `None` if no app defines the payload.
+        """
+        with self.__lock :
+            codec = self.__codecs.get(payload_tag_id)
+            if codec is None :
+                model = self.data_model(payload_tag_id)
+                if model is None :
+                    return None
+                codec = self.__codecs[payload_tag_id] = PayloadCodec(model)
+            return codec
+
+    def app_of_tag(self, tag_id) :
+        """
+        Get the app that reserved a tag id (see :obj:`il2_rest.models.AppsModel.PublishedApp.reservedILTagIds`).
+
+        Args:
+            tag_id (:obj:`int`): Tag id.
+
+        Returns:
+            :obj:`il2_rest.models.AppsModel.PublishedApp`: App or `None` if the tag id is not reserved.
+        """
+        with self.__lock :
+            self.__current()
+            if tag_id not in self.__reserved :
+                return None
+            return next(self.__apps_reserving(tag_id, tag_id), None)
+
+    @property
+    def reserved_ranges(self) :
+        """:obj:`il2_rest.util.LimitedRangeSet`: Tag ids reserved by the apps."""
+        with self.__lock :
+            self.__current()
+            return self.__reserved.copy()
+
+    def conflicts(self, ranges) :
+        """
+        Find the apps that reserved any tag id of some ranges, e.g. to validate the
+        :obj:`il2_rest.models.AppsModel.PublishedApp.reservedILTagIds` of a new app.
+
+        Args:
+            ranges (iterable of :obj:`il2_rest.util.LimitedRange`/:obj:`str`): Ranges of tag ids.
+
+        Returns:
+            :obj:`list` of :obj:`il2_rest.models.AppsModel.PublishedApp`: Apps with overlapping reservations.
+        """
+        with self.__lock :
+            self.__current()
+            apps = []
+            for item in LimitedRangeSet(ranges) :
+                if self.__reserved.overlaps(item) :
+                    apps.extend(app for app in self.__apps_reserving(item.start, item.end) if app not in apps)
+            return apps
+
+    def __apps_reserving(self, start, end) :
+        i = bisect.bisect_right(self.__range_starts, end) - 1
+        # Reserved ranges should not overlap, but earlier ranges may still reach the interval
+        while i >= 0 and self.__range_max_ends[i] >= start :
+            if self.__range_ends[i] >= start :
+                yield self.__range_apps[i]
+            i -= 1
+
+    def __len__(self) :
+        with self.__lock :
+            return len(self.__current().validApps)
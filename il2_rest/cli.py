@@ -0,0 +1,190 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Command-line client to the InterlockLedger node (`il2` command).
+
+Each command prints JSON objects, one per line, so the output can be piped to other tools::
+
+    $ export IL2_CERT=rest.api.pfx IL2_CERT_PASS=password IL2_PORT=32020
+    $ il2 summary
+    $ il2 tail A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE --from 0 --count 10
+    $ il2 export A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE ./records --compression gzip
+    $ il2 upload A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE report.pdf --comment 'Monthly report'
+    $ il2 download A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE <locator> --dest ./documents
+"""
+
+# Only the standard modules needed to parse the arguments are imported here, the client
+# modules are imported by each command, so `il2 --help` and argument errors are fast.
+import os
+import sys
+import json
+import argparse
+
+
+def _node(args) :
+    from .client import RestNode
+    if args.certificate_path is None or args.certificate_pass is None :
+        raise SystemExit('il2: the certificate (-c or IL2_CERT) and its password (-p or IL2_CERT_PASS) are required')
+    return RestNode(cert_file=args.certificate_path, cert_pass=args.certificate_pass, address=args.address,
+                    port=args.api_port, verify_ca=args.verify_ca, broker_path=args.broker)
+
+
+def _print(value) :
+    print(value if isinstance(value, str) else json.dumps(value), flush=True)
+
+
+def summary(args) :
+    """ Print the summary of chains (all chains of the node if none is given)."""
+    node = _node(args)
+    chains = [node.chain_by_id(chain_id) for chain_id in args.chains] if args.chains else node.chains
+    for chain in chains :
+        _print(chain.summary.json(return_as_str=True))
+
+
+def tail(args) :
+    """ Print the records of a chain as they are added (one JSON per line)."""
+    node = _node(args)
+    chain = node.chain_by_id(args.chain)
+    count = 0
+    for record in chain.follow(from_serial=args.from_serial, poll_interval=args.interval, max_batch=args.batch) :
+        _print(record.json(return_as_str=True))
+        count += 1
+        if args.count and count >= args.count :
+            break
+
+
+def export(args) :
+    """ Export the records of a chain to files, resuming the previous export."""
+    from .export import ChainExporter
+    from .enumerations import DocumentsCompression
+    node = _node(args)
+    exporter = ChainExporter(node.chain_by_id(args.chain), args.prefix, as_json=args.as_json, output_format=args.format,
+                             compression=DocumentsCompression[args.compression.upper()], page_size=args.page_size,
+                             rotate_records=args.rotate_records, rotate_bytes=args.rotate_bytes)
+    count = exporter.export(last_serial=args.last_serial)
+    _print({'exported': count, 'lastSerial': exporter.last_serial, 'files': exporter.files})
+
+
+def upload(args) :
+    """ Store files as a set of documents and print the locator."""
+    node = _node(args)
+    chain = node.chain_by_id(args.chain)
+    with chain.documents_transaction(comment=args.comment) as transaction :
+        for path in args.files :
+            transaction.add_item(os.path.basename(path), args.comment, path)
+    _print({'locator': transaction.locator, 'files': [os.path.basename(path) for path in args.files]})
+
+
+def download(args) :
+    """ Download a set of documents (as a zip file) or one of its documents."""
+    node = _node(args)
+    chain = node.chain_by_id(args.chain)
+    os.makedirs(args.dest, exist_ok=True)
+    if args.index is None :
+        chain.download_documents_as_zip(args.locator, dst_path=args.dest)
+    else :
+        chain.download_single_document_at(args.locator, args.index, dst_path=args.dest)
+    _print({'locator': args.locator, 'index': args.index, 'dest': os.path.abspath(args.dest)})
+
+
+def build_parser() :
+    """
+    Build the parser of the command-line arguments.
+
+    Returns:
+        :obj:`argparse.ArgumentParser`: Argument parser.
+    """
+    parser = argparse.ArgumentParser(prog='il2', description='Command-line client to the InterlockLedger node. The output is JSON.')
+    parser.add_argument('-c', action='store', dest='certificate_path', default=os.environ.get('IL2_CERT'),
+                        help='Path to .pfx certicate file (default: IL2_CERT environment variable)')
+    parser.add_argument('-p', action='store', dest='certificate_pass', default=os.environ.get('IL2_CERT_PASS'),
+                        help='Certificate password (default: IL2_CERT_PASS environment variable)')
+    parser.add_argument('-a', action='store', dest='address', default=os.environ.get('IL2_ADDRESS', 'localhost'), help='Node address')
+    parser.add_argument('-P', action='store', dest='api_port', type=int, default=os.environ.get('IL2_PORT'), help='API port')
+    parser.add_argument('--no-verify-ca', action='store_false', dest='verify_ca', help='Do not check the node certificate')
+    parser.add_argument('--broker', default=os.environ.get('IL2_BROKER'),
+                        help='Send the requests through the il2-broker listening on this socket (default: IL2_BROKER environment variable)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    command = commands.add_parser('summary', help=summary.__doc__)
+    command.add_argument('chains', nargs='*', help='Chain ids')
+    command.set_defaults(handler=summary)
+
+    command = commands.add_parser('tail', help=tail.__doc__)
+    command.add_argument('chain', help='Chain id')
+    command.add_argument('--from', type=int, dest='from_serial', help='First serial (default: new records only)')
+    command.add_argument('--count', type=int, help='Stop after this number of records')
+    command.add_argument('--interval', type=float, default=1.0, help='Poll interval in seconds')
+    command.add_argument('--batch', type=int, default=100, help='Maximum number of records requested at once')
+    command.set_defaults(handler=tail)
+
+    command = commands.add_parser('export', help=export.__doc__)
+    command.add_argument('chain', help='Chain id')
+    command.add_argument('prefix', help='Path prefix of the output files')
+    command.add_argument('--last', type=int, dest='last_serial', help='Last serial to be exported')
+    command.add_argument('--as-json', action='store_true', help='Export the payloads mapped to JSON')
+    command.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson', help='Output format')
+    command.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none', help='Compression of NDJSON files')
+    command.add_argument('--page-size', type=int, default=100, help='Number of records requested at once')
+    command.add_argument('--rotate-records', type=int, help='Maximum number of records in each file')
+    command.add_argument('--rotate-bytes', type=int, help='Size in bytes after which a new file is started')
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser('upload', help=upload.__doc__)
+    command.add_argument('chain', help='Chain id')
+    command.add_argument('files', nargs='+', help='Files to be stored')
+    command.add_argument('--comment', help='Comment of the documents')
+    command.set_defaults(handler=upload)
+
+    command = commands.add_parser('download', help=download.__doc__)
+    command.add_argument('chain', help='Chain id')
+    command.add_argument('locator', help='Documents locator')
+    command.add_argument('--index', type=int, help='Index of a single document to be downloaded')
+    command.add_argument('--dest', default='.', help='Destination folder')
+    command.set_defaults(handler=download)
+    return parser
+
+
+def main(argv=None) :
+    """ Entry point of the `il2` command."""
+    args = build_parser().parse_args(argv)
+    try :
+        args.handler(args)
+    except KeyboardInterrupt :
+        return 130
+    except BrokenPipeError :
+        # The output was closed (e.g. piped to `head`), avoid another error when Python flushes it at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == '__main__' :
+    sys.exit(main())
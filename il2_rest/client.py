@@ -35,6 +35,10 @@ import base64
 import re
 import mimetypes
 import shutil
+import shelve
+import time
+import heapq
+import threading
 
 
 from .enumerations import NetworkPredefinedPorts
@@ -60,6 +64,10 @@ from .models import DocumentsMetadataModel
 from .models import PageOfModel
 from .util import build_query
 from .util import PKCS12Certificate, SimpleUri
+from .documents import ZipStreamReader
+from .documents import DocumentsTransaction
+from .cache import TTLCache, LRUCache, ResponseCache
+from .catalog import AppCatalog
 
 
 class RestChain :
@@ -94,7 +102,7 @@ class RestChain :
     @property
     def active_apps(self):
         """:obj:`list` of :obj:`int`: Enumerate apps that are currently permitted on this chain."""
-        return self.__rest._get(f"/chain/{self.id}/activeApps")
+        return self.__rest._get_cached(f"/chain/{self.id}/activeApps")
     
     def interlocks(self, howManyFromLast=0, page=0, pageSize=10) :
         """
@@ -120,7 +128,7 @@ class RestChain :
     @property
     def permitted_keys(self):
         """:obj:`list` of :obj:`il2_rest.models.KeyModel`: Enumerate keys that are currently permitted on chain."""
-        json_data = self.__rest._get(f'/chain/{self.id}/key')
+        json_data = self.__rest._get_cached(f'/chain/{self.id}/key')
         return [KeyModel.from_json(item) for item in json_data]
     
     '''
@@ -132,8 +140,25 @@ class RestChain :
 
     @property
     def summary(self):
-        """:obj:`il2_rest.models.ChainSummaryModel`: Chain details"""
-        return ChainSummaryModel.from_json(self.__rest._get(f'/chain/{self.id}'))
+        """:obj:`il2_rest.models.ChainSummaryModel`: Chain details. The snapshot is kept for the `summary_ttl` of the node (see :obj:`RestChain.refresh`)."""
+        json_data = self.__rest._summary_cache.get_or_load(self.id, lambda : self.__rest._get(f'/chain/{self.id}'))
+        return ChainSummaryModel.from_json(dict(json_data))
+
+    def refresh(self) :
+        """
+        Discard the summary snapshot of the chain and request it again.
+
+        Returns:
+            :obj:`il2_rest.models.ChainSummaryModel`: Chain details.
+        """
+        self.__rest._chain_changed(self.id)
+        return self.summary
+
+    def __post(self, url, body) :
+        # Posts to the chain add records, so its summary snapshot is outdated
+        json_data = self.__rest._post(url, body)
+        self.__rest._chain_changed(self.id)
+        return json_data
     
 
     def add_record(self, model) :
@@ -165,7 +190,7 @@ class RestChain :
                 "payloadBytes": "+DQHBQAAFAIBBA=="
             }
         """
-        return RecordModel.from_json(self.__rest._post(f"/records@{self.id}", model))
+        return RecordModel.from_json(self.__post(f"/records@{self.id}", model))
 
     def add_record_unpacked(self, applicationId, payloadTagId, rec_bytes, rec_type=RecordType.Data) :
         """
@@ -205,7 +230,9 @@ class RestChain :
             "type": rec_type.value,
         }
         cur_url = f"/records@{self.id}/with"
-        return RecordModel.from_json(self.__rest._post_raw(cur_url, rec_bytes, "application/interlockledger", params=params))
+        record = RecordModel.from_json(self.__rest._post_raw(cur_url, rec_bytes, "application/interlockledger", params=params))
+        self.__rest._chain_changed(self.id)
+        return record
         
 
     def add_record_as_json(self, applicationId=None, payloadTagId=None, payload=None, rec_type=RecordType.Data, model=None) :
@@ -250,7 +277,7 @@ class RestChain :
         if model :
             if not isinstance(model, NewRecordModelAsJson) :
                 raise TypeError('model must be NewRecordModelAsJson')
-            return RecordModelAsJson.from_json(self.__rest._post(f"/records@{self.id}/asJson{model.to_query_string}", model.JSON))
+            return RecordModelAsJson.from_json(self.__post(f"/records@{self.id}/asJson{model.to_query_string}", model.JSON))
         else :
             if applicationId is None:
                 raise TypeError('applicationId is None')
@@ -294,7 +321,7 @@ class RestChain :
                 "interlockedRecordSerial": 14
             }            
         """
-        return InterlockingRecordModel.from_json(self.__rest._post(f"/chain/{self.id}/interlockings", model))
+        return InterlockingRecordModel.from_json(self.__post(f"/chain/{self.id}/interlockings", model))
 
 
     def permit_apps(self, apps_to_permit) :
@@ -314,7 +341,9 @@ class RestChain :
             >>> print(apps)
             [4]
         """
-        return self.__rest._post(f"/chain/{self.id}/activeApps", apps_to_permit)
+        json_data = self.__post(f"/chain/{self.id}/activeApps", apps_to_permit)
+        self.__rest._invalidate_responses(f"/chain/{self.id}/activeApps")
+        return json_data
 
 
     def permit_keys(self, keys_to_permit) :
@@ -363,7 +392,8 @@ class RestChain :
                   App #2 Actions 500,501
                   App #1 Actions 300,301       
         """
-        json_data = self.__rest._post(f"/chain/{self.id}/key", keys_to_permit)
+        json_data = self.__post(f"/chain/{self.id}/key", keys_to_permit)
+        self.__rest._invalidate_responses(f"/chain/{self.id}/key")
         return [KeyModel.from_json(item) for item in json_data]
 
     
@@ -396,6 +426,35 @@ class RestChain :
         json_data['itemClass'] = RecordModel
         return PageOfModel.from_json(json_data)
 
+    def follow(self, from_serial=None, poll_interval=1.0, max_batch=100, max_interval=30.0, stop_event=None) :
+        """
+        Yield the records of the chain as they are added.
+
+        The chain is polled with adaptive intervals: while there are more records to be returned, the next batch is requested
+        immediately; while no records are found, the interval doubles up to `max_interval` (see :obj:`RestNode.follow`).
+
+        Args:
+            from_serial (:obj:`int`, optional): First serial to be yielded. If omitted, only records added after the call are yielded.
+            poll_interval (:obj:`float`, optional): Seconds to wait after the chain has no more records.
+            max_batch (:obj:`int`, optional): Maximum number of records requested at once.
+            max_interval (:obj:`float`, optional): Maximum number of seconds between polls.
+            stop_event (:obj:`threading.Event`, optional): Event that stops the iteration when set.
+
+        Yields:
+            :obj:`il2_rest.models.RecordModel`: New records in serial order.
+
+        Raises:
+            ValueError: If `max_batch` is less than 1.
+
+        Example:
+            >>> for record in chain.follow(from_serial=10) :
+            ...     print(record.serial, record.payloadTagId)
+        """
+        from_serials = None if from_serial is None else {self.id: from_serial}
+        # RestNode.follow checks the arguments when it is called, not when the iteration starts
+        records = self.__rest.follow([self], from_serials, poll_interval, max_batch, max_interval, stop_event)
+        return (record for _, record in records)
+
     def records_as_json(self, firstSerial=None, lastSerial=None, page=0, pageSize=10, lastToFirst=False) :
         """
         Get list of records with payload mapped to JSON starting from a given serial number.
@@ -435,7 +494,7 @@ class RestChain :
         Returns:
             :obj:`il2_rest.models.RecordModel`: Record with the specific serial number.
         """
-        return RecordModel.from_json(self.__rest._get(f"/records@{self.id}/{serial}"))
+        return RecordModel.from_json(self.__rest._get_record(self.id, serial, 'record', f"/records@{self.id}/{serial}"))
 
     def record_at_as_json(self, serial) :
         """
@@ -447,7 +506,7 @@ class RestChain :
         Returns:
             :obj:`il2_rest.models.RecordModelAsJson`: Record mapped to JSON with the specific serial number.
         """
-        return RecordModelAsJson.from_json(self.__rest._get(f"/records@{self.id}/{serial}/asJson"))
+        return RecordModelAsJson.from_json(self.__rest._get_record(self.id, serial, 'asJson', f"/records@{self.id}/{serial}/asJson"))
 
     '''
     def json_documents_from(self, firstSerial=None, lastSerial=None):
@@ -474,7 +533,7 @@ class RestChain :
         Returns:
             :obj:`il2_rest.models.JsonDocumentRecordModel`: JSON document record.
         """
-        return JsonDocumentRecordModel.from_json(self.__rest._get(f'/jsonDocuments@{self.id}/{serial}'))
+        return JsonDocumentRecordModel.from_json(self.__rest._get_record(self.id, serial, 'jsonDocument', f'/jsonDocuments@{self.id}/{serial}'))
     
     '''
     def json_document_at_as_str(self, serial):
@@ -489,6 +548,29 @@ class RestChain :
         return self.__rest._get(f'/jsonDocuments@{self.id}/{serial}/asJson')
     '''
 
+    def json_document_content_at(self, serial) :
+        """
+        Get the decrypted content of a specific JSON document stored in the chain.
+
+        If the node has a local JSON document store, the content is served from it
+        and only documents not found locally are fetched from the node and decrypted.
+
+        Args:
+            serial (:obj:`int`): Serial number of the record.
+
+        Returns:
+            :obj:`dict`: JSON document.
+        """
+        store = self.__rest._json_document_store
+        if store is not None :
+            payload = store.get(self.id, serial)
+            if payload is not None :
+                return payload
+        payload = self.json_document_at(serial).encryptedJson.decode_with(self.__rest.certificate)
+        if store is not None :
+            store.put(self.id, serial, payload)
+        return payload
+
     def store_json_document(self, payload) :
         """
         Store a JSON document record.
@@ -515,7 +597,10 @@ class RestChain :
             >>> print(new_json_document)
             
         """
-        return JsonDocumentRecordModel.from_json(self.__rest._post(f"/jsonDocuments@{self.id}", payload))
+        record = JsonDocumentRecordModel.from_json(self.__post(f"/jsonDocuments@{self.id}", payload))
+        if self.__rest._json_document_store is not None :
+            self.__rest._json_document_store.put(self.id, record.serial, payload)
+        return record
 
     def documents_transaction_status(self, transaction_id) :
         """
@@ -551,7 +636,9 @@ class RestChain :
             >>> resp = chain.documents_transaction_metadata('EbAfcWGwCwzuiEtSwIwYQYIHy-g05CZl6jrcBAYuYRIe')
             >>> print(resp)
         """
-        return DocumentsMetadataModel.from_json(self.__rest._get(f"/documents/{locator}/metadata"))
+        json_data = self.__rest._documents_metadata_cache.get_or_load(locator, 
+                        lambda: self.__rest._get(f"/documents/{locator}/metadata"))
+        return DocumentsMetadataModel.from_json(dict(json_data))
 
 
     def download_single_document_at(self, locator, index, dst_path='./') :
@@ -613,6 +700,31 @@ class RestChain :
         """
         return self.__rest._download_request(f"/documents/{locator}/zip")
 
+    def iter_documents_in_zip(self, locator, chunk_size=65536) :
+        """
+        Iterate over the documents of a set of documents while the compressed file is downloaded.
+
+        The compressed file is never written to disk. Each document must be read before
+        moving to the next one, any unread content is skipped.
+
+        Args:
+            locator (:obj:`str`): A Documents Storage Locator.
+            chunk_size (:obj:`int`, optional): Size of the chunks read from the connection.
+
+        Yields:
+            (:obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry`, :obj:`il2_rest.documents.ZipEntryReader`): 
+            The directory entry of the document and a file-like object with its content.
+
+        Example:
+            >>> node = RestNode(cert_file='documenter.pfx', cert_pass='password')
+            >>> chain = node.chain_by_id('A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE')
+            >>> for entry, f in chain.iter_documents_in_zip('EbAfcWGwCwzuiEtSwIwYQYIHy-g05CZl6jrcBAYuYRIe') :
+            ...     print(entry.name, len(f.read()))
+        """
+        metadata = self.documents_transaction_metadata(locator)
+        with self.download_documents_zip_request(locator) as response :
+            yield from ZipStreamReader(response.iter_content(chunk_size), metadata.publicDirectory)
+
     def documents_begin_transaction(self, comment=None, compression=None, generatePublicDirectory=None, iterations=None, encryption=None, password=None, model=None) :
         """
         Begin a transaction to store a set of documents. May rollback on timeout or errors.
@@ -667,6 +779,35 @@ class RestChain :
             model = DocumentsBeginTransactionModel(chain=self.id, comment=comment, encryption=encryption, compression=compression, generatePublicDirectory=generatePublicDirectory, iterations=iterations, password=password)
         return DocumentsTransactionModel.from_json(self.__rest._post("/documents/transaction", model))
             
+    def documents_transaction(self, comment=None, compression=None, generatePublicDirectory=None, iterations=None, encryption=None, password=None, **kwargs) :
+        """
+        Create a context manager to store a set of documents, handling the transaction timeout.
+
+        The transaction only begins when the documents are uploaded, at the end of the `with` block.
+        See :obj:`il2_rest.documents.DocumentsTransaction` for the details and the extra arguments.
+
+        Args:
+            comment (:obj:`str`): Any additional information about the set of documents to be stored.
+            compression (:obj:`il2_rest.enumerations.DocumentsCompression`): Compression algorithm.
+            generatePublicDirectory (:obj:`bool`): If the publically viewable PublicDirectory field should be created.
+            iterations (:obj:`int`): Override for the number of PBE iterations to generate the key.
+            encryption (:obj:`str`): The encryption descriptor in the <pbe>-<hash>-<cipher>-<level> format.
+            password (:obj:`bytes`): Password as bytes if Encryption is not null.
+
+        Returns:
+            :obj:`il2_rest.documents.DocumentsTransaction`: Transaction context manager.
+
+        Example:
+            >>> node = RestNode(cert_file='documenter.pfx', cert_pass='password')
+            >>> chain = node.chain_by_id('A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE')
+            >>> with chain.documents_transaction(comment='Using context manager') as transaction :
+            ...     transaction.add_item('item1.txt', 'First file', './test.txt')
+            ...     transaction.add_item('item2.txt', 'Second file', './test2.txt')
+            >>> locator = transaction.locator
+        """
+        return DocumentsTransaction(self, comment=comment, compression=compression, generatePublicDirectory=generatePublicDirectory, 
+                                    iterations=iterations, encryption=encryption, password=password, **kwargs)
+
     def documents_transaction_add_item(self, transaction_id, name, comment, filepath, relative_path="/", content_type=None) :
         """
         Adds another document to a pending transaction of multi-documents.
@@ -706,6 +847,37 @@ class RestChain :
             return DocumentsTransactionModel.from_json(resp.json())
         else :
             return None
+
+    def documents_transaction_add_stream(self, transaction_id, name, comment, stream, content_type, relative_path="/", content_encoding=None) :
+        """
+        Adds another document to a pending transaction of multi-documents reading the content from a stream.
+
+        *Note:* For advance use only. See :obj:`il2_rest.documents.DocumentUploader`.
+
+        Args:
+            transaction_id (:obj:`str`): Id of the ongoing transaction.
+            name (:obj:`str`): File name.
+            comment (:obj:`str`): Additional comment.
+            stream (file-like or iterable of :obj:`bytes`): Content of the document. 
+                If it is an iterable without length, the content is sent with chunked transfer encoding.
+            content_type (:obj:`str`): File mime-type.
+            relative_path (:obj:`str`, optional): Relative path of the file inside the record.
+            content_encoding (:obj:`str`, optional): Value of the Content-Encoding header if the stream is compressed.
+
+        Returns:
+            :obj:`il2_rest.models.DocumentsTransactionModel`: Status of the transaction. `None` if fail.
+        """
+        params = {
+            "path": relative_path,
+            "name": name,
+            "comment": comment
+        }
+        headers = {'Content-Encoding': content_encoding} if content_encoding else None
+        resp = self.__rest._post_raw(f"/documents/transaction/{transaction_id}", stream, content_type, params=params, headers=headers)
+        if resp.status_code == 200 :
+            return DocumentsTransactionModel.from_json(resp.json())
+        else :
+            return None
         
         
         
@@ -746,17 +918,23 @@ class RestNetwork :
 
     Args:
         rest (:obj:`RestNode`): Node of the network.
+        apps_ttl (:obj:`float`, optional): Time in seconds to cache the apps of the network (default 60s).
+            If 0, the apps are requested on each access.
+
+    Attributes:
+        catalog (:obj:`il2_rest.catalog.AppCatalog`): Cached and indexed catalog of the apps.
     """
 
-    def __init__(self, rest) :
+    def __init__(self, rest, apps_ttl=60) :
         if rest is None :
             raise TypeError('rest is None')
         self.__rest = rest
+        self.catalog = AppCatalog(rest, apps_ttl)
 
     @property
     def apps(self) :
         """:obj:`AppsModel`: List of valid apps in the network."""
-        return AppsModel.from_json(self.__rest._get('/apps'))
+        return self.catalog.apps
 
 
 
@@ -780,6 +958,24 @@ class RestNode :
         verify_ca (:obj:`bool`): If True, checks CA.
         connect_timeout (:obj:`int`): Connect timeout in seconds (default: 5s).
         read_timeout (:obj:`int`): Read timeout in seconds (default 15s).
+        documents_config_ttl (:obj:`float`): Time in seconds to cache the documents upload configuration (default 60s). If 0, it is not cached.
+        summary_ttl (:obj:`float`): Time in seconds to keep the summary snapshots of the chains (default 0, not cached).
+            Records added with this client discard the snapshot of the chain (see :obj:`RestChain.refresh`).
+        response_cache_ttl (:obj:`float`): Time in seconds to cache the node details, peers, chains, mirrors and the keys and active apps of the chains (default 0, not cached).
+            After that, the cached responses are revalidated with conditional requests if the node supports them (see :obj:`il2_rest.cache.ResponseCache`).
+        apps_ttl (:obj:`float`): Time in seconds to cache the apps of the network (default 60s). If 0, they are requested on each access.
+        metadata_cache_size (:obj:`int`): Number of documents metadata kept in memory (default 256). 
+            The metadata of a locator never changes, so it is cached permanently.
+        metadata_cache_path (:obj:`str`, optional): If defined, the documents metadata cache is also stored on disk in this file (using :obj:`shelve`).
+        json_store_path (:obj:`str`, optional): If defined, the JSON documents stored and read by this client are kept in a local 
+            encrypted store in this file (see :obj:`il2_rest.jsonstore.JsonDocumentStore`). Use ':memory:' to keep them only in memory.
+        record_cache_bytes (:obj:`int`): Maximum size in bytes of the records kept in memory by :obj:`RestChain.record_at`,
+            :obj:`RestChain.record_at_as_json` and :obj:`RestChain.json_document_at` (default 0, records are not cached). 
+            Records never change, so they are cached permanently and shared by all chains of this node.
+        record_cache_store (:obj:`collections.abc.MutableMapping`, optional): Second level store of the records cache (e.g. a :obj:`shelve.Shelf`).
+        broker_path (:obj:`str`, optional): If defined, the requests are forwarded to the broker listening on this Unix socket 
+            (see :obj:`il2_rest.broker.NodeBroker`), which keeps the connections to the node open between processes.
+            The certificate is only loaded if it is used by this client (e.g. to read encrypted documents).
 
     Attributes:
         base_uri (:obj:`uri.URI`): The base URI address of the node.
@@ -793,7 +989,17 @@ class RestNode :
             address='localhost',
             verify_ca=True,
             connect_timeout=5,
-            read_timeout=15
+            read_timeout=15,
+            documents_config_ttl=60,
+            summary_ttl=0,
+            response_cache_ttl=0,
+            apps_ttl=60,
+            metadata_cache_size=256,
+            metadata_cache_path=None,
+            json_store_path=None,
+            record_cache_bytes=0,
+            record_cache_store=None,
+            broker_path=None
             ) :
         if port is None :
             port = NetworkPredefinedPorts.MainNet.value
@@ -802,11 +1008,36 @@ class RestNode :
         self.base_uri = SimpleUri(address=address, port=port)
         #self.__certificate = self.__get_cert_from_file(cert_file, cert_pass)
         self._session = None
+        self.__session_lock = threading.Lock()
         self.__pem_file = None
-        self.__certificate = PKCS12Certificate(cert_file, cert_pass)
-        self.network = RestNetwork(self)
+        self.__cert_file = cert_file
+        self.__cert_pass = cert_pass
+        self.__broker_path = broker_path
+        # In thin mode the broker holds the connection, so the certificate is loaded only when needed
+        self.__certificate = None if broker_path else PKCS12Certificate.load(cert_file, cert_pass)
+        self.__address = address
+        self.__port = port
+        self.network = RestNetwork(self, apps_ttl)
         self._connect_timeout=connect_timeout
         self._read_timeout=read_timeout
+        self._documents_config_cache = TTLCache(documents_config_ttl)
+        self._response_cache = ResponseCache(response_cache_ttl) if response_cache_ttl else None
+        self._summary_cache = TTLCache(summary_ttl)
+        # RestChain handles by chain id, reused by chains, mirrors and chain_by_id
+        self.__chain_handles = {}
+        self.__chain_handles_lock = threading.Lock()
+        metadata_store = shelve.open(os.path.expanduser(metadata_cache_path)) if metadata_cache_path else None
+        self._documents_metadata_cache = LRUCache(metadata_cache_size, store=metadata_store)
+        self._json_document_store = None
+        if json_store_path :
+            # The store encrypts with cryptography's AEAD ciphers, only loaded when it is used
+            from .jsonstore import JsonDocumentStore
+            self._json_document_store = JsonDocumentStore(self.certificate, json_store_path)
+        self._record_cache = None
+        if record_cache_bytes or record_cache_store is not None :
+            # The response texts are measured in UTF-8 bytes, not characters
+            self._record_cache = LRUCache(None, store=record_cache_store, max_bytes=record_cache_bytes,
+                                          sizeof=lambda text : len(text.encode('utf-8')))
 
     def __del__(self) :
         if self.__pem_file :
@@ -814,13 +1045,26 @@ class RestNode :
             self.__pem_file.close()
         if self._session :
             self._session.close()
+        if getattr(self, '_documents_metadata_cache', None) is not None :
+            self._documents_metadata_cache.close()
+        if getattr(self, '_json_document_store', None) is not None :
+            self._json_document_store.close()
+        if getattr(self, '_record_cache', None) is not None :
+            self._record_cache.close()
     
     def _get_session(self) :
-        if not self._session :
-            self.__pfx_to_pem()
-            self._session = requests.Session()
-            self._session.cert = self.__pem_file.name
-            self._session.verify = self.verify_ca
+        # The session may be requested by several threads at once (e.g. il2_rest.interlocks.InterlockGraph)
+        with self.__session_lock :
+            if not self._session and self.__broker_path :
+                from .broker import BrokerSession
+                self._session = BrokerSession(self.__broker_path, self.__cert_file, self.__cert_pass,
+                                              address=self.__address, port=self.__port, verify_ca=self.verify_ca)
+            elif not self._session :
+                self.__pfx_to_pem()
+                session = requests.Session()
+                session.cert = self.__pem_file.name
+                session.verify = self.verify_ca
+                self._session = session
         return self._session
 
 
@@ -828,25 +1072,26 @@ class RestNode :
     def __pfx_to_pem(self) :
         self.__pem_file = tempfile.NamedTemporaryFile(suffix='.pem')
         f_pem = open(self.__pem_file.name, 'wb')
-        f_pem.write(self.__certificate.private_key)
-        f_pem.write(self.__certificate.public_certificate)
+        f_pem.write(self.certificate.private_key)
+        f_pem.write(self.certificate.public_certificate)
         f_pem.close()
 
+    @property
+    def certificate(self) :
+        """:obj:`il2_rest.util.PKCS12Certificate`: Client certificate."""
+        if self.__certificate is None :
+            self.__certificate = PKCS12Certificate.load(self.__cert_file, self.__cert_pass)
+        return self.__certificate
+
     @property
     def public_certificate(self):
         """:obj:`str`: Public certificate in PEM format."""
-        return self.__certificate.public_certificate
+        return self.certificate.public_certificate
 
     @property
     def public_certificate_in_x509(self):
         """:obj:`str`: Public certificate in X509 format."""
-        x509 = (
-            self.public_certificate
-                .replace(b'-----BEGIN CERTIFICATE-----\n', b'')
-                .replace(b'-----END CERTIFICATE-----\n', b'')
-                .replace(b'\n', b'')
-        )
-        return x509
+        return self.certificate.public_certificate_in_x509
 
     @property
     def api_version(self) :
@@ -856,36 +1101,128 @@ class RestNode :
     @property
     def certificate_name(self) :
         """:obj:`str`: Certificate friendly name."""
-        return self.__certificate.friendly_name
+        return self.certificate.friendly_name
     
     @property
     def chains(self):
         """:obj:`list` of :obj:`RestChain`: List of chain instances."""
-        json_data = self._get('/chain')
-        return [RestChain(self, ChainIdModel.from_json(item)) for item in json_data]
+        json_data = self._get_cached('/chain')
+        return [self._chain_handle(ChainIdModel.from_json(item)) for item in json_data]
 
     @property
     def details(self):
         """:obj:`il2_rest.models.NodeDetailsModel`: Get node details."""
-        return NodeDetailsModel.from_json(self._get('/'))
+        return NodeDetailsModel.from_json(self._get_cached('/'))
     
     @property
     def mirrors(self):
         """:obj:`list` of :obj:`RestChain`: Get list of mirrors instances."""
-        json_data = self._get('/mirrors')
-        return [RestChain(self, ChainIdModel.from_json(item)) for item in json_data]
+        json_data = self._get_cached('/mirrors')
+        return [self._chain_handle(ChainIdModel.from_json(item)) for item in json_data]
     
 
     @property
     def peers(self):
         """:obj:`list` of :obj:`il2_rest.models.PeerModel`: Get list of known peers."""
-        json_data = self._get('/peers')
+        json_data = self._get_cached('/peers')
         return [PeerModel.from_json(item) for item in json_data]
     
     @property
     def documents_config(self) :
         """:obj:`il2_rest.models.DocumentUploadConfigurationModel`: Get documents upload configuration. """
-        return DocumentUploadConfigurationModel.from_json(self._get('/documents/configuration'))
+        json_data = self._documents_config_cache.get_or_load('/documents/configuration', 
+                        lambda: self._get('/documents/configuration'))
+        return DocumentUploadConfigurationModel.from_json(dict(json_data))
+
+    @property
+    def cache_stats(self) :
+        """:obj:`dict` of :obj:`il2_rest.cache.CacheStats`: Hit/miss counters of the client-side caches by name."""
+        stats = {
+            'documents_config': self._documents_config_cache.stats,
+            'summaries': self._summary_cache.stats,
+            'documents_metadata': self._documents_metadata_cache.stats,
+        }
+        if self._record_cache is not None :
+            stats['records'] = self._record_cache.stats
+        if self._response_cache is not None :
+            stats['responses'] = self._response_cache.stats
+        return stats
+
+    def follow(self, chains, from_serials=None, poll_interval=1.0, max_batch=100, max_interval=30.0, stop_event=None) :
+        """
+        Yield the records of many chains as they are added.
+
+        The chains are polled one at a time from the calling thread, so all requests share the connection pool of the node.
+        Each chain has its own polling interval: while records are returned and the chain has more records (see
+        :obj:`RestChain.refresh`), the next batch is requested right away;
+        after records are found, it is polled again in `poll_interval` seconds; and each poll without records doubles
+        the interval, up to `max_interval`.
+
+        Args:
+            chains (:obj:`list` of :obj:`RestChain`): Chains to be followed.
+            from_serials (:obj:`dict` of :obj:`int`, optional): First serial to be yielded by chain id.
+                For chains not in `from_serials`, only records added after the call are yielded.
+            poll_interval (:obj:`float`, optional): Seconds to wait after a chain has no more records.
+            max_batch (:obj:`int`, optional): Maximum number of records requested at once.
+            max_interval (:obj:`float`, optional): Maximum number of seconds between polls of a chain.
+            stop_event (:obj:`threading.Event`, optional): Event that stops the iteration when set.
+
+        Yields:
+            (:obj:`RestChain`, :obj:`il2_rest.models.RecordModel`): Chain and new record, in serial order for each chain.
+
+        Raises:
+            ValueError: If `max_batch` is less than 1.
+
+        Example:
+            >>> for chain, record in node.follow(node.chains) :
+            ...     print(chain.id, record.serial)
+        """
+        if max_batch < 1 :
+            raise ValueError('max_batch must be at least 1.')
+        return self.__follow(chains, from_serials or {}, poll_interval, max_batch, max_interval, stop_event or threading.Event())
+
+    def __follow(self, chains, from_serials, poll_interval, max_batch, max_interval, stop_event) :
+        # [next poll time, position, chain, next serial, idle interval]
+        schedule = []
+        for position, chain in enumerate(chains) :
+            serial = from_serials.get(chain.id)
+            if serial is None :
+                last_record = chain.refresh().lastRecord
+                serial = 0 if last_record is None else last_record + 1
+            schedule.append([0.0, position, chain, serial, poll_interval])
+        heapq.heapify(schedule)
+        while schedule and not stop_event.is_set() :
+            delay = schedule[0][0] - time.monotonic()
+            if delay > 0 :
+                stop_event.wait(delay)
+                continue
+            _, position, chain, serial, interval = schedule[0]
+            records = [record for record in chain.records(firstSerial=serial, pageSize=max_batch).items if record.serial >= serial]
+            for record in records :
+                yield chain, record
+            # The node may return fewer records than requested (e.g. a smaller page limit),
+            # so the chain is busy while the records returned do not reach its last record
+            busy = False
+            if records :
+                serial = records[-1].serial + 1
+                interval = poll_interval
+                last_record = chain.refresh().lastRecord
+                busy = last_record is not None and serial <= last_record
+            if busy :
+                due = time.monotonic()
+            else :
+                due = time.monotonic() + interval
+                interval = min(interval * 2, max_interval)
+            heapq.heapreplace(schedule, [due, position, chain, serial, interval])
+
+    def refresh(self) :
+        """
+        Discard the summary snapshots of the chains and the cached responses,
+        so the next accesses are requested to the node.
+        """
+        self._summary_cache.invalidate()
+        if self._response_cache is not None :
+            self._response_cache.invalidate()
 
     def add_mirrors_of(self, new_mirrors) :
         """
@@ -898,6 +1235,7 @@ class RestNode :
             :obj:`list` of :obj:`il2_rest.models.ChainIdModel`: List of the chain information.
         """
         json_data = self._post("/mirrors", new_mirrors)
+        self._invalidate_responses('/mirrors')
         return [ChainIdModel.from_json(item) for item in json_data]
 
     def chain_by_id(self, chain_id) :
@@ -916,8 +1254,8 @@ class RestNode :
             >>> print(chain)
             Chain '3.6.2 chain name' #A1wCG9hHhuVNb8hyOALHokYsWyTumHU0vRxtcK-iDKE
         """
-        json_data = self._get(f'/chain/{chain_id}')
-        return RestChain(self, ChainIdModel.from_json(json_data))
+        json_data = self._summary_cache.get_or_load(chain_id, lambda : self._get(f'/chain/{chain_id}'))
+        return self._chain_handle(ChainIdModel.from_json(dict(json_data)))
 
     def create_chain(self, model) :
         """
@@ -962,7 +1300,9 @@ class RestNode :
             >>> print(resp)
             Chain 'New chain name' #cRPeHOITV_t1ZQS9CIL7Yi3djJ33ynZCdSRsEnOvX40
         """
-        return ChainCreatedModel.from_json(self._post("/chain", model))
+        created = ChainCreatedModel.from_json(self._post("/chain", model))
+        self._invalidate_responses('/chain')
+        return created
 
     def interlocks_of(self, chain) :
         """
@@ -1012,11 +1352,43 @@ class RestNode :
     def _get(self, url, params={}) :
         return self._call_api(url, 'GET', params=params).json()
 
+    def _chain_handle(self, chain_id_model) :
+        with self.__chain_handles_lock :
+            chain = self.__chain_handles.get(chain_id_model.id)
+            if chain is None :
+                chain = self.__chain_handles[chain_id_model.id] = RestChain(self, chain_id_model)
+            else :
+                chain.name = chain_id_model.name
+                chain.licensingStatus = chain_id_model.licensingStatus
+            return chain
+
+    def _chain_changed(self, chain_id) :
+        self._summary_cache.invalidate(chain_id)
+
+    def _get_cached(self, url) :
+        return json.loads(self._get_cached_text(url))
+
+    def _get_cached_text(self, url) :
+        if self._response_cache is None :
+            return self._call_api(url, 'GET').text
+        return self._response_cache.get(url, lambda headers : self._prepare_request(url, 'GET', "application/json", headers=headers))
+
+    def _invalidate_responses(self, url) :
+        if self._response_cache is not None :
+            self._response_cache.invalidate(url)
+
+    def _get_record(self, chain_id, serial, representation, url) :
+        if self._record_cache is None :
+            return self._get(url)
+        # The response text is cached, so each call returns a new JSON object
+        text = self._record_cache.get_or_load(f'{chain_id}/{serial}/{representation}', lambda : self._call_api(url, 'GET').text)
+        return json.loads(text)
+
     def _post(self, url, body, params={}) :
         return self._prepare_post_request(url, body, "application/json", params=params).json()
 
-    def _post_raw(self, url, body, contentType, params={}) :
-        return self._prepare_post_raw_request(url, body, "application/json", contentType, params=params)
+    def _post_raw(self, url, body, contentType, params={}, headers=None) :
+        return self._prepare_post_raw_request(url, body, "application/json", contentType, params=params, headers=headers)
 
     def _post_file(self, url, file_path, contentType, params={}) :
         return self._prepare_post_file_request(url, file_path, "application/json", contentType, params=params)
@@ -1071,14 +1443,14 @@ class RestNode :
         self.__treat_response_error(response)
         return response
 
-    def _prepare_request(self, url, method, accept, params={}) :
+    def _prepare_request(self, url, method, accept, params={}, headers=None) :
         cur_uri = self.base_uri.build(path=url)
         s = self._get_session()
         response = s.request(
             method=method,
             url=cur_uri,
             stream=True,
-            headers={'Accept': accept},
+            headers=dict(headers or {}, Accept=accept),
             params=params,
             timeout=(self._connect_timeout, self._read_timeout),
         )
@@ -1108,10 +1480,10 @@ class RestNode :
         return response
         
 
-    def _prepare_post_raw_request(self, url, body, accept, contentType, params={}) :
+    def _prepare_post_raw_request(self, url, body, accept, contentType, params={}, headers=None) :
         cur_uri = self.base_uri.build(path=url)
-        headers = {'Accept': accept,
-                   'Content-type': contentType}
+        headers = dict(headers or {}, **{'Accept': accept,
+                   'Content-type': contentType})
         
         s = self._get_session()
         response = s.post(
@@ -0,0 +1,824 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Helpers to handle the sets of documents (Multi-Documents) stored in the InterlockLedger.
+"""
+
+import os
+import io
+import time
+import queue
+import datetime
+import struct
+import hashlib
+import zlib
+import mimetypes
+import posixpath
+import threading
+
+import requests
+
+from .enumerations import DocumentsCompression
+from .models import DocumentsMetadataModel
+
+
+_LOCAL_HEADER_SIGNATURE = 0x04034b50
+_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+_CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50
+_END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06054b50
+_ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06064b50
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_ZIP64_EXTRA_ID = 0x0001
+
+_FLAG_ENCRYPTED = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x0008
+_FLAG_UTF8 = 0x0800
+
+_METHOD_STORED = 0
+_METHOD_DEFLATED = 8
+
+
+class _ChunkReader :
+    """
+    Buffered reader over an iterator of byte chunks (e.g. `requests.Response.iter_content`).
+    """
+    def __init__(self, chunks) :
+        self.__chunks = iter(chunks)
+        self.__buffer = bytearray()
+        self.__eof = False
+
+    def __fill(self, size) :
+        while len(self.__buffer) < size and not self.__eof :
+            try :
+                self.__buffer += next(self.__chunks)
+            except StopIteration :
+                self.__eof = True
+
+    def read(self, size) :
+        """ Read up to `size` bytes. Returns less bytes only at the end of the stream."""
+        self.__fill(size)
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def read_exactly(self, size) :
+        """ Read exactly `size` bytes or raise :obj:`ValueError`."""
+        data = self.read(size)
+        if len(data) != size :
+            raise ValueError('Unexpected end of the ZIP stream.')
+        return data
+
+    def read_some(self, size) :
+        """ Read up to `size` bytes, returning whatever is already buffered (at least one byte if not at the end)."""
+        if not self.__buffer :
+            self.__fill(1)
+        return self.read(min(size, len(self.__buffer)))
+
+    def unread(self, data) :
+        """ Push `data` back to the beginning of the buffer."""
+        self.__buffer[:0] = data
+
+
+class ZipEntryReader(io.RawIOBase) :
+    """
+    Read-only file-like object with the content of a single ZIP entry.
+
+    The content is decompressed as it is read from the underlying stream, so the entry
+    must be consumed before moving to the next entry of the :obj:`ZipStreamReader`.
+    Any unread content is skipped when the reader advances.
+
+    Attributes:
+        name (:obj:`str`): Name of the entry inside the ZIP file.
+        compressed_size (:obj:`int`): Size of the compressed data (`None` if unknown until the end of the entry).
+        size (:obj:`int`): Size of the uncompressed data (`None` if unknown until the end of the entry).
+    """
+    def __init__(self, source, name, flags, method, crc, compressed_size, size) :
+        super().__init__()
+        if method not in (_METHOD_STORED, _METHOD_DEFLATED) :
+            raise ValueError(f"Compression method {method} of '{name}' is not supported.")
+        if method == _METHOD_STORED and compressed_size is None :
+            raise ValueError(f"Entry '{name}' is stored with a data descriptor and cannot be streamed.")
+        self.name = name
+        self.compressed_size = compressed_size
+        self.size = size
+        self.__source = source
+        self.__flags = flags
+        self.__method = method
+        self.__expected_crc = crc
+        self.__crc = 0
+        self.__remaining = compressed_size
+        self.__decompressor = zlib.decompressobj(-15) if method == _METHOD_DEFLATED else None
+        self.__pending = b''
+        self.__finished = False
+
+    def readable(self) :
+        return True
+
+    def readinto(self, b) :
+        data = self.__read_data(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def __read_data(self, size) :
+        while not self.__pending and not self.__finished :
+            self.__pending = self.__next_block(max(size, io.DEFAULT_BUFFER_SIZE))
+        data = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+        return data
+
+    def __next_block(self, size) :
+        if self.__remaining is not None :
+            raw = self.__source.read_some(min(size, self.__remaining))
+            if not raw and self.__remaining :
+                raise ValueError(f"Unexpected end of the ZIP stream while reading '{self.name}'.")
+            self.__remaining -= len(raw)
+        else :
+            raw = self.__source.read_some(size)
+            if not raw :
+                raise ValueError(f"Unexpected end of the ZIP stream while reading '{self.name}'.")
+
+        if self.__decompressor :
+            data = self.__decompressor.decompress(raw)
+            finished = self.__decompressor.eof
+            if finished :
+                self.__source.unread(self.__decompressor.unused_data)
+                data += self.__decompressor.flush()
+            elif self.__remaining == 0 :
+                raise ValueError(f"Corrupted compressed data in '{self.name}'.")
+        else :
+            data = raw
+            finished = self.__remaining == 0
+        self.__crc = zlib.crc32(data, self.__crc)
+        if finished :
+            self.__finish()
+        return data
+
+    def __finish(self) :
+        self.__finished = True
+        if self.__flags & _FLAG_DATA_DESCRIPTOR :
+            self.__read_data_descriptor()
+        if self.__crc != self.__expected_crc :
+            raise ValueError(f"CRC-32 mismatch in '{self.name}'.")
+
+    def __read_data_descriptor(self) :
+        head = self.__source.read_exactly(4)
+        if struct.unpack('<I', head)[0] != _DATA_DESCRIPTOR_SIGNATURE :
+            # The signature is optional
+            self.__source.unread(head)
+        self.__expected_crc = struct.unpack('<I', self.__source.read_exactly(4))[0]
+        # Sizes may be 4 or 8 bytes (ZIP64). Peek the next signature to find out.
+        sizes = self.__source.read(20)
+        next_signature = struct.unpack('<I', sizes[8:12])[0] if len(sizes) >= 12 else None
+        if next_signature in (_LOCAL_HEADER_SIGNATURE, _CENTRAL_DIRECTORY_SIGNATURE) :
+            self.__source.unread(sizes[8:])
+        else :
+            self.__source.unread(sizes[16:])
+
+    def skip(self) :
+        """ Discard any unread content of the entry."""
+        if self.__finished :
+            self.__pending = b''
+            return
+        if self.__decompressor is None and self.__pending == b'' :
+            while self.__remaining :
+                raw = self.__source.read_some(min(self.__remaining, io.DEFAULT_BUFFER_SIZE))
+                if not raw :
+                    raise ValueError(f"Unexpected end of the ZIP stream while reading '{self.name}'.")
+                self.__remaining -= len(raw)
+                self.__crc = zlib.crc32(raw, self.__crc)
+            self.__finish()
+        else :
+            while self.__read_data(io.DEFAULT_BUFFER_SIZE) :
+                pass
+
+
+class ZipStreamReader :
+    """
+    Read the entries of a ZIP file as it is received, without writing it to disk.
+
+    The ZIP is parsed using only the local file headers, so the central directory at the end
+    of the file is never needed. Each entry is matched with the corresponding
+    :obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry` of the public directory, if available.
+
+    Args:
+        chunks (iterable of :obj:`bytes`): Chunks of the ZIP file (e.g. `response.iter_content(65536)`).
+        public_directory (:obj:`list` of :obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry`, optional):
+            Public directory of the set of documents.
+
+    Example:
+        >>> response = chain.download_documents_zip_request(locator)
+        >>> for entry, f in ZipStreamReader(response.iter_content(65536)) :
+        ...     print(entry.name, len(f.read()))
+    """
+    def __init__(self, chunks, public_directory=None) :
+        self.__source = _ChunkReader(chunks)
+        self.__by_path = {}
+        self.__by_name = {}
+        for entry in public_directory or [] :
+            self.__by_path[self.__normalize(posixpath.join(entry.path or '', entry.name or ''))] = entry
+            self.__by_name.setdefault(entry.name, entry)
+
+    @staticmethod
+    def __normalize(path) :
+        return posixpath.normpath('/' + path.replace('\\', '/')).lstrip('/')
+
+    def directory_entry(self, name) :
+        """
+        Find the directory entry for a file in the ZIP.
+
+        Args:
+            name (:obj:`str`): Name of the entry inside the ZIP file.
+
+        Returns:
+            :obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry`: The matching entry from the public directory.
+            If there is no match, a new entry is built from the name.
+        """
+        path = self.__normalize(name)
+        entry = self.__by_path.get(path)
+        if entry is None :
+            entry = self.__by_name.get(posixpath.basename(path))
+        if entry is None :
+            dirname = posixpath.dirname(path)
+            entry = DocumentsMetadataModel.DirectoryEntry(name=posixpath.basename(path), path=f'/{dirname}' if dirname else '/')
+        return entry
+
+    def __iter__(self) :
+        current = None
+        while True :
+            if current is not None :
+                current.skip()
+                current.close()
+            header = self.__source.read(_LOCAL_HEADER.size)
+            if len(header) < 4 :
+                return
+            signature = struct.unpack('<I', header[:4])[0]
+            if signature in (_CENTRAL_DIRECTORY_SIGNATURE, _END_OF_CENTRAL_DIRECTORY_SIGNATURE, _ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE) :
+                return
+            if signature != _LOCAL_HEADER_SIGNATURE or len(header) < _LOCAL_HEADER.size :
+                raise ValueError('Invalid ZIP local file header.')
+            current = self.__open_entry(header)
+            if current.name.endswith('/') :
+                continue
+            yield self.directory_entry(current.name), current
+
+    def __open_entry(self, header) :
+        (_, _, flags, method, _, _, crc, compressed_size, size, name_len, extra_len) = _LOCAL_HEADER.unpack(header)
+        if flags & _FLAG_ENCRYPTED :
+            raise ValueError('Encrypted ZIP entries are not supported.')
+        raw_name = self.__source.read_exactly(name_len)
+        extra = self.__source.read_exactly(extra_len)
+        name = raw_name.decode('utf-8' if flags & _FLAG_UTF8 else 'cp437')
+
+        if size == 0xFFFFFFFF or compressed_size == 0xFFFFFFFF :
+            size, compressed_size = self.__zip64_sizes(extra, size, compressed_size)
+        if flags & _FLAG_DATA_DESCRIPTOR :
+            crc = None
+            compressed_size = None
+            size = None
+        return ZipEntryReader(self.__source, name, flags, method, crc, compressed_size, size)
+
+    @staticmethod
+    def __zip64_sizes(extra, size, compressed_size) :
+        offset = 0
+        while offset + 4 <= len(extra) :
+            tag, length = struct.unpack('<HH', extra[offset:offset+4])
+            data = extra[offset+4:offset+4+length]
+            if tag == _ZIP64_EXTRA_ID :
+                values = list(struct.unpack(f'<{len(data)//8}Q', data[:len(data)//8*8]))
+                if size == 0xFFFFFFFF and values :
+                    size = values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values :
+                    compressed_size = values.pop(0)
+                break
+            offset += 4 + length
+        return size, compressed_size
+
+
+def _document_key(path, name) :
+    return posixpath.normpath('/' + posixpath.join((path or '').replace('\\', '/'), name or '')).lstrip('/')
+
+
+def sha256_of(fileobj, chunk_size=65536) :
+    """
+    Compute the SHA-256 digest of the content of a file-like object.
+
+    Args:
+        fileobj (file-like): Object opened in binary mode.
+        chunk_size (:obj:`int`, optional): Size of the blocks read from `fileobj`.
+
+    Returns:
+        :obj:`str`: Hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(chunk_size), b'') :
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentDigest :
+    """
+    Integrity information of an uploaded document.
+
+    Attributes:
+        name (:obj:`str`): Document file name.
+        path (:obj:`str`): Relative path of the document inside the record.
+        size (:obj:`int`): Size of the uncompressed content in bytes.
+        sha256 (:obj:`str`): Hexadecimal SHA-256 digest of the uncompressed content.
+        sent_size (:obj:`int`): Number of bytes sent to the node (differs from `size` if compressed).
+    """
+    def __init__(self, name, path, size, sha256, sent_size=None) :
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.sent_size = size if sent_size is None else sent_size
+
+    @property
+    def key(self) :
+        """:obj:`str`: Normalized path of the document ('folder/name')."""
+        return _document_key(self.path, self.name)
+
+    def matches(self, fileobj, chunk_size=65536) :
+        """
+        Check if the content of a file-like object matches this digest.
+
+        Args:
+            fileobj (file-like): Object opened in binary mode.
+
+        Returns:
+            :obj:`bool`: True if the SHA-256 digest is the same.
+        """
+        return sha256_of(fileobj, chunk_size) == self.sha256
+
+    def __str__(self) :
+        return f"{self.key} ({self.size} bytes) {self.sha256}#SHA256"
+
+
+class _HashingReader :
+    """
+    File-like wrapper that hashes the content as it is read by the HTTP client.
+    """
+    def __init__(self, fileobj, digest, size, chunk_size) :
+        self.__fileobj = fileobj
+        self.__digest = digest
+        self.__remaining = size
+        self.__chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size=-1) :
+        block = self.__fileobj.read(size if size is not None and size >= 0 else self.__remaining)
+        self.__digest.update(block)
+        self.__remaining -= len(block)
+        self.bytes_read += len(block)
+        return block
+
+    def __len__(self) :
+        return max(self.__remaining, 0)
+
+    def __iter__(self) :
+        return iter(lambda: self.read(self.__chunk_size), b'')
+
+
+class _BrotliCompressor :
+    def __init__(self) :
+        import brotli
+        self.__compressor = brotli.Compressor()
+
+    def compress(self, data) :
+        return self.__compressor.process(data)
+
+    def flush(self) :
+        return self.__compressor.finish()
+
+
+def _compressor_for(compression) :
+    """ Return (compressor, Content-Encoding) for a :obj:`il2_rest.enumerations.DocumentsCompression`."""
+    if compression is None or compression == DocumentsCompression.NONE :
+        return None, None
+    elif compression == DocumentsCompression.GZIP :
+        return zlib.compressobj(wbits=31), 'gzip'
+    elif compression == DocumentsCompression.BROTLI :
+        return _BrotliCompressor(), 'br'
+    elif compression == DocumentsCompression.ZSTD :
+        import zstandard
+        return zstandard.ZstdCompressor().compressobj(), 'zstd'
+    raise ValueError(f'Compression {compression} is not supported.')
+
+
+class _CompressingReader :
+    """
+    Iterable body that reads, hashes and compresses a file in a worker thread, 
+    so compression overlaps with the network I/O of the request.
+    """
+    _END = object()
+
+    def __init__(self, fileobj, digest, compressor, chunk_size, max_pending_chunks) :
+        self.__fileobj = fileobj
+        self.__digest = digest
+        self.__compressor = compressor
+        self.__chunk_size = chunk_size
+        self.__queue = queue.Queue(maxsize=max_pending_chunks)
+        self.__stop = threading.Event()
+        self.bytes_read = 0
+        self.bytes_sent = 0
+
+    def __put(self, item) :
+        while not self.__stop.is_set() :
+            try :
+                self.__queue.put(item, timeout=0.1)
+                return
+            except queue.Full :
+                pass
+
+    def __work(self) :
+        try :
+            for block in iter(lambda: self.__fileobj.read(self.__chunk_size), b'') :
+                self.__digest.update(block)
+                self.bytes_read += len(block)
+                out = self.__compressor.compress(block)
+                if out :
+                    self.__put(out)
+            self.__put(self.__compressor.flush())
+            self.__put(self._END)
+        except BaseException as e :
+            self.__put(e)
+
+    def __iter__(self) :
+        worker = threading.Thread(target=self.__work, daemon=True)
+        worker.start()
+        try :
+            while True :
+                item = self.__queue.get()
+                if item is self._END :
+                    break
+                if isinstance(item, BaseException) :
+                    raise item
+                if item :
+                    self.bytes_sent += len(item)
+                    yield item
+        finally :
+            self.__stop.set()
+            worker.join()
+
+
+class DocumentUploader :
+    """
+    Upload documents to a multi-document transaction computing a SHA-256 digest of each file 
+    while it is sent, so the sources don't need to be read again to verify downloads.
+
+    Optionally, the documents can be compressed on the client side in a worker thread, overlapping 
+    the compression with the network I/O. The compressed content is sent with the Content-Encoding 
+    header, so only enable it when the node accepts compressed request bodies.
+
+    Args:
+        chain (:obj:`il2_rest.client.RestChain`): Chain where the documents will be stored.
+        compression (:obj:`il2_rest.enumerations.DocumentsCompression`, optional): Client-side compression. 
+            `BROTLI` and `ZSTD` need the `brotli` and `zstandard` packages.
+        chunk_size (:obj:`int`, optional): Size of the blocks read from the files.
+        max_pending_chunks (:obj:`int`, optional): Maximum number of compressed blocks waiting to be sent.
+
+    Attributes:
+        digests (:obj:`dict` of :obj:`DocumentDigest`): Digests of the uploaded documents by path ('folder/name').
+
+    Example:
+        >>> uploader = DocumentUploader(chain, compression=DocumentsCompression.GZIP)
+        >>> resp = chain.documents_begin_transaction(comment='Using uploader')
+        >>> uploader.add_item(resp.transactionId, 'item1.txt', 'First file', './test.txt')
+        >>> locator = chain.documents_transaction_commit(resp.transactionId)
+        >>> uploader.verify_zip(locator)
+        {'item1.txt': True}
+    """
+    def __init__(self, chain, compression=None, chunk_size=65536, max_pending_chunks=8) :
+        if chain is None :
+            raise TypeError('chain is None')
+        self.chain = chain
+        self.compression = compression if compression is None or isinstance(compression, DocumentsCompression) else DocumentsCompression(compression)
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks
+        self.digests = {}
+        # Fail early if the compressor is not available
+        _compressor_for(self.compression)
+
+    def add_item(self, transaction_id, name, comment, filepath, relative_path="/", content_type=None) :
+        """
+        Adds a document to a pending transaction, recording its digest.
+
+        Args:
+            transaction_id (:obj:`str`): Id of the ongoing transaction.
+            name (:obj:`str`): File name.
+            comment (:obj:`str`): Additional comment.
+            filepath (:obj:`str`): Path to the file to upload.
+            relative_path (:obj:`str`, optional): Relative path of the file inside the record.
+            content_type (:obj:`str`, optional): File mime-type. 
+                If None, it will try to guess the mime-type based on the file extension.
+
+        Returns:
+            :obj:`il2_rest.models.DocumentsTransactionModel`: Status of the transaction. `None` if fail.
+        """
+        if not content_type :
+            content_type = mimetypes.MimeTypes().guess_type(filepath)[0]
+        filepath = os.path.expanduser(filepath)
+        digest = hashlib.sha256()
+        compressor, content_encoding = _compressor_for(self.compression)
+        with open(filepath, 'rb') as f :
+            if compressor :
+                body = _CompressingReader(f, digest, compressor, self.chunk_size, self.max_pending_chunks)
+            else :
+                body = _HashingReader(f, digest, os.fstat(f.fileno()).st_size, self.chunk_size)
+            resp = self.chain.documents_transaction_add_stream(transaction_id, name, comment, body, content_type, 
+                                        relative_path=relative_path, content_encoding=content_encoding)
+        if resp is not None :
+            item = DocumentDigest(name, relative_path, body.bytes_read, digest.hexdigest(), 
+                                  getattr(body, 'bytes_sent', body.bytes_read))
+            self.digests[item.key] = item
+        return resp
+
+    def digest_for(self, entry) :
+        """
+        Get the digest of an uploaded document.
+
+        Args:
+            entry (:obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry`/:obj:`str`): Directory entry or path ('folder/name').
+
+        Returns:
+            :obj:`DocumentDigest`: Digest of the document or `None` if it was not uploaded by this instance.
+        """
+        if isinstance(entry, str) :
+            return self.digests.get(_document_key('', entry))
+        return self.digests.get(_document_key(entry.path, entry.name))
+
+    def verify(self, entry, fileobj) :
+        """
+        Verify a downloaded document against the digest recorded during the upload.
+
+        Args:
+            entry (:obj:`il2_rest.models.DocumentsMetadataModel.DirectoryEntry`/:obj:`str`): Directory entry or path ('folder/name').
+            fileobj (file-like): Content of the downloaded document.
+
+        Returns:
+            :obj:`bool`: True if the content matches.
+
+        Raises:
+            KeyError: If the document was not uploaded by this instance.
+        """
+        digest = self.digest_for(entry)
+        if digest is None :
+            raise KeyError(f'No digest recorded for {entry}')
+        return digest.matches(fileobj, self.chunk_size)
+
+    def verify_zip(self, locator) :
+        """
+        Download the set of documents and verify each document against the recorded digests.
+
+        Args:
+            locator (:obj:`str`): A Documents Storage Locator.
+
+        Returns:
+            :obj:`dict`: Verification result (:obj:`bool`) by document path. Documents without a recorded digest are not included.
+        """
+        ret = {}
+        for entry, f in self.chain.iter_documents_in_zip(locator, chunk_size=self.chunk_size) :
+            digest = self.digest_for(entry)
+            if digest is not None :
+                ret[digest.key] = digest.matches(f, self.chunk_size)
+        return ret
+
+
+class _PendingDocument :
+    def __init__(self, name, comment, filepath, relative_path, content_type) :
+        self.name = name
+        self.comment = comment
+        self.filepath = os.path.expanduser(filepath)
+        self.relative_path = relative_path
+        self.content_type = content_type
+        self.size = os.path.getsize(self.filepath)
+        self.digest = None
+        self.uploaded = False
+
+
+class DocumentsTransaction :
+    """
+    Context manager to store a set of documents in a single transaction, handling the transaction timeout.
+
+    Documents are queued with :obj:`add_item` and uploaded when the transaction is committed 
+    (at the end of the `with` block), so the transaction deadline 
+    (:obj:`il2_rest.models.DocumentsTransactionModel.timeOutLimit`) only starts counting when the 
+    upload starts. The upload throughput is measured to check if each document can be uploaded 
+    before the deadline; if not, a new transaction is started before wasting bandwidth on an upload that would be discarded.
+
+    The transaction status is only requested when an upload fails. If the transaction is still 
+    alive, only the documents not accounted by the node are uploaded again. If it has expired, 
+    the node discards all uploaded documents, so a new transaction is started and the documents 
+    are uploaded again, checking that their content still matches the SHA-256 digests retained from the first upload.
+
+    If the `with` block raises an exception, the transaction is not committed and the node rolls it back on timeout.
+
+    Args:
+        chain (:obj:`il2_rest.client.RestChain`): Chain where the documents will be stored.
+        comment (:obj:`str`, optional): Any additional information about the set of documents to be stored.
+        compression (:obj:`il2_rest.enumerations.DocumentsCompression`, optional): Compression algorithm used by the node.
+        generatePublicDirectory (:obj:`bool`, optional): If the publically viewable PublicDirectory field should be created.
+        iterations (:obj:`int`, optional): Override for the number of PBE iterations to generate the key.
+        encryption (:obj:`str`, optional): The encryption descriptor in the <pbe>-<hash>-<cipher>-<level> format.
+        password (:obj:`bytes`, optional): Password as bytes if Encryption is not null.
+        uploader (:obj:`DocumentUploader`, optional): Uploader used to send the documents.
+        safety_margin (:obj:`float`, optional): Time in seconds reserved before the deadline (default 5s).
+        max_restarts (:obj:`int`, optional): Maximum number of times the transaction is started again (default 3).
+        clock (:obj:`callable`, optional): Function returning the current time as an aware :obj:`datetime.datetime`.
+
+    Attributes:
+        transaction (:obj:`il2_rest.models.DocumentsTransactionModel`): Current transaction.
+        locator (:obj:`str`): Documents storage locator, available after commit.
+        restarts (:obj:`int`): Number of times the transaction was started again.
+        uploader (:obj:`DocumentUploader`): Uploader with the digests of the documents.
+
+    Example:
+        >>> with chain.documents_transaction(comment='Large files') as transaction :
+        ...     transaction.add_item('item1.bin', 'First file', './item1.bin')
+        ...     transaction.add_item('item2.bin', 'Second file', './item2.bin')
+        >>> print(transaction.locator)
+    """
+    def __init__(self, chain, comment=None, compression=None, generatePublicDirectory=None, iterations=None, 
+                 encryption=None, password=None, uploader=None, safety_margin=5, max_restarts=3, clock=None) :
+        if chain is None :
+            raise TypeError('chain is None')
+        self.chain = chain
+        self.uploader = uploader if uploader else DocumentUploader(chain)
+        self.safety_margin = safety_margin
+        self.max_restarts = max_restarts
+        self.transaction = None
+        self.locator = None
+        self.restarts = 0
+        self.__begin_args = dict(comment=comment, compression=compression, generatePublicDirectory=generatePublicDirectory, 
+                                 iterations=iterations, encryption=encryption, password=password)
+        self.__clock = clock if clock else lambda: datetime.datetime.now(datetime.timezone.utc)
+        self.__items = []
+        self.__bytes_per_second = None
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) :
+        if exc_type is None and self.locator is None :
+            self.commit()
+        return False
+
+    def add_item(self, name, comment, filepath, relative_path="/", content_type=None) :
+        """
+        Queue a document to be uploaded.
+
+        Args:
+            name (:obj:`str`): File name.
+            comment (:obj:`str`): Additional comment.
+            filepath (:obj:`str`): Path to the file to upload.
+            relative_path (:obj:`str`, optional): Relative path of the file inside the record.
+            content_type (:obj:`str`, optional): File mime-type. 
+                If None, it will try to guess the mime-type based on the file extension.
+        """
+        if self.locator is not None :
+            raise ValueError('The transaction is already committed.')
+        self.__items.append(_PendingDocument(name, comment, filepath, relative_path, content_type))
+
+    @property
+    def remaining_time(self) :
+        """:obj:`float`: Seconds until the deadline of the current transaction (`None` if not started)."""
+        if self.transaction is None :
+            return None
+        return (self.transaction.timeOutLimit - self.__clock()).total_seconds()
+
+    def estimated_upload_time(self, size) :
+        """
+        Estimate the time to upload `size` bytes based on the measured throughput.
+
+        Returns:
+            :obj:`float`: Seconds. 0 if no upload was measured yet.
+        """
+        if not self.__bytes_per_second :
+            return 0
+        return size / self.__bytes_per_second
+
+    def commit(self) :
+        """
+        Upload the pending documents and commit the transaction.
+
+        Returns:
+            :obj:`str`: Documents storage locator.
+
+        Raises:
+            TimeoutError: If the documents could not be stored before the transaction timeout after `max_restarts` attempts.
+        """
+        if self.locator is not None :
+            return self.locator
+        while True :
+            if self.transaction is None or not self.__fits(0) :
+                self.__begin()
+            if self.__upload_pending() :
+                try :
+                    self.locator = self.chain.documents_transaction_commit(self.transaction.transactionId)
+                    return self.locator
+                except requests.RequestException :
+                    if self.__status() is not None :
+                        raise
+            self.__restart()
+
+    def __begin(self) :
+        self.transaction = self.chain.documents_begin_transaction(**self.__begin_args)
+        for item in self.__items :
+            item.uploaded = False
+
+    def __restart(self) :
+        if self.restarts >= self.max_restarts :
+            raise TimeoutError(f'Could not store the documents before the transaction timeout after {self.restarts} restarts.')
+        self.restarts += 1
+        self.__begin()
+
+    def __fits(self, size) :
+        return self.estimated_upload_time(size) + self.safety_margin < self.remaining_time
+
+    def __status(self) :
+        """ Return the transaction status or None if it has expired."""
+        try :
+            status = self.chain.documents_transaction_status(self.transaction.transactionId)
+        except requests.RequestException :
+            return None
+        if status is None or (status.timeOutLimit and status.timeOutLimit <= self.__clock()) :
+            return None
+        return status
+
+    def __upload_pending(self) :
+        """ Upload the documents not uploaded in the current transaction. Return False if the transaction has to be restarted."""
+        if not any(item.uploaded for item in self.__items) :
+            total = sum(item.size for item in self.__items)
+            if not self.__fits(total) :
+                raise TimeoutError(f'The documents ({total} bytes) cannot be uploaded before the transaction timeout.')
+        failures = 0
+        index = 0
+        while index < len(self.__items) :
+            item = self.__items[index]
+            if item.uploaded :
+                index += 1
+                continue
+            if not self.__fits(item.size) :
+                return False
+            if self.__upload(item) :
+                index += 1
+                continue
+            failures += 1
+            status = self.__status()
+            if status is None or failures > self.max_restarts :
+                return False
+            # Documents are accounted in the order they were uploaded, upload again only the missing ones
+            count = status.countOfUploadedDocuments or 0
+            for i, other in enumerate(self.__items) :
+                other.uploaded = i < count
+            index = 0
+        return True
+
+    def __upload(self, item) :
+        start = time.monotonic()
+        try :
+            resp = self.uploader.add_item(self.transaction.transactionId, item.name, item.comment, item.filepath, 
+                                          relative_path=item.relative_path, content_type=item.content_type)
+        except requests.RequestException :
+            return False
+        if resp is None :
+            return False
+        elapsed = time.monotonic() - start
+        if elapsed > 0 and item.size :
+            speed = item.size / elapsed
+            self.__bytes_per_second = speed if self.__bytes_per_second is None else 0.5 * (self.__bytes_per_second + speed)
+
+        digest = self.uploader.digest_for(_document_key(item.relative_path, item.name))
+        if item.digest is None :
+            item.digest = digest.sha256
+        elif item.digest != digest.sha256 :
+            raise ValueError(f"The content of '{item.filepath}' changed since it was first uploaded.")
+        item.uploaded = True
+        return True
@@ -0,0 +1,308 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Checkpointed export of the records of a chain to files.
+"""
+
+import os
+import json
+import zlib
+import queue
+import threading
+
+from .enumerations import DocumentsCompression
+
+
+def _gzip_member(data) :
+    # zlib.compress only accepts wbits from Python 3.11
+    compressor = zlib.compressobj(wbits=31)
+    return compressor.compress(data) + compressor.flush()
+
+def _batch_compressor(compression) :
+    # Each batch is written as a complete gzip member/zstd frame, so a file can be truncated after
+    # any batch and appended to again (concatenated members/frames are read as a single stream).
+    if compression is None or compression == DocumentsCompression.NONE :
+        return (lambda data : data), ''
+    elif compression == DocumentsCompression.GZIP :
+        return _gzip_member, '.gz'
+    elif compression == DocumentsCompression.ZSTD :
+        import zstandard
+        compressor = zstandard.ZstdCompressor()
+        return compressor.compress, '.zst'
+    raise ValueError(f'Compression {compression} is not supported.')
+
+
+class _NdjsonPart :
+    """ Output file with one JSON record per line, resumable after any batch."""
+    resumable = True
+
+    def __init__(self, path, compression, offset) :
+        self.path = path
+        self.__compress = _batch_compressor(compression)[0]
+        if offset :
+            self.__file = open(path, 'r+b')
+            self.__file.truncate(offset)
+            self.__file.seek(offset)
+        else :
+            self.__file = open(path, 'wb')
+        self.size = offset
+
+    def write(self, records) :
+        data = ''.join(record.json(return_as_str=True) + '\n' for record in records).encode('utf-8')
+        self.size += self.__file.write(self.__compress(data))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def close(self) :
+        self.__file.close()
+
+
+class _ParquetPart :
+    """ Parquet output file, only complete after it is closed."""
+    resumable = False
+
+    def __init__(self, path) :
+        import pyarrow.parquet
+        self.path = path
+        self.__writer = None
+        self.__parquet = pyarrow.parquet
+
+    @staticmethod
+    def __row(record) :
+        row = record.json()
+        if 'payload' in row :
+            row['payload'] = json.dumps(row['payload'])
+        if getattr(record, 'payloadBytes', None) is not None :
+            row['payloadBytes'] = record.payloadBytes
+        return row
+
+    def write(self, records) :
+        import pyarrow
+        rows = [self.__row(record) for record in records]
+        if self.__writer is None :
+            table = pyarrow.Table.from_pylist(rows)
+            self.__writer = self.__parquet.ParquetWriter(self.path, table.schema)
+        else :
+            table = pyarrow.Table.from_pylist(rows, schema=self.__writer.schema)
+        self.__writer.write_table(table)
+
+    @property
+    def size(self) :
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self) :
+        if self.__writer is not None :
+            self.__writer.close()
+
+
+class ChainExporter :
+    """
+    Export the records of a chain to NDJSON or Parquet files.
+
+    Pages of records are requested in the calling thread and written by a writer thread, so requests
+    and disk writes overlap. The serial of the last exported record is saved in a checkpoint file
+    (`<prefix>.checkpoint`) and the next export resumes after it, e.g. after a crash.
+
+    NDJSON files are checkpointed after each page. Parquet files (which require :obj:`pyarrow`) are
+    only complete when closed and cannot be appended to, so they are checkpointed when rotated or at
+    the end of the export, each export starts a new file and an interrupted file is written again.
+
+    Args:
+        chain (:obj:`il2_rest.RestChain`): Chain to be exported.
+        prefix (:obj:`str`): Path prefix of the output files, numbered as `<prefix>-00000.ndjson`.
+        as_json (:obj:`bool`, optional): If True, export the records with the payload mapped to JSON
+            (:obj:`il2_rest.RestChain.records_as_json`).
+        output_format (:obj:`str`, optional): 'ndjson' or 'parquet'.
+        compression (:obj:`il2_rest.enumerations.DocumentsCompression`, optional): Compression of the NDJSON files
+            (`NONE`, `GZIP` or `ZSTD`, which requires :obj:`zstandard`).
+        page_size (:obj:`int`, optional): Number of records requested at once.
+        rotate_records (:obj:`int`, optional): Maximum number of records in each file.
+        rotate_bytes (:obj:`int`, optional): Size in bytes after which a new file is started.
+        queue_size (:obj:`int`, optional): Maximum number of pages waiting for the writer thread.
+
+    Example:
+        >>> exporter = ChainExporter(chain, '/backup/chain', compression=DocumentsCompression.GZIP, rotate_records=100000)
+        >>> exporter.export()
+        2500
+        >>> exporter.files
+        ['/backup/chain-00000.ndjson.gz']
+    """
+    def __init__(self, chain, prefix, as_json=False, output_format='ndjson', compression=DocumentsCompression.NONE,
+                 page_size=100, rotate_records=None, rotate_bytes=None, queue_size=4) :
+        if output_format not in ('ndjson', 'parquet') :
+            raise ValueError(f'Output format {output_format} is not supported.')
+        self.chain = chain
+        self.prefix = os.path.expanduser(prefix)
+        self.as_json = as_json
+        self.output_format = output_format
+        self.compression = compression
+        self.page_size = page_size
+        self.rotate_records = rotate_records
+        self.rotate_bytes = rotate_bytes
+        self.queue_size = queue_size
+        if output_format == 'ndjson' :
+            self.__extension = '.ndjson' + _batch_compressor(compression)[1]
+        else :
+            self.__extension = '.parquet'
+        self.__error = None
+
+    @property
+    def checkpoint_path(self) :
+        """:obj:`str`: Path of the checkpoint file."""
+        return self.prefix + '.checkpoint'
+
+    def __load_checkpoint(self) :
+        if not os.path.exists(self.checkpoint_path) :
+            return {'chain': self.chain.id, 'last_serial': -1, 'part': 0, 'offset': 0, 'part_records': 0, 'files': []}
+        with open(self.checkpoint_path) as f :
+            state = json.load(f)
+        if state['chain'] != self.chain.id :
+            raise ValueError(f'Checkpoint {self.checkpoint_path} belongs to chain {state["chain"]}.')
+        return state
+
+    def __save_checkpoint(self, state) :
+        # Written to a temporary file and renamed, so the checkpoint is never partially written
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f :
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    @property
+    def last_serial(self) :
+        """:obj:`int`: Serial number of the last exported record (-1 if there are no records)."""
+        return self.__load_checkpoint()['last_serial']
+
+    @property
+    def files(self) :
+        """:obj:`list` of :obj:`str`: Paths of the files with exported records."""
+        return self.__load_checkpoint()['files']
+
+    def export(self, last_serial=None) :
+        """
+        Export the records added to the chain since the last export.
+
+        Args:
+            last_serial (:obj:`int`, optional): Last serial to be exported. If omitted, uses the last record of the chain summary.
+
+        Returns:
+            :obj:`int`: Number of exported records.
+        """
+        state = self.__load_checkpoint()
+        if last_serial is None :
+            last_serial = self.chain.summary.lastRecord
+        first_serial = state['last_serial'] + 1
+        pages = queue.Queue(self.queue_size)
+        self.__error = None
+        writer = threading.Thread(target=self.__write, args=(pages, state), daemon=True)
+        writer.start()
+        count = 0
+        try :
+            while last_serial is not None and first_serial <= last_serial and self.__error is None :
+                if self.as_json :
+                    page = self.chain.records_as_json(firstSerial=first_serial, lastSerial=last_serial, pageSize=self.page_size)
+                else :
+                    page = self.chain.records(firstSerial=first_serial, lastSerial=last_serial, pageSize=self.page_size)
+                records = [record for record in page.items if record.serial >= first_serial]
+                if not records :
+                    break
+                self.__put(pages, records)
+                count += len(records)
+                first_serial = records[-1].serial + 1
+        finally :
+            self.__put(pages, None)
+            writer.join()
+        if self.__error is not None :
+            raise self.__error
+        return count
+
+    def __put(self, pages, item) :
+        # The writer stops reading the queue if it fails
+        while self.__error is None :
+            try :
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full :
+                pass
+
+    def __open_part(self, state) :
+        path = f'{self.prefix}-{state["part"]:05d}{self.__extension}'
+        if self.output_format == 'parquet' :
+            return _ParquetPart(path)
+        return _NdjsonPart(path, self.compression, state['offset'])
+
+    def __commit(self, state, part, last_serial) :
+        state['last_serial'] = last_serial
+        state['offset'] = part.size if part.resumable else 0
+        if part.path not in state['files'] :
+            state['files'].append(part.path)
+        self.__save_checkpoint(state)
+
+    def __rotate(self, state, part, last_serial) :
+        part.close()
+        self.__commit(state, part, last_serial)
+        state.update(part=state['part'] + 1, offset=0, part_records=0)
+        self.__save_checkpoint(state)
+
+    def __write(self, pages, state) :
+        part = None
+        last_serial = None
+        try :
+            while True :
+                records = pages.get()
+                if records is None :
+                    break
+                while records :
+                    if part is None :
+                        part = self.__open_part(state)
+                    # Pages are split so a file never has more than rotate_records records
+                    room = self.rotate_records - state['part_records'] if self.rotate_records else len(records)
+                    batch, records = records[:room], records[room:]
+                    part.write(batch)
+                    last_serial = batch[-1].serial
+                    state['part_records'] += len(batch)
+                    if part.resumable :
+                        self.__commit(state, part, last_serial)
+                    if ((self.rotate_records and state['part_records'] >= self.rotate_records)
+                            or (self.rotate_bytes and part.size >= self.rotate_bytes)) :
+                        self.__rotate(state, part, last_serial)
+                        part = None
+            if part is not None :
+                if part.resumable :
+                    part.close()
+                    self.__commit(state, part, last_serial)
+                else :
+                    # A closed Parquet file cannot be reopened, the next export starts a new one
+                    self.__rotate(state, part, last_serial)
+        except BaseException as e :
+            self.__error = e
+            # Data written after the checkpoint is discarded when the export is resumed
+            if part is not None :
+                part.close()
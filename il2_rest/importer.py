@@ -0,0 +1,343 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Bulk import of records from NDJSON and CSV files.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import base64
+import functools
+import argparse
+import threading
+import concurrent.futures
+
+import requests
+
+from .enumerations import RecordType
+from .models import NewRecordModelAsJson
+
+
+def read_ndjson(path) :
+    """
+    Read the items of a NDJSON file (one JSON object per line). Empty lines are ignored.
+
+    Args:
+        path (:obj:`str`): File path.
+
+    Yields:
+        (:obj:`int`, :obj:`dict`): Line number (starting from 0) and item.
+    """
+    with open(os.path.expanduser(path), encoding='utf-8') as f :
+        for number, line in enumerate(f) :
+            if line.strip() :
+                yield number, json.loads(line)
+
+
+def read_csv(path, **kwargs) :
+    """
+    Read the rows of a CSV file with a header.
+
+    Args:
+        path (:obj:`str`): File path.
+        **kwargs: Arguments of :obj:`csv.DictReader`.
+
+    Yields:
+        (:obj:`int`, :obj:`dict`): Row number (starting from 0) and row.
+    """
+    with open(os.path.expanduser(path), encoding='utf-8', newline='') as f :
+        yield from enumerate(csv.DictReader(f, **kwargs))
+
+
+class ImportResult :
+    """
+    Counters of a bulk import.
+
+    Attributes:
+        added (:obj:`int`): Number of records added.
+        skipped (:obj:`int`): Number of items skipped because they were already imported.
+        uncertain (:obj:`list` of :obj:`int`): Items submitted by a previous import that was interrupted before
+            the node answered. They are not submitted again, unless `retry_uncertain` is used.
+        errors (:obj:`list` of (:obj:`int`, :obj:`Exception`)): Items that failed. They are submitted again by the next import.
+        elapsed (:obj:`float`): Duration of the import in seconds.
+    """
+    def __init__(self) :
+        self.added = 0
+        self.skipped = 0
+        self.uncertain = []
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def records_per_second(self) :
+        """:obj:`float`: Import throughput."""
+        return self.added / self.elapsed if self.elapsed else 0.0
+
+    def json(self) :
+        """
+        Returns:
+            :obj:`dict`: JSON representation of the counters.
+        """
+        return {
+            'added': self.added,
+            'skipped': self.skipped,
+            'uncertain': self.uncertain,
+            'errors': [{'item': item, 'error': str(error)} for item, error in self.errors],
+            'elapsed': round(self.elapsed, 3),
+            'recordsPerSecond': round(self.records_per_second, 1),
+        }
+
+    def __str__(self) :
+        return (f'{self.added} records added in {self.elapsed:.1f}s ({self.records_per_second:.1f} records/s), '
+                f'{self.skipped} skipped, {len(self.uncertain)} uncertain, {len(self.errors)} errors')
+
+
+def _not_sent(error) :
+    """ Check if a request certainly did not add a record: rejected by the node (4xx) or failed to connect."""
+    if isinstance(error, requests.HTTPError) :
+        # A 5xx (e.g. a 504 from a proxy) may come after the record was added
+        return error.response is not None and 400 <= error.response.status_code < 500
+    if isinstance(error, requests.ConnectTimeout) :
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args :
+        from urllib3.exceptions import ConnectTimeoutError
+        # urllib3 NewConnectionError (e.g. connection refused) is a ConnectTimeoutError
+        return isinstance(getattr(error.args[0], 'reason', None), ConnectTimeoutError)
+    return False
+
+
+class BulkImporter :
+    """
+    Add many records to a chain with bounded concurrency.
+
+    Items are submitted by a pool of threads. The items waiting for the pool are limited to `max_pending`,
+    so the input is read only as fast as the node accepts the records.
+
+    The progress is kept in an append-only journal file: an item is marked as started before it is
+    submitted and as done (with the serial of the record) or failed when no record was added (the item could
+    not be converted, the connection was refused or the node rejected it with a 4xx status). Done items are skipped by the
+    next imports and failed items are submitted again. Items started without an answer
+    (e.g. after a crash or a timeout, when the node may or may not have added them) are reported as
+    uncertain instead of being submitted again, to avoid duplicate records.
+
+    Each item is a :obj:`dict` that can be:
+
+    * a payload as JSON, added with :obj:`il2_rest.RestChain.add_record_as_json`;
+    * ``{"payload": {...}, "applicationId": 4, "payloadTagId": 500, "type": "Data"}``, overriding the defaults;
+    * ``{"payloadBytes": "<base64>", ...}`` with the payload inner bytes, added with :obj:`il2_rest.RestChain.add_record_unpacked`;
+    * a payload encoded locally with `codec` (:obj:`il2_rest.payloads.PayloadCodec`) and added as bytes.
+
+    Args:
+        chain (:obj:`il2_rest.RestChain`): Chain where the records are added.
+        journal_path (:obj:`str`): Path of the progress journal.
+        applicationId (:obj:`int`, optional): Default application id of the records.
+        payloadTagId (:obj:`int`, optional): Default payload tag id of the records.
+        rec_type (:obj:`il2_rest.enumerations.RecordType`, optional): Default type of the records.
+        codec (:obj:`il2_rest.payloads.PayloadCodec`, optional): If defined, payloads are encoded locally and added as bytes.
+        transform (:obj:`callable`, optional): Function applied to each item read (e.g. to convert the strings of a CSV row).
+        max_workers (:obj:`int`, optional): Number of concurrent requests.
+        max_pending (:obj:`int`, optional): Maximum number of items waiting to be submitted (default: 2 * `max_workers`).
+
+    Example:
+        >>> importer = BulkImporter(chain, 'import.journal', applicationId=4, payloadTagId=500)
+        >>> result = importer.run(read_ndjson('payloads.ndjson'))
+        >>> print(result)
+        1000 records added in 12.5s (80.0 records/s), 0 skipped, 0 uncertain, 0 errors
+    """
+    def __init__(self, chain, journal_path, applicationId=None, payloadTagId=None, rec_type=RecordType.Data,
+                 codec=None, transform=None, max_workers=4, max_pending=None) :
+        self.chain = chain
+        self.journal_path = os.path.expanduser(journal_path)
+        self.applicationId = applicationId
+        self.payloadTagId = payloadTagId
+        self.rec_type = rec_type
+        self.codec = codec
+        self.transform = transform
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self.__lock = threading.Lock()
+
+    def __read_journal(self) :
+        started, done = set(), {}
+        if os.path.exists(self.journal_path) :
+            with open(self.journal_path, encoding='utf-8') as f :
+                for line in f :
+                    parts = line.split()
+                    # A line may be incomplete if the process was killed while writing it
+                    if len(parts) == 2 and parts[0] == 'S' :
+                        started.add(int(parts[1]))
+                    elif len(parts) == 2 and parts[0] == 'F' :
+                        started.discard(int(parts[1]))
+                    elif len(parts) == 3 and parts[0] == 'D' :
+                        done[int(parts[1])] = int(parts[2])
+        return started, done
+
+    def __log(self, journal, line) :
+        with self.__lock :
+            journal.write(line + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def submit(self, item) :
+        """
+        Add the record of an item.
+
+        Args:
+            item (:obj:`dict`): Item (see :obj:`BulkImporter`).
+
+        Returns:
+            :obj:`il2_rest.models.RecordModelBase`: Added record.
+        """
+        return self.__prepare(item)()
+
+    def __prepare(self, item) :
+        # Everything that may fail before the request is sent, so those failures are not uncertain
+        if self.transform is not None :
+            item = self.transform(item)
+        wrapped = 'payload' in item or 'payloadBytes' in item
+        applicationId = item.get('applicationId', self.applicationId) if wrapped else self.applicationId
+        payloadTagId = item.get('payloadTagId', self.payloadTagId) if wrapped else self.payloadTagId
+        rec_type = RecordType(item['type']) if wrapped and 'type' in item else self.rec_type
+        if 'payloadBytes' in item :
+            return functools.partial(self.chain.add_record_unpacked, applicationId, payloadTagId, base64.b64decode(item['payloadBytes']), rec_type)
+        payload = item['payload'] if wrapped else item
+        if self.codec is not None :
+            return functools.partial(self.chain.add_record_unpacked, applicationId, payloadTagId, self.codec.encode_body(payload), rec_type)
+        model = NewRecordModelAsJson(applicationId=applicationId, payloadTagId=payloadTagId, rec_type=rec_type, rec_json=payload)
+        return functools.partial(self.chain.add_record_as_json, model=model)
+
+    def run(self, items, retry_uncertain=False, progress=None) :
+        """
+        Import items, skipping those already imported.
+
+        Args:
+            items (iterable of (:obj:`int`, :obj:`dict`)): Items with a number that identifies them in the journal
+                (e.g. from :obj:`read_ndjson` or :obj:`read_csv`).
+            retry_uncertain (:obj:`bool`, optional): If True, also submit the uncertain items.
+            progress (:obj:`callable`, optional): Function called with the :obj:`ImportResult` after each record (from the worker threads).
+
+        Returns:
+            :obj:`ImportResult`: Import counters.
+        """
+        result = ImportResult()
+        started, done = self.__read_journal()
+        uncertain = started - set(done)
+        start_time = time.monotonic()
+        slots = threading.BoundedSemaphore(self.max_pending)
+        with open(self.journal_path, 'a', encoding='utf-8') as journal, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor :
+            def add(number, item) :
+                send = None
+                try :
+                    send = self.__prepare(item)
+                    record = send()
+                    self.__log(journal, f'D {number} {record.serial}')
+                    with self.__lock :
+                        result.added += 1
+                        result.elapsed = time.monotonic() - start_time
+                except Exception as e :
+                    # Items that failed before their request was sent or were rejected by the node did not add records,
+                    # so they can be submitted again. Otherwise (e.g. a read timeout) the record may have been added
+                    # and the item stays uncertain.
+                    if send is None or _not_sent(e) :
+                        self.__log(journal, f'F {number}')
+                    with self.__lock :
+                        result.errors.append((number, e))
+                finally :
+                    slots.release()
+                if progress is not None :
+                    progress(result)
+
+            for number, item in items :
+                if number in done :
+                    result.skipped += 1
+                    continue
+                if number in uncertain and not retry_uncertain :
+                    result.uncertain.append(number)
+                    continue
+                # Blocks while max_pending items are waiting (backpressure on the input)
+                slots.acquire()
+                self.__log(journal, f'S {number}')
+                executor.submit(add, number, item)
+        result.elapsed = time.monotonic() - start_time
+        result.errors.sort(key=lambda error : error[0])
+        return result
+
+
+def main(argv=None) :
+    """ Entry point of the `il2-import` command."""
+    parser = argparse.ArgumentParser(description='Import records from NDJSON or CSV files into an InterlockLedger chain.')
+    parser.add_argument('file', help='NDJSON or CSV file with the payloads')
+    parser.add_argument('-c', action='store', dest='certificate_path', help='Path to .pfx certicate file', required=True)
+    parser.add_argument('-p', action='store', dest='certificate_pass', help='Certificate password (default: IL2_CERT_PASS environment variable)',
+                        default=os.environ.get('IL2_CERT_PASS'))
+    parser.add_argument('-a', action='store', dest='address', help='Node address', default='localhost')
+    parser.add_argument('-P', action='store', dest='api_port', help='API port', type=int)
+    parser.add_argument('--chain', required=True, help='Chain id')
+    parser.add_argument('--app', type=int, dest='applicationId', help='Application id of the records')
+    parser.add_argument('--tag', type=int, dest='payloadTagId', help='Payload tag id of the records')
+    parser.add_argument('--type', default=RecordType.Data.value, help='Record type')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], help='Input format (default: from the file extension)')
+    parser.add_argument('--journal', help='Progress journal (default: <file>.journal)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of concurrent requests')
+    parser.add_argument('--encode', action='store_true', help='Encode the payloads locally with the data model of the payload tag id')
+    parser.add_argument('--retry-uncertain', action='store_true', help='Submit again the items with unknown result')
+    parser.add_argument('--no-verify-ca', action='store_false', dest='verify_ca', help='Do not check the node certificate')
+    args = parser.parse_args(argv)
+    if args.certificate_pass is None :
+        parser.error('the certificate password is required (-p or IL2_CERT_PASS)')
+
+    from .client import RestNode
+    node = RestNode(cert_file=args.certificate_path, cert_pass=args.certificate_pass, address=args.address, port=args.api_port, verify_ca=args.verify_ca)
+    chain = node.chain_by_id(args.chain)
+    codec = node.network.catalog.codec(args.payloadTagId) if args.encode else None
+    if args.encode and codec is None :
+        parser.error(f'no data model for the payload tag id {args.payloadTagId}')
+    importer = BulkImporter(chain, args.journal or args.file + '.journal', args.applicationId, args.payloadTagId,
+                            RecordType(args.type), codec=codec, max_workers=args.workers)
+    input_format = args.format or ('csv' if args.file.lower().endswith('.csv') else 'ndjson')
+    items = read_csv(args.file) if input_format == 'csv' else read_ndjson(args.file)
+
+    last_report = [time.monotonic()]
+    def progress(result) :
+        now = time.monotonic()
+        if now - last_report[0] >= 5 :
+            last_report[0] = now
+            print(f'{result.added} records added ({result.records_per_second:.1f} records/s), {len(result.errors)} errors', file=sys.stderr)
+
+    result = importer.run(items, retry_uncertain=args.retry_uncertain, progress=progress)
+    print(json.dumps(result.json()))
+    return 1 if result.errors else 0
+
+
+if __name__ == '__main__' :
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+In-memory indexes over records already fetched from the node.
+"""
+
+import bisect
+import datetime
+import threading
+from array import array
+
+from .models import PageOfModel
+
+
+def _insort(values, value) :
+    # Records usually arrive in serial order, so appending is the common case
+    if not values or values[-1] <= value :
+        values.append(value)
+        return len(values) - 1
+    i = bisect.bisect_right(values, value)
+    values.insert(i, value)
+    return i
+
+def _timestamp(value) :
+    return value.timestamp() if isinstance(value, datetime.datetime) else value
+
+
+class RecordIndex :
+    """
+    Secondary indexes of records by serial, application id, payload tag id, type and creation time.
+
+    Serials and creation times are kept in sorted arrays searched with :obj:`bisect`, and the
+    application ids, payload tag ids and types are hash maps to sorted arrays of serials.
+
+    Args:
+        records (iterable of :obj:`il2_rest.models.RecordModelBase`, optional): Initial records.
+        keep_records (:obj:`bool`, optional): If True, the records are kept so queries can return them.
+
+    Example:
+        >>> index = RecordIndex()
+        >>> index.add(chain.records(pageSize=0))
+        >>> index.query(app=4, tag=300, since=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        [12, 15, 16]
+    """
+    def __init__(self, records=None, keep_records=True) :
+        self.keep_records = keep_records
+        self.__serials = array('q')
+        # Creation time of each serial of __serials (NaN if unknown)
+        self.__serial_times = array('d')
+        self.__times = array('d')
+        self.__time_serials = array('q')
+        self.__by_app = {}
+        self.__by_tag = {}
+        self.__by_type = {}
+        self.__records = {}
+        self.__lock = threading.RLock()
+        if records is not None :
+            self.add(records)
+
+    def add(self, records) :
+        """
+        Add records to the index. Records already indexed are ignored.
+
+        Args:
+            records (iterable of :obj:`il2_rest.models.RecordModelBase` or :obj:`il2_rest.models.PageOfModel`): Records.
+
+        Returns:
+            :obj:`int`: Number of new records.
+        """
+        if isinstance(records, PageOfModel) :
+            records = records.items
+        count = 0
+        with self.__lock :
+            for record in records :
+                serial = record.serial
+                if serial in self :
+                    continue
+                t = float('nan') if record.createdAt is None else _timestamp(record.createdAt)
+                self.__serial_times.insert(_insort(self.__serials, serial), t)
+                if record.createdAt is not None :
+                    self.__time_serials.insert(_insort(self.__times, t), serial)
+                _insort(self.__by_app.setdefault(record.applicationId, array('q')), serial)
+                _insort(self.__by_tag.setdefault(record.payloadTagId, array('q')), serial)
+                _insort(self.__by_type.setdefault(getattr(record.type, 'value', record.type), array('q')), serial)
+                if self.keep_records :
+                    self.__records[serial] = record
+                count += 1
+        return count
+
+    def query(self, app=None, tag=None, rec_type=None, since=None, until=None, first_serial=None, last_serial=None, as_records=False) :
+        """
+        Find the indexed records matching all the filters.
+
+        Args:
+            app (:obj:`int`, optional): Application id.
+            tag (:obj:`int`, optional): Payload tag id.
+            rec_type (:obj:`il2_rest.enumerations.RecordType`/:obj:`str`, optional): Record type.
+            since (:obj:`datetime.datetime`, optional): Only records created at or after this time.
+            until (:obj:`datetime.datetime`, optional): Only records created before this time.
+            first_serial (:obj:`int`, optional): Starting serial number.
+            last_serial (:obj:`int`, optional): Last serial number.
+            as_records (:obj:`bool`, optional): If True, return the records instead of the serials (requires `keep_records`).
+
+        Returns:
+            :obj:`list` of :obj:`int`/:obj:`il2_rest.models.RecordModelBase`: Serials (or records) in serial order.
+        """
+        with self.__lock :
+            candidates = [self.__serials]
+            for mapping, key in ((self.__by_app, app), (self.__by_tag, tag), (self.__by_type, getattr(rec_type, 'value', rec_type))) :
+                if key is not None :
+                    candidates.append(mapping.get(key, ()))
+            lo = 0 if first_serial is None else first_serial
+            hi = None if last_serial is None else last_serial
+            ranges = []
+            for values in candidates :
+                start = bisect.bisect_left(values, lo)
+                end = len(values) if hi is None else bisect.bisect_right(values, hi)
+                ranges.append((values, start, end))
+            ranges.sort(key=lambda r : r[2] - r[1])
+            base, start, end = ranges[0]
+            if since is not None or until is not None :
+                t_start = 0 if since is None else bisect.bisect_left(self.__times, _timestamp(since))
+                t_end = len(self.__times) if until is None else bisect.bisect_left(self.__times, _timestamp(until))
+                if t_end - t_start < end - start :
+                    selected = sorted(s for s in self.__time_serials[t_start:t_end]
+                                      if lo <= s and (hi is None or s <= hi))
+                    others = ranges
+                else :
+                    since = float('-inf') if since is None else _timestamp(since)
+                    until = float('inf') if until is None else _timestamp(until)
+                    # NaN (unknown time) fails both comparisons
+                    selected = [s for s in base[start:end] if since <= self.__time_of(s) < until]
+                    others = ranges[1:]
+            else :
+                selected = base[start:end]
+                others = ranges[1:]
+            for values, start, end in others :
+                selected = [s for s in selected if self.__contains(values, start, end, s)]
+            if as_records :
+                return [self.__records[s] for s in selected]
+            return list(selected)
+
+    def __time_of(self, serial) :
+        return self.__serial_times[bisect.bisect_left(self.__serials, serial)]
+
+    @staticmethod
+    def __contains(values, start, end, value) :
+        i = bisect.bisect_left(values, value, start, end)
+        return i < end and values[i] == value
+
+    def record(self, serial) :
+        """
+        Get an indexed record.
+
+        Args:
+            serial (:obj:`int`): Record serial number.
+
+        Returns:
+            :obj:`il2_rest.models.RecordModelBase`: Record or `None` if it is not indexed (or `keep_records` is False).
+        """
+        return self.__records.get(serial)
+
+    def __contains__(self, serial) :
+        return self.__contains(self.__serials, 0, len(self.__serials), serial)
+
+    def __len__(self) :
+        return len(self.__serials)
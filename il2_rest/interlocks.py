@@ -0,0 +1,237 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Graph of the interlocks between chains.
+"""
+
+import bisect
+import threading
+import concurrent.futures
+
+
+class _Edges :
+    """ Interlocking records sorted by a serial number."""
+    def __init__(self) :
+        self.serials = []
+        self.records = []
+
+    def add(self, serial, record) :
+        i = bisect.bisect_right(self.serials, serial)
+        self.serials.insert(i, serial)
+        self.records.insert(i, record)
+
+
+class InterlockGraph :
+    """
+    In-memory graph of the interlocks between chains.
+
+    Each interlocking record (:obj:`il2_rest.models.InterlockingRecordModel`) is an edge from the
+    record in the chain that registered it (`chainId`, `serial`) to the interlocked record
+    (`interlockedChainId`, `interlockedRecordSerial`). The interlocks of the chains are
+    fetched concurrently.
+
+    Args:
+        node (:obj:`il2_rest.RestNode`): Node client.
+        chains (:obj:`list` of :obj:`il2_rest.RestChain`, optional): Chains to be fetched.
+            If omitted, uses all chains and mirrors of the node.
+        incoming (:obj:`bool`, optional): If True, also fetch the interlocks pointing to the chains
+            (see :obj:`il2_rest.RestNode.interlocks_of`), including those registered in chains not in `chains`.
+        max_workers (:obj:`int`, optional): Maximum number of concurrent requests.
+
+    Example:
+        >>> graph = InterlockGraph(node)
+        >>> graph.refresh()
+        >>> interlock = graph.latest_covering(chain.id, 10)
+        >>> print(interlock.chainId, interlock.serial)
+    """
+    def __init__(self, node, chains=None, incoming=False, max_workers=8) :
+        self.node = node
+        self.__chains = chains
+        self.incoming = incoming
+        self.max_workers = max_workers
+        self.__lock = threading.RLock()
+        self.__known = set()
+        self.__from = {}
+        self.__to = {}
+        self.__by_hash = {}
+        self.__fetched = set()
+
+    @property
+    def chains(self) :
+        """:obj:`list` of :obj:`il2_rest.RestChain`: Chains fetched by the graph."""
+        if self.__chains is None :
+            self.__chains = self.node.chains + self.node.mirrors
+        return self.__chains
+
+    def refresh(self) :
+        """
+        Fetch the interlocks of the chains and add the new ones to the graph.
+
+        On the first call all interlocks are fetched. On the following calls, the most recent interlocks of
+        each chain are requested until an already known interlock is found.
+
+        Returns:
+            :obj:`int`: Number of new interlocks.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor :
+            futures = [executor.submit(self.__fetch_registered, chain) for chain in self.chains]
+            if self.incoming :
+                futures += [executor.submit(self.node.interlocks_of, chain.id) for chain in self.chains]
+            results = [future.result() for future in futures]
+        return sum(self.add(records) for records in results)
+
+    def __fetch_registered(self, chain) :
+        if chain.id not in self.__fetched :
+            records = chain.interlocks(pageSize=0).items
+            self.__fetched.add(chain.id)
+            return records
+        how_many = 8
+        while True :
+            records = chain.interlocks(howManyFromLast=how_many, pageSize=0).items
+            if len(records) < how_many or any(self.__key(record) in self.__known for record in records) :
+                return records
+            how_many *= 2
+
+    @staticmethod
+    def __key(record) :
+        return (record.chainId, record.serial)
+
+    def add(self, records) :
+        """
+        Add interlocking records to the graph. Records already in the graph are ignored.
+
+        Args:
+            records (iterable of :obj:`il2_rest.models.InterlockingRecordModel`): Interlocking records.
+
+        Returns:
+            :obj:`int`: Number of new interlocks.
+        """
+        count = 0
+        with self.__lock :
+            for record in records :
+                key = self.__key(record)
+                if key in self.__known :
+                    continue
+                self.__known.add(key)
+                self.__from.setdefault(record.chainId, _Edges()).add(record.serial, record)
+                self.__to.setdefault(record.interlockedChainId, _Edges()).add(record.interlockedRecordSerial, record)
+                self.__by_hash.setdefault(record.interlockedRecordHash, []).append(record)
+                count += 1
+        return count
+
+    def interlocks_from(self, chain_id) :
+        """
+        Get the interlocks registered in a chain.
+
+        Args:
+            chain_id (:obj:`str`): Chain id.
+
+        Returns:
+            :obj:`list` of :obj:`il2_rest.models.InterlockingRecordModel`: Interlocks sorted by serial.
+        """
+        with self.__lock :
+            edges = self.__from.get(chain_id)
+            return list(edges.records) if edges else []
+
+    def interlocks_to(self, chain_id) :
+        """
+        Get the interlocks pointing to a chain.
+
+        Args:
+            chain_id (:obj:`str`): Chain id.
+
+        Returns:
+            :obj:`list` of :obj:`il2_rest.models.InterlockingRecordModel`: Interlocks sorted by the interlocked serial.
+        """
+        with self.__lock :
+            edges = self.__to.get(chain_id)
+            return list(edges.records) if edges else []
+
+    def interlocked_chains(self, chain_id) :
+        """
+        Get the ids of the chains interlocked by a chain.
+
+        Args:
+            chain_id (:obj:`str`): Chain id.
+
+        Returns:
+            :obj:`set` of :obj:`str`: Chain ids.
+        """
+        return {record.interlockedChainId for record in self.interlocks_from(chain_id)}
+
+    def find_by_hash(self, record_hash) :
+        """
+        Get the interlocks of a record by its hash.
+
+        Args:
+            record_hash (:obj:`str`): Hash of the interlocked record.
+
+        Returns:
+            :obj:`list` of :obj:`il2_rest.models.InterlockingRecordModel`: Interlocks.
+        """
+        with self.__lock :
+            return list(self.__by_hash.get(record_hash, ()))
+
+    def first_covering(self, chain_id, serial) :
+        """
+        Get the interlock nearest to a record that covers it (interlocked serial greater than or equal to `serial`).
+
+        Args:
+            chain_id (:obj:`str`): Chain id.
+            serial (:obj:`int`): Record serial number.
+
+        Returns:
+            :obj:`il2_rest.models.InterlockingRecordModel`: Interlock or `None` if the record is not covered.
+        """
+        with self.__lock :
+            edges = self.__to.get(chain_id)
+            if not edges :
+                return None
+            i = bisect.bisect_left(edges.serials, serial)
+            return edges.records[i] if i < len(edges.records) else None
+
+    def latest_covering(self, chain_id, serial) :
+        """
+        Get the latest interlock that covers a record (interlocked serial greater than or equal to `serial`).
+
+        Args:
+            chain_id (:obj:`str`): Chain id.
+            serial (:obj:`int`): Record serial number.
+
+        Returns:
+            :obj:`il2_rest.models.InterlockingRecordModel`: Interlock or `None` if the record is not covered.
+        """
+        with self.__lock :
+            edges = self.__to.get(chain_id)
+            if not edges or edges.serials[-1] < serial :
+                return None
+            return edges.records[-1]
+
+    def __len__(self) :
+        return len(self.__known)
@@ -0,0 +1,163 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Local store of the JSON documents, encrypted with a key derived from the client certificate.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+
+_KEY_INFO = b'il2_rest json document store'
+_KEY_CHECK = b'il2_rest'
+
+
+class JsonDocumentStore :
+    """
+    Local write-through store of JSON documents, keyed by chain id and record serial.
+
+    The documents are stored in a SQLite database encrypted with AES-GCM. The key is derived
+    (HKDF-SHA256) from the private key of the client certificate and a random salt kept in the
+    database, so only the same certificate is able to read the stored documents.
+
+    Args:
+        certificate (:obj:`il2_rest.util.PKCS12Certificate`): Client certificate.
+        path (:obj:`str`, optional): Path to the database file. If omitted, the documents are kept in memory.
+
+    Raises:
+        ValueError: If the certificate has no private key or if the store was created with another certificate.
+
+    Example:
+        >>> store = JsonDocumentStore(pkcs12_cert, '~/documents.db')
+        >>> store.put(chain.id, 10, {'attribute_1': 'value_1'})
+        >>> store.get(chain.id, 10)
+        {'attribute_1': 'value_1'}
+    """
+    def __init__(self, certificate, path=None) :
+        if not certificate.has_pk() :
+            raise ValueError('Certificate has no private key to be able to encrypt the documents.')
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(os.path.expanduser(path) if path else ':memory:', check_same_thread=False)
+        with self.__db :
+            self.__db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB)')
+            self.__db.execute('CREATE TABLE IF NOT EXISTS documents (chain TEXT, serial INTEGER, nonce BLOB, content BLOB, PRIMARY KEY (chain, serial))')
+        salt = self.__meta('salt')
+        if salt is None :
+            salt = os.urandom(16)
+            self.__aesgcm = self.__derive_key(certificate, salt)
+            nonce = os.urandom(12)
+            with self.__db :
+                self.__db.execute('INSERT INTO meta VALUES (?, ?)', ('salt', salt))
+                self.__db.execute('INSERT INTO meta VALUES (?, ?)', ('check', nonce + self.__aesgcm.encrypt(nonce, _KEY_CHECK, None)))
+        else :
+            self.__aesgcm = self.__derive_key(certificate, salt)
+            check = self.__meta('check')
+            try :
+                self.__aesgcm.decrypt(check[:12], check[12:], None)
+            except InvalidTag :
+                raise ValueError('The store was created with another certificate.') from None
+
+    @staticmethod
+    def __derive_key(certificate, salt) :
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=_KEY_INFO)
+        return AESGCM(hkdf.derive(certificate.private_key))
+
+    def __meta(self, name) :
+        row = self.__db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def __associated_data(chain_id, serial) :
+        return f'{chain_id}/{serial}'.encode()
+
+    def put(self, chain_id, serial, payload) :
+        """
+        Store a JSON document.
+
+        Args:
+            chain_id (:obj:`str`): Id of the chain.
+            serial (:obj:`int`): Serial number of the record.
+            payload (:obj:`dict`): JSON document.
+        """
+        nonce = os.urandom(12)
+        content = self.__aesgcm.encrypt(nonce, json.dumps(payload).encode('utf-8'), self.__associated_data(chain_id, serial))
+        with self.__lock, self.__db :
+            self.__db.execute('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)', (chain_id, serial, nonce, content))
+
+    def get(self, chain_id, serial) :
+        """
+        Get a stored JSON document.
+
+        Args:
+            chain_id (:obj:`str`): Id of the chain.
+            serial (:obj:`int`): Serial number of the record.
+
+        Returns:
+            :obj:`dict`: JSON document or `None` if it is not stored.
+        """
+        with self.__lock :
+            row = self.__db.execute('SELECT nonce, content FROM documents WHERE chain = ? AND serial = ?', (chain_id, serial)).fetchone()
+        if row is None :
+            return None
+        return json.loads(self.__aesgcm.decrypt(row[0], row[1], self.__associated_data(chain_id, serial)).decode('utf-8'))
+
+    def delete(self, chain_id, serial=None) :
+        """
+        Remove a JSON document (or all documents of the chain if `serial` is omitted) from the store.
+
+        Args:
+            chain_id (:obj:`str`): Id of the chain.
+            serial (:obj:`int`, optional): Serial number of the record.
+        """
+        with self.__lock, self.__db :
+            if serial is None :
+                self.__db.execute('DELETE FROM documents WHERE chain = ?', (chain_id,))
+            else :
+                self.__db.execute('DELETE FROM documents WHERE chain = ? AND serial = ?', (chain_id, serial))
+
+    def close(self) :
+        """ Close the database."""
+        with self.__lock :
+            self.__db.close()
+
+    def __contains__(self, key) :
+        chain_id, serial = key
+        with self.__lock :
+            return self.__db.execute('SELECT 1 FROM documents WHERE chain = ? AND serial = ?', (chain_id, serial)).fetchone() is not None
+
+    def __len__(self) :
+        with self.__lock :
+            return self.__db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
@@ -0,0 +1,181 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Local mirror of the records of a chain.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+from .models import RecordModel
+from .models import RecordModelAsJson
+
+
+class LocalRecordMirror :
+    """
+    Local copy of the records of a chain stored in a SQLite database.
+
+    Records never change once they are added to a chain, so the mirror only needs to
+    download the records added after the last mirrored serial (see :obj:`LocalRecordMirror.sync`).
+    Queries are answered locally.
+
+    Several chains can be mirrored in the same database file.
+
+    Args:
+        chain (:obj:`il2_rest.RestChain`): Chain to be mirrored.
+        path (:obj:`str`, optional): Path to the database file. If omitted, the records are kept in memory.
+        as_json (:obj:`bool`, optional): If True, mirror the records with the payload mapped to JSON
+            (:obj:`il2_rest.models.RecordModelAsJson`) instead of the payload bytes.
+        page_size (:obj:`int`, optional): Number of records requested at once while synchronizing.
+
+    Attributes:
+        chain (:obj:`il2_rest.RestChain`): Mirrored chain.
+
+    Example:
+        >>> mirror = LocalRecordMirror(chain, '~/records.db')
+        >>> mirror.sync()
+        >>> for record in mirror.records(applicationId=4, payloadTagId=300) :
+        ...     print(record.serial)
+    """
+    def __init__(self, chain, path=None, as_json=False, page_size=100) :
+        self.chain = chain
+        self.__chain_id = chain.id
+        self.__as_json = as_json
+        self.__model = RecordModelAsJson if as_json else RecordModel
+        self.__table = 'records_as_json' if as_json else 'records'
+        self.__page_size = page_size
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(os.path.expanduser(path) if path else ':memory:', check_same_thread=False)
+        with self.__db :
+            self.__db.execute(f'''CREATE TABLE IF NOT EXISTS {self.__table} (
+                chain TEXT, serial INTEGER, applicationId INTEGER, payloadTagId INTEGER, type TEXT,
+                record TEXT, PRIMARY KEY (chain, serial))''')
+            self.__db.execute(f'CREATE INDEX IF NOT EXISTS {self.__table}_app ON {self.__table} (chain, applicationId, payloadTagId)')
+
+    @property
+    def last_serial(self) :
+        """:obj:`int`: Serial number of the last mirrored record (-1 if there are no records)."""
+        with self.__lock :
+            row = self.__db.execute(f'SELECT MAX(serial) FROM {self.__table} WHERE chain = ?', (self.__chain_id,)).fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def sync(self, last_serial=None) :
+        """
+        Download the records added to the chain since the last synchronization.
+
+        Args:
+            last_serial (:obj:`int`, optional): Last serial to be mirrored. If omitted,
+                uses the last record of the chain summary.
+
+        Returns:
+            :obj:`int`: Number of new records.
+        """
+        if last_serial is None :
+            last_serial = self.chain.summary.lastRecord
+        first_serial = self.last_serial + 1
+        count = 0
+        while last_serial is not None and first_serial <= last_serial :
+            if self.__as_json :
+                page = self.chain.records_as_json(firstSerial=first_serial, lastSerial=last_serial, pageSize=self.__page_size)
+            else :
+                page = self.chain.records(firstSerial=first_serial, lastSerial=last_serial, pageSize=self.__page_size)
+            records = [record for record in page.items if record.serial >= first_serial]
+            if not records :
+                break
+            self.__insert(records)
+            count += len(records)
+            first_serial = records[-1].serial + 1
+        return count
+
+    def __insert(self, records) :
+        rows = [(self.__chain_id, record.serial, record.applicationId, record.payloadTagId,
+                 None if record.type is None else str(getattr(record.type, 'value', record.type)), record.json(return_as_str=True))
+                for record in records]
+        with self.__lock, self.__db :
+            self.__db.executemany(f'INSERT OR IGNORE INTO {self.__table} VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def __load(self, text) :
+        return self.__model.from_json(json.loads(text))
+
+    def record_at(self, serial) :
+        """
+        Get a specific record.
+
+        Records not mirrored yet are requested to the node.
+
+        Args:
+            serial (:obj:`int`): Record serial number.
+
+        Returns:
+            :obj:`il2_rest.models.RecordModel`/:obj:`il2_rest.models.RecordModelAsJson`: Record with the specific serial number.
+        """
+        with self.__lock :
+            row = self.__db.execute(f'SELECT record FROM {self.__table} WHERE chain = ? AND serial = ?', (self.__chain_id, serial)).fetchone()
+        if row is not None :
+            return self.__load(row[0])
+        return self.chain.record_at_as_json(serial) if self.__as_json else self.chain.record_at(serial)
+
+    def records(self, firstSerial=None, lastSerial=None, applicationId=None, payloadTagId=None, rec_type=None, lastToFirst=False) :
+        """
+        Get the mirrored records matching the filters.
+
+        Args:
+            firstSerial (:obj:`int`, optional): Starting serial number.
+            lastSerial (:obj:`int`, optional): Last serial number.
+            applicationId (:obj:`int`, optional): Only records of this application.
+            payloadTagId (:obj:`int`, optional): Only records with this payload tag id.
+            rec_type (:obj:`il2_rest.enumerations.RecordType`/:obj:`str`, optional): Only records of this type.
+            lastToFirst (:obj:`bool`, optional): If True, return the records in reverse order.
+
+        Returns:
+            :obj:`list` of :obj:`il2_rest.models.RecordModel`/:obj:`il2_rest.models.RecordModelAsJson`: Records in serial order.
+        """
+        conditions = ['chain = ?']
+        params = [self.__chain_id]
+        for column, operator, value in (('serial', '>=', firstSerial), ('serial', '<=', lastSerial),
+                                        ('applicationId', '=', applicationId), ('payloadTagId', '=', payloadTagId),
+                                        ('type', '=', getattr(rec_type, 'value', rec_type))) :
+            if value is not None :
+                conditions.append(f'{column} {operator} ?')
+                params.append(value)
+        order = 'DESC' if lastToFirst else 'ASC'
+        with self.__lock :
+            rows = self.__db.execute(f'SELECT record FROM {self.__table} WHERE {" AND ".join(conditions)} ORDER BY serial {order}', params).fetchall()
+        return [self.__load(row[0]) for row in rows]
+
+    def close(self) :
+        """ Close the database."""
+        with self.__lock :
+            self.__db.close()
+
+    def __len__(self) :
+        with self.__lock :
+            return self.__db.execute(f'SELECT COUNT(*) FROM {self.__table} WHERE chain = ?', (self.__chain_id,)).fetchone()[0]
@@ -39,12 +39,11 @@ import datetime
 import functools
 import base64
 import warnings
+import concurrent.futures
 
 #from pyiltags.standard import ILInt
 from pyilint import ilint_decode
 
-from packaging import version
-from colour import Color
 from enum import Enum
 
 from .enumerations import DataFieldCast
@@ -60,7 +59,10 @@ from .util import null_condition_attribute
 from .util import filter_none
 from .util import string2datetime
 from .util import to_bytes
-from .util import aes_decrypt
+from .util import b64_decode_chunks
+from .util import aes_decrypt_chunks
+from .util import ChunksReader
+from .cache import LRUCache
 
 
 
@@ -75,11 +77,13 @@ class CustomEncoder(json.JSONEncoder) :
         Set the behavior of the encoder depending on the type of obj.
 
         """
+        from colour import Color
+        from packaging import version
         if isinstance(obj, datetime.datetime) :
             t = obj.strftime('%Y-%m-%dT%H:%M:%S.%f')
             z = obj.strftime('%z')
             if len(z) >=5 :
-                z = z[:-2] + ':' + t[-2:]
+                z = z[:-2] + ':' + z[-2:]
             return t + z
         elif isinstance(obj, Color) :
             return obj.web
@@ -222,6 +226,7 @@ class AppsModel(BaseModel) :
         def __init__(self, alternativeId=None, appVersion=None, description=None, app_id=None, name=None, publisherId=None, dataModels=None, publisherName=None, reservedILTagIds=None, simplifiedHashCode=None, start=None, version_=None, **kwargs) :
 
 
+            from packaging import version
             self.alternativeId = alternativeId
             self.appVersion = appVersion if isinstance(appVersion, version.Version) else version.parse(appVersion)
             self.description = description
@@ -873,11 +878,7 @@ class CertificatePermitModel(BaseModel) :
             self.__check_name_with_cn(pkcs12_certificate)
     
     def __b64_certificate_from_pkcs12(self, certificate) :
-        return (certificate
-                .public_certificate.decode('utf-8')
-                .replace('-----BEGIN CERTIFICATE-----','')
-                .replace('-----END CERTIFICATE-----','')
-                .replace('\n',''))
+        return certificate.public_certificate_in_x509.decode('utf-8')
     
     def __check_name_with_cn(self, certificate) :
         normalized_name = self.name.lower().replace(' ', '.')
@@ -973,6 +974,7 @@ class NodeCommonModel(BaseModel) :
 
     """
     def __init__(self, color=None, node_id=None, name=None, network=None, ownerId=None, ownerName=None, roles=None, softwareVersions=None, **kwargs) :
+        from colour import Color
         self.color = Color(color)
         self.id = kwargs.get('id', node_id)
         self.name = name
@@ -1234,38 +1236,244 @@ class EncryptedTextModel(BaseModel) :
             {"attribute_1":"value_1", "number_1": 1}
 
         """
-        if not self.cipher :
-            raise ValueError(f' No cipher detected.')
-        if self.cipher != CipherAlgorithms.AES256 :
-            raise ValueError(f'Cipher {self.cipher} is not currently supported.')
+        return json.load(self.open_with(certificate))
+
+    def open_with(self, certificate, chunk_size=65536) :
+        """
+        Open the encrypted JSON Document text as a stream, using the keys inside the certificate.
+
+        The text is decoded and decrypted while it is read, so the decrypted JSON can be
+        consumed by an incremental JSON parser without keeping all of it in memory.
+
+        Args:
+            certificate (:obj:`il2_rest.util.PKCS12Certificate`): PKCS12 certificate with the keys to decode the text.
+            chunk_size (:obj:`int`, optional): Size of the chunks of the encrypted text decrypted at once.
+
+        Returns:
+            :obj:`io.BufferedReader`: Binary stream with the JSON text (UTF-8).
+
+        Example:
+            >>> import ijson
+            >>> with response.encryptedJson.open_with(pkcs12_cert) as f :
+            ...     for item in ijson.items(f, 'item') :
+            ...         print(item)
+        """
+        self.check_cipher()
         if not certificate :
             raise ValueError('No key provided to decode EncryptedText.')
         if not certificate.has_pk() :
             raise ValueError('Certificate has no private key to be able to decode EncryptedText.')
-        cert_key_id = certificate.key_id
-        cert_pub_key_hash = certificate.pub_key_hash
-        if not cert_pub_key_hash :
-            raise ValueError('Non-RSA certificate is not currently supported.')
-        if not self.readingKeys :
-            raise ValueError('No reading keys able to decode EncryptedText.')
-        authorized_key = None        
-        for rk in self.readingKeys :
-            if (cert_key_id == rk.readerId) and (cert_pub_key_hash == rk.publicKeyHash) :
-                authorized_key = rk
-                break
-        if not authorized_key :
-            raise ValueError('Your key does not match one of the authorized reading keys.')
+        authorized_key = self.reading_key_for(certificate.key_id, certificate.pub_key_hash)
         
         aes_key = certificate.decrypt(base64.urlsafe_b64decode(authorized_key.encryptedKey))
         aes_iv = certificate.decrypt(base64.urlsafe_b64decode(authorized_key.encryptedIV))
         
-        json_bytes = aes_decrypt(base64.urlsafe_b64decode(self.cipherText), aes_key, aes_iv)
-        #print(json_bytes)
-        if json_bytes[0] != 17 :
-            raise ValueError('Something went wrong while decrypting the content. Unexpected initial bytes.')
-        
-        dec, dec_size = ilint_decode(json_bytes[1:])
-        return json.loads(json_bytes[1+dec_size:1+dec_size+dec].decode('utf-8'))
+        return open_json_text(self.cipherText, aes_key, aes_iv, chunk_size)
+
+    def check_cipher(self) :
+        """
+        Check if the cipher of the text is supported.
+
+        Raises:
+            ValueError: If the cipher is not supported.
+        """
+        if not self.cipher :
+            raise ValueError(f' No cipher detected.')
+        if self.cipher != CipherAlgorithms.AES256 :
+            raise ValueError(f'Cipher {self.cipher} is not currently supported.')
+
+    def reading_key_for(self, key_id, pub_key_hash) :
+        """
+        Find the reading key of a certificate.
+
+        Args:
+            key_id (:obj:`str`): Id of the key (see :obj:`il2_rest.util.PKCS12Certificate.key_id`).
+            pub_key_hash (:obj:`str`): Public key hash (see :obj:`il2_rest.util.PKCS12Certificate.pub_key_hash`).
+
+        Returns:
+            :obj:`ReadingKeyModel`: Reading key authorized to the certificate.
+
+        Raises:
+            ValueError: If the certificate is not authorized to read the text.
+        """
+        if not pub_key_hash :
+            raise ValueError('Non-RSA certificate is not currently supported.')
+        if not self.readingKeys :
+            raise ValueError('No reading keys able to decode EncryptedText.')
+        for rk in self.readingKeys :
+            if (key_id == rk.readerId) and (pub_key_hash == rk.publicKeyHash) :
+                return rk
+        raise ValueError('Your key does not match one of the authorized reading keys.')
+
+
+def decrypt_json_text(cipher_text, aes_key, aes_iv) :
+    """
+    Decrypt the text of an encrypted JSON document with an already unwrapped AES key.
+
+    Args:
+        cipher_text (:obj:`str`): Encrypted text (URL-safe base64).
+        aes_key (:obj:`bytes`): AES256 key.
+        aes_iv (:obj:`bytes`): AES256 IV.
+
+    Returns:
+        :obj:`dict`: Decoded JSON.
+    """
+    return json.load(open_json_text(cipher_text, aes_key, aes_iv))
+
+
+def open_json_text(cipher_text, aes_key, aes_iv, chunk_size=65536) :
+    """
+    Open the text of an encrypted JSON document as a stream, with an already unwrapped AES key.
+
+    Args:
+        cipher_text (:obj:`str` or iterable of :obj:`str`): Encrypted text (URL-safe base64).
+        aes_key (:obj:`bytes`): AES256 key.
+        aes_iv (:obj:`bytes`): AES256 IV.
+        chunk_size (:obj:`int`, optional): Size of the chunks of the encrypted text decrypted at once.
+
+    Returns:
+        :obj:`io.BufferedReader`: Binary stream with the JSON text (UTF-8).
+    """
+    plain_chunks = aes_decrypt_chunks(b64_decode_chunks(cipher_text, chunk_size), aes_key, aes_iv)
+    return io.BufferedReader(ChunksReader(_string_tag_value(plain_chunks)), buffer_size=chunk_size)
+
+
+def _string_tag_value(chunks) :
+    """ Yield the value of the ILTag string (id 17) in the chunks, ignoring the padding after it."""
+    chunks = iter(chunks)
+    header = b''
+    for chunk in chunks :
+        header += chunk
+        if len(header) >= 2 and len(header) >= 1 + (1 if header[1] < 0xF8 else header[1] - 0xF8 + 2) :
+            break
+    if not header or header[0] != 17 :
+        raise ValueError('Something went wrong while decrypting the content. Unexpected initial bytes.')
+    remaining, dec_size = ilint_decode(header[1:])
+    chunk = header[1+dec_size:]
+    while remaining > 0 :
+        if chunk :
+            value = chunk[:remaining]
+            remaining -= len(value)
+            yield value
+        chunk = next(chunks, None)
+        if chunk is None and remaining :
+            raise ValueError('Something went wrong while decrypting the content. Unexpected end of the content.')
+    # Consume the rest of the chunks so the decryption is finalized
+    for chunk in chunks :
+        pass
+
+
+def _decrypt_json_text_args(args) :
+    return decrypt_json_text(*args)
+
+
+class JsonDocumentDecryptor :
+    """
+    Decrypt many encrypted JSON documents with the same certificate.
+
+    The certificate identity (key id and public key hash) is computed only once, and the AES key/IV
+    unwrapped with RSA are cached by reading key, so documents sharing the same reading key only
+    need the RSA decryption once. The AES decryption and JSON parsing of large batches run in a process pool.
+
+    Args:
+        certificate (:obj:`il2_rest.util.PKCS12Certificate`): PKCS12 certificate with the keys to decode the texts.
+        max_workers (:obj:`int`, optional): Number of worker processes. If 0, everything runs in the current process.
+            If `None`, uses the number of processors.
+        key_cache_size (:obj:`int`, optional): Number of unwrapped AES keys kept in memory.
+        min_batch_size (:obj:`int`, optional): Batches smaller than this are decrypted in the current process.
+
+    Attributes:
+        key_cache (:obj:`il2_rest.cache.LRUCache`): Cache of the unwrapped AES keys.
+
+    Example:
+        >>> with JsonDocumentDecryptor(pkcs12_cert) as decryptor :
+        ...     documents = decryptor.decrypt_many(chain.json_document_at(serial) for serial in serials)
+    """
+    def __init__(self, certificate, max_workers=None, key_cache_size=1024, min_batch_size=16) :
+        if not certificate :
+            raise ValueError('No key provided to decode EncryptedText.')
+        if not certificate.has_pk() :
+            raise ValueError('Certificate has no private key to be able to decode EncryptedText.')
+        self.__certificate = certificate
+        self.__key_id = certificate.key_id
+        self.__pub_key_hash = certificate.pub_key_hash
+        self.max_workers = max_workers
+        self.min_batch_size = min_batch_size
+        self.key_cache = LRUCache(key_cache_size)
+        self.__executor = None
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) :
+        self.close()
+        return False
+
+    def close(self) :
+        """ Shutdown the process pool."""
+        if self.__executor :
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def unwrap_key(self, encrypted_text) :
+        """
+        Get the AES key and IV of an encrypted text.
+
+        Args:
+            encrypted_text (:obj:`EncryptedTextModel`): Encrypted text.
+
+        Returns:
+            (:obj:`bytes`, :obj:`bytes`): AES key and IV.
+        """
+        encrypted_text.check_cipher()
+        rk = encrypted_text.reading_key_for(self.__key_id, self.__pub_key_hash)
+        return self.key_cache.get_or_load((rk.encryptedKey, rk.encryptedIV), lambda : (
+            self.__certificate.decrypt(base64.urlsafe_b64decode(rk.encryptedKey)),
+            self.__certificate.decrypt(base64.urlsafe_b64decode(rk.encryptedIV))))
+
+    @staticmethod
+    def __encrypted_text(item) :
+        if isinstance(item, JsonDocumentRecordModel) :
+            item = item.encryptedJson
+        if isinstance(item, dict) :
+            item = EncryptedTextModel.from_json(item)
+        if not isinstance(item, EncryptedTextModel) :
+            raise TypeError('item must be EncryptedTextModel or JsonDocumentRecordModel')
+        return item
+
+    def decrypt(self, item) :
+        """
+        Decrypt a single JSON document.
+
+        Args:
+            item (:obj:`EncryptedTextModel`/:obj:`JsonDocumentRecordModel`): Encrypted JSON document.
+
+        Returns:
+            :obj:`dict`: Decoded JSON.
+        """
+        encrypted_text = self.__encrypted_text(item)
+        return decrypt_json_text(encrypted_text.cipherText, *self.unwrap_key(encrypted_text))
+
+    def decrypt_many(self, items, chunksize=8) :
+        """
+        Decrypt many JSON documents.
+
+        Args:
+            items (iterable of :obj:`EncryptedTextModel`/:obj:`JsonDocumentRecordModel`): Encrypted JSON documents.
+            chunksize (:obj:`int`, optional): Number of documents sent at once to each worker process.
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Decoded JSONs in the same order as `items`.
+        """
+        args = []
+        for item in items :
+            encrypted_text = self.__encrypted_text(item)
+            args.append((encrypted_text.cipherText,) + self.unwrap_key(encrypted_text))
+        if self.max_workers == 0 or len(args) < self.min_batch_size :
+            return [decrypt_json_text(*item) for item in args]
+        if self.__executor is None :
+            self.__executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        return list(self.__executor.map(_decrypt_json_text_args, args, chunksize=chunksize))
     
     
 class ReadingKeyModel(BaseModel) :
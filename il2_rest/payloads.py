@@ -0,0 +1,631 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Decoding and encoding of the ILTag encoded payloads of the records.
+"""
+
+import struct
+import datetime
+from array import array
+
+from pyilint import ilint_encode
+
+from .enumerations import DataFieldCast
+
+
+# Size of the value of the implicit tags (ids 0 to 15). `None` is a value encoded as ILInt.
+_IMPLICIT_SIZES = (0, 1, 1, 1, 2, 2, 4, 4, 8, 8, None, 4, 8, 16, None, None)
+
+
+def ilint_decode_at(buffer, offset=0) :
+    """
+    Decode an ILInt from a buffer.
+
+    Args:
+        buffer (:obj:`bytes`/:obj:`bytearray`/:obj:`memoryview`): Buffer.
+        offset (:obj:`int`, optional): Position of the ILInt in the buffer.
+
+    Returns:
+        (:obj:`int`, :obj:`int`): Decoded value and position after the ILInt.
+
+    Raises:
+        ValueError: If the buffer ends before the ILInt.
+    """
+    header = buffer[offset]
+    if header < 0xF8 :
+        return header, offset + 1
+    end = offset + header - 0xF8 + 2
+    if end > len(buffer) :
+        raise ValueError(f'Truncated ILInt at offset {offset}.')
+    return int.from_bytes(buffer[offset + 1:end], 'big') + 0xF8, end
+
+
+def iltag_header_at(buffer, offset=0) :
+    """
+    Decode the header (tag id and value length) of an ILTag.
+
+    Args:
+        buffer (:obj:`bytes`/:obj:`bytearray`/:obj:`memoryview`): Buffer.
+        offset (:obj:`int`, optional): Position of the tag in the buffer.
+
+    Returns:
+        (:obj:`int`, :obj:`int`, :obj:`int`): Tag id, position of the value and length of the value.
+    """
+    tag_id, pos = ilint_decode_at(buffer, offset)
+    if tag_id < 16 :
+        size = _IMPLICIT_SIZES[tag_id]
+        if size is None :
+            if tag_id != 10 :
+                raise ValueError(f'Reserved implicit tag id {tag_id} at offset {offset}.')
+            # The value is an ILInt, its size is given by its first byte
+            header = buffer[pos]
+            size = 1 if header < 0xF8 else header - 0xF8 + 2
+        return tag_id, pos, size
+    length, pos = ilint_decode_at(buffer, pos)
+    return tag_id, pos, length
+
+
+class PayloadHeaders :
+    """
+    Tag ids and value positions of many ILTag payloads kept in a single buffer.
+
+    Args:
+        buffer (:obj:`bytes`/:obj:`bytearray`): Buffer with the payloads.
+        tag_ids (:obj:`array.array`): Tag id of each payload.
+        offsets (:obj:`array.array`): Position of the value of each payload in the buffer.
+        lengths (:obj:`array.array`): Length of the value of each payload.
+
+    Attributes:
+        buffer (:obj:`memoryview`): Buffer with the payloads.
+        tag_ids (:obj:`array.array`): Tag id of each payload.
+        offsets (:obj:`array.array`): Position of the value of each payload in the buffer.
+        lengths (:obj:`array.array`): Length of the value of each payload.
+    """
+    def __init__(self, buffer, tag_ids, offsets, lengths) :
+        self.buffer = memoryview(buffer)
+        self.tag_ids = tag_ids
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def value(self, index) :
+        """
+        Get the value (inner bytes) of a payload without copying it.
+
+        Args:
+            index (:obj:`int`): Index of the payload.
+
+        Returns:
+            :obj:`memoryview`: Value of the payload.
+        """
+        offset = self.offsets[index]
+        return self.buffer[offset:offset + self.lengths[index]]
+
+    def indexes_of(self, tag_id) :
+        """
+        Get the indexes of the payloads with a tag id.
+
+        Args:
+            tag_id (:obj:`int`): Tag id.
+
+        Returns:
+            :obj:`list` of :obj:`int`: Indexes.
+        """
+        return [i for i, t in enumerate(self.tag_ids) if t == tag_id]
+
+    def __len__(self) :
+        return len(self.tag_ids)
+
+    def __iter__(self) :
+        buffer = self.buffer
+        for tag_id, offset, length in zip(self.tag_ids, self.offsets, self.lengths) :
+            yield tag_id, buffer[offset:offset + length]
+
+
+def decode_payload_headers(payloads, starts=None) :
+    """
+    Decode the headers of many ILTag payloads (e.g. :obj:`il2_rest.models.RecordModel.payloadBytes`) in one pass.
+
+    The payloads can be given as a sequence of :obj:`bytes` (which are copied once into a single buffer)
+    or as a single buffer with the position where each payload starts.
+
+    Args:
+        payloads (iterable of :obj:`bytes` or :obj:`bytes`/:obj:`bytearray`/:obj:`memoryview`): Payloads.
+        starts (iterable of :obj:`int`, optional): Start of each payload, if `payloads` is a single buffer.
+
+    Returns:
+        :obj:`PayloadHeaders`: Tag ids, value positions and lengths of the payloads.
+
+    Raises:
+        ValueError: If a payload is truncated.
+
+    Example:
+        >>> headers = decode_payload_headers([record.payloadBytes for record in chain.records(pageSize=0).items])
+        >>> for tag_id, value in headers :
+        ...     print(tag_id, bytes(value))
+    """
+    if starts is None :
+        # The payloads are iterated twice, so a generator is read only once
+        payloads = list(payloads)
+        starts = array('Q')
+        ends = array('Q')
+        position = 0
+        for payload in payloads :
+            starts.append(position)
+            position += len(payload)
+            ends.append(position)
+        buffer = b''.join(payloads)
+    else :
+        buffer = payloads
+        ends = None
+    size = len(buffer)
+    tag_ids = array('Q')
+    offsets = array('Q')
+    lengths = array('Q')
+    for i, start in enumerate(starts) :
+        end = ends[i] if ends is not None else size
+        try :
+            # Inlined fast path of iltag_header_at: tag id and length encoded in a single byte each
+            tag_id = buffer[start]
+            if 16 <= tag_id < 0xF8 and start + 1 < end and buffer[start + 1] < 0xF8 :
+                offset, length = start + 2, buffer[start + 1]
+            else :
+                tag_id, offset, length = iltag_header_at(buffer, start)
+        except IndexError :
+            offset, length = end, 1
+        if offset + length > end :
+            raise ValueError(f'Truncated payload at offset {start}.')
+        tag_ids.append(tag_id)
+        offsets.append(offset)
+        lengths.append(length)
+    return PayloadHeaders(buffer, tag_ids, offsets, lengths)
+
+
+# .NET ticks (100 ns) used by the node for date times and time spans
+_TICKS_EPOCH = datetime.datetime(1, 1, 1, tzinfo=datetime.timezone.utc)
+_TICK = datetime.timedelta(microseconds=1)
+
+
+def _tag_at(buffer, pos, limit) :
+    tag_id, value_pos, length = iltag_header_at(buffer, pos)
+    end = value_pos + length
+    if end > limit :
+        raise ValueError(f'Truncated tag {tag_id} at offset {pos}.')
+    return tag_id, value_pos, end
+
+
+def _write_tag(tag_id, body, out) :
+    ilint_encode(tag_id, out)
+    if tag_id >= 16 :
+        ilint_encode(len(body), out)
+    out.extend(body)
+
+
+def _int_codec(size, signed) :
+    def decode(buffer, pos, end) :
+        return int.from_bytes(buffer[pos:end], 'big', signed=signed)
+    def encode(value, out) :
+        out.extend(int(value).to_bytes(size, 'big', signed=signed))
+    return decode, encode
+
+def _float_codec(fmt) :
+    def decode(buffer, pos, end) :
+        return struct.unpack_from(fmt, buffer, pos)[0]
+    def encode(value, out) :
+        out.extend(struct.pack(fmt, value))
+    return decode, encode
+
+def _decode_ilint(buffer, pos, end) :
+    return ilint_decode_at(buffer, pos)[0]
+
+def _encode_ilint(value, out) :
+    ilint_encode(value, out)
+
+def _decode_bytes(buffer, pos, end) :
+    return bytes(buffer[pos:end])
+
+def _encode_bytes(value, out) :
+    out.extend(value)
+
+def _decode_string(buffer, pos, end) :
+    return bytes(buffer[pos:end]).decode('utf-8')
+
+def _encode_string(value, out) :
+    out.extend(value.encode('utf-8'))
+
+def _decode_bool(buffer, pos, end) :
+    return buffer[pos] != 0
+
+def _encode_bool(value, out) :
+    out.append(1 if value else 0)
+
+def _decode_null(buffer, pos, end) :
+    return None
+
+def _encode_null(value, out) :
+    pass
+
+def _decode_bigint(buffer, pos, end) :
+    return int.from_bytes(buffer[pos:end], 'big', signed=True)
+
+def _encode_bigint(value, out) :
+    out.extend(value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True))
+
+def _decode_ilint_array(buffer, pos, end) :
+    count, pos = ilint_decode_at(buffer, pos)
+    values = []
+    for _ in range(count) :
+        value, pos = ilint_decode_at(buffer, pos)
+        values.append(value)
+    return values
+
+def _encode_ilint_array(values, out) :
+    ilint_encode(len(values), out)
+    for value in values :
+        ilint_encode(value, out)
+
+def _decode_range(buffer, pos, end) :
+    start, pos = ilint_decode_at(buffer, pos)
+    return start, int.from_bytes(buffer[pos:pos + 2], 'big')
+
+def _encode_range(value, out) :
+    ilint_encode(value[0], out)
+    out.extend(value[1].to_bytes(2, 'big'))
+
+def _decode_version(buffer, pos, end) :
+    return struct.unpack_from('>iiii', buffer, pos)
+
+def _encode_version(value, out) :
+    out.extend(struct.pack('>iiii', *value))
+
+def _decode_array(buffer, pos, end) :
+    count, pos = ilint_decode_at(buffer, pos)
+    values = []
+    for _ in range(count) :
+        value, pos = _decode_any(buffer, pos, end)
+        values.append(value)
+    return values
+
+def _encode_array(values, out) :
+    ilint_encode(len(values), out)
+    for value in values :
+        _encode_any(value, out)
+
+def _decode_sequence(buffer, pos, end) :
+    # Unlike the array (21), the sequence has no count: its tags fill the value
+    values = []
+    while pos < end :
+        value, pos = _decode_any(buffer, pos, end)
+        values.append(value)
+    return values
+
+def _encode_sequence(values, out) :
+    for value in values :
+        _encode_any(value, out)
+
+def _decode_dict(buffer, pos, end) :
+    count, pos = ilint_decode_at(buffer, pos)
+    values = {}
+    for _ in range(count) :
+        key, pos = _decode_any(buffer, pos, end)
+        values[key], pos = _decode_any(buffer, pos, end)
+    return values
+
+def _encode_dict(values, out) :
+    ilint_encode(len(values), out)
+    for key, value in values.items() :
+        _encode_any(str(key), out)
+        _encode_any(value, out)
+
+
+# Value decoder and encoder of the standard tags
+_STANDARD_CODECS = {
+    0: (_decode_null, _encode_null),
+    1: (_decode_bool, _encode_bool),
+    2: _int_codec(1, True),
+    3: _int_codec(1, False),
+    4: _int_codec(2, True),
+    5: _int_codec(2, False),
+    6: _int_codec(4, True),
+    7: _int_codec(4, False),
+    8: _int_codec(8, True),
+    9: _int_codec(8, False),
+    10: (_decode_ilint, _encode_ilint),
+    11: _float_codec('>f'),
+    12: _float_codec('>d'),
+    13: (_decode_bytes, _encode_bytes),
+    16: (_decode_bytes, _encode_bytes),
+    17: (_decode_string, _encode_string),
+    18: (_decode_bigint, _encode_bigint),
+    20: (_decode_ilint_array, _encode_ilint_array),
+    21: (_decode_array, _encode_array),
+    22: (_decode_sequence, _encode_sequence),
+    23: (_decode_range, _encode_range),
+    24: (_decode_version, _encode_version),
+    25: (_decode_ilint_array, _encode_ilint_array),
+    30: (_decode_dict, _encode_dict),
+    31: (_decode_dict, _encode_dict),
+}
+
+
+def _decode_any(buffer, pos, limit) :
+    # Tags not described by a data model: standard tags are decoded, the others are kept as bytes
+    tag_id, value_pos, end = _tag_at(buffer, pos, limit)
+    decode = _STANDARD_CODECS.get(tag_id, (_decode_bytes,))[0]
+    return decode(buffer, value_pos, end), end
+
+def _encode_any(value, out) :
+    if value is None :
+        tag_id = 0
+    elif isinstance(value, bool) :
+        tag_id = 1
+    elif isinstance(value, int) :
+        tag_id = 10 if value >= 0 else 8
+    elif isinstance(value, float) :
+        tag_id = 12
+    elif isinstance(value, str) :
+        tag_id = 17
+    elif isinstance(value, (bytes, bytearray, memoryview)) :
+        tag_id = 16
+    elif isinstance(value, dict) :
+        tag_id = 31 if all(isinstance(v, str) for v in value.values()) else 30
+    else :
+        tag_id = 22
+    body = bytearray()
+    _STANDARD_CODECS[tag_id][1](value, body)
+    _write_tag(tag_id, body, out)
+
+
+def _cast_codec(cast, decode, encode) :
+    if cast == DataFieldCast.DateTime :
+        def cast_decode(buffer, pos, end) :
+            return _TICKS_EPOCH + decode(buffer, pos, end) // 10 * _TICK
+        def cast_encode(value, out) :
+            if value.tzinfo is None :
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            encode((value - _TICKS_EPOCH) // _TICK * 10, out)
+        return cast_decode, cast_encode
+    if cast == DataFieldCast.TimeSpan :
+        def cast_decode(buffer, pos, end) :
+            return decode(buffer, pos, end) // 10 * _TICK
+        def cast_encode(value, out) :
+            encode(value // _TICK * 10, out)
+        return cast_decode, cast_encode
+    return decode, encode
+
+
+def _compile_value(tag_id, field) :
+    """ Compile the value decoder and encoder of a field (or of the elements of an array field)."""
+    sub_fields = field.subDataFields if field is not None else None
+    if field is not None and field.isOpaque :
+        return _decode_bytes, _encode_bytes
+    if tag_id == 21 and field is not None and field.elementTagId is not None :
+        element_field = _ElementField(field)
+        decode_element, encode_element = _compile_tag(field.elementTagId, element_field)
+        def decode(buffer, pos, end) :
+            count, pos = ilint_decode_at(buffer, pos)
+            values = []
+            for _ in range(count) :
+                value, pos = decode_element(buffer, pos, end)
+                values.append(value)
+            return values
+        def encode(values, out) :
+            ilint_encode(len(values), out)
+            for value in values :
+                encode_element(value, out)
+        return decode, encode
+    if sub_fields :
+        return _compile_fields(sub_fields)
+    decode, encode = _STANDARD_CODECS.get(tag_id, (_decode_bytes, _encode_bytes))
+    if field is not None and field.cast is not None and 2 <= tag_id <= 10 :
+        return _cast_codec(field.cast, decode, encode)
+    return decode, encode
+
+
+def _compile_tag(tag_id, field) :
+    """ Compile the decoder and encoder of a tag (header and value) with a fixed tag id."""
+    decode_value, encode_value = _compile_value(tag_id, field)
+    opaque = field is not None and bool(field.isOpaque)
+    def decode(buffer, pos, limit) :
+        found, value_pos, end = _tag_at(buffer, pos, limit)
+        if found != tag_id and not opaque :
+            raise ValueError(f'Tag {found} found instead of {tag_id} at offset {pos}.')
+        return decode_value(buffer, value_pos, end), end
+    def encode(value, out) :
+        body = bytearray()
+        encode_value(value, body)
+        _write_tag(tag_id, body, out)
+    return decode, encode
+
+
+def _compile_fields(fields) :
+    """ Compile the decoder and encoder of the value of a tag made of a sequence of data fields."""
+    compiled = [(field.name, bool(field.isOptional)) + _compile_tag(field.tagId, field) for field in fields]
+    def decode(buffer, pos, end) :
+        values = {}
+        for name, optional, decode_field, _ in compiled :
+            if pos >= end :
+                if not optional :
+                    raise ValueError(f'Missing field {name!r}.')
+                continue
+            if buffer[pos] == 0 :
+                # Null tag of an absent field
+                values[name] = None
+                pos += 1
+                continue
+            values[name], pos = decode_field(buffer, pos, end)
+        return values
+    def encode(values, out) :
+        nulls = 0
+        for name, optional, _, encode_field in compiled :
+            value = values.get(name)
+            if value is None :
+                if not optional :
+                    raise ValueError(f'Missing field {name!r}.')
+                nulls += 1
+                continue
+            # Absent fields followed by present fields are written as null tags
+            out.extend(bytes(nulls))
+            nulls = 0
+            encode_field(value, out)
+    return decode, encode
+
+
+class _ElementField :
+    """ Data field of the elements of an array field (see :obj:`il2_rest.models.DataModel.DataFieldModel.elementTagId`)."""
+    def __init__(self, field) :
+        self.name = field.name
+        self.tagId = field.elementTagId
+        self.elementTagId = None
+        self.isOpaque = False
+        self.isOptional = False
+        self.cast = field.cast
+        self.subDataFields = field.subDataFields
+
+
+class PayloadCodec :
+    """
+    Local decoder and encoder of the payloads of a data model.
+
+    The data fields of the model (:obj:`il2_rest.models.DataModel.DataFieldModel`) are compiled once
+    into a chain of functions, so the payload bytes of the records returned by
+    :obj:`il2_rest.RestChain.records` can be decoded without asking the node to map them to JSON
+    (:obj:`il2_rest.RestChain.records_as_json`).
+
+    Fields are decoded in order. Optional fields missing at the end of the payload are omitted and
+    null tags are decoded as `None`. Fields with subfields are decoded as dicts, and integer fields
+    cast as `DateTime`/`TimeSpan` as :obj:`datetime.datetime`/:obj:`datetime.timedelta`.
+
+    Args:
+        data_model (:obj:`il2_rest.models.DataModel`): Data model of the payload.
+
+    Attributes:
+        payload_tag_id (:obj:`int`): Tag id of the payloads.
+        payload_name (:obj:`str`): Name of the data model.
+        field_names (:obj:`list` of :obj:`str`): Names of the data fields.
+
+    Example:
+        >>> codec = PayloadCodec(app.dataModels[0])
+        >>> for record in chain.records(pageSize=0).items :
+        ...     if record.payloadTagId == codec.payload_tag_id :
+        ...         print(codec.decode_record(record))
+        {'Version': 0, 'Apps': [4]}
+        >>> chain.add_record_unpacked(1, codec.payload_tag_id, codec.encode_body({'Version': 0, 'Apps': [4]}))
+    """
+    def __init__(self, data_model) :
+        self.payload_tag_id = data_model.payloadTagId
+        self.payload_name = data_model.payloadName
+        self.field_names = [field.name for field in data_model.dataFields]
+        self.__decode, self.__encode = _compile_fields(data_model.dataFields)
+
+    def decode(self, payload) :
+        """
+        Decode a payload.
+
+        Args:
+            payload (:obj:`bytes`): Payload bytes (with the payload tag id and length).
+
+        Returns:
+            :obj:`dict`: Values of the fields.
+
+        Raises:
+            ValueError: If the payload does not match the data model.
+        """
+        tag_id, pos, end = _tag_at(payload, 0, len(payload))
+        if tag_id != self.payload_tag_id :
+            raise ValueError(f'Payload tag {tag_id} found instead of {self.payload_tag_id}.')
+        return self.__decode(payload, pos, end)
+
+    def decode_body(self, body) :
+        """
+        Decode the inner bytes of a payload.
+
+        Args:
+            body (:obj:`bytes`): Payload inner bytes (without the payload tag id and length).
+
+        Returns:
+            :obj:`dict`: Values of the fields.
+        """
+        return self.__decode(body, 0, len(body))
+
+    def decode_record(self, record) :
+        """
+        Decode the payload of a record.
+
+        Args:
+            record (:obj:`il2_rest.models.RecordModel`): Record.
+
+        Returns:
+            :obj:`dict`: Values of the fields.
+        """
+        return self.decode(record.payloadBytes)
+
+    def encode_body(self, values) :
+        """
+        Encode the inner bytes of a payload, as required by :obj:`il2_rest.RestChain.add_record_unpacked`.
+
+        Args:
+            values (:obj:`dict`): Values of the fields.
+
+        Returns:
+            :obj:`bytes`: Payload inner bytes.
+
+        Raises:
+            ValueError: If a required field is missing.
+        """
+        out = bytearray()
+        self.__encode(values, out)
+        return bytes(out)
+
+    def encode(self, values) :
+        """
+        Encode a payload.
+
+        Args:
+            values (:obj:`dict`): Values of the fields.
+
+        Returns:
+            :obj:`bytes`: Payload bytes (with the payload tag id and length).
+        """
+        out = bytearray()
+        _write_tag(self.payload_tag_id, self.encode_body(values), out)
+        return bytes(out)
+
+
+def compile_data_models(data_models) :
+    """
+    Compile the payload codecs of the data models of an application
+    (see :obj:`il2_rest.models.AppsModel.PublishedApp.dataModels`).
+
+    Args:
+        data_models (:obj:`list` of :obj:`il2_rest.models.DataModel`): Data models.
+
+    Returns:
+        :obj:`dict` of :obj:`PayloadCodec`: Codecs by payload tag id.
+    """
+    return {model.payloadTagId: PayloadCodec(model) for model in data_models}
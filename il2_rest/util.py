@@ -37,22 +37,18 @@ import re
 import json
 import datetime
 import base64
-from OpenSSL import crypto
-from cryptography.x509 import NameOID
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+import bisect
+import hashlib
+import functools
+import threading
 
 import urllib.parse
 
 from typing import Optional
 from enum import Enum
-from packaging import version
-from colour import Color
 
-import pyiltags
+# cryptography and pyiltags are imported by the functions using them, so importing
+# this module (and the models) does not load them
 
 
 def null_condition_attribute(obj, attribute) :
@@ -162,11 +158,107 @@ def build_query(args_names, args_values) :
             ret_str += f'{name}={value}'
     return ret_str
 
+def _memoized_property(method) :
+    """
+    Read-only property computed only once per instance.
+
+    The instance must have a `_memo_lock` (:obj:`threading.RLock`) attribute.
+    """
+    attr = f'_memo_{method.__name__}'
+    @functools.wraps(method)
+    def getter(self) :
+        try :
+            return self.__dict__[attr]
+        except KeyError :
+            pass
+        with self._memo_lock :
+            if attr not in self.__dict__ :
+                self.__dict__[attr] = method(self)
+            return self.__dict__[attr]
+    return property(getter)
+
 def aes_decrypt(msg, key, iv) :
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
     cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
     decryptor = cipher.decryptor()
     return decryptor.update(msg) + decryptor.finalize()
 
+def b64_decode_chunks(text, chunk_size=65536) :
+    """
+    Decode a URL-safe base64 text in chunks.
+
+    Args:
+        text (:obj:`str`/:obj:`bytes` or iterable of them): Base64 text. It can be split in chunks of any size.
+        chunk_size (:obj:`int`, optional): Size of the slices used when `text` is a single string.
+
+    Yields:
+        :obj:`bytes`: Decoded chunks.
+    """
+    if isinstance(text, (str, bytes)) :
+        chunks = (text[i:i+chunk_size] for i in range(0, len(text), chunk_size))
+    else :
+        chunks = text
+    pending = b''
+    for chunk in chunks :
+        if isinstance(chunk, str) :
+            chunk = chunk.encode('ascii')
+        pending += chunk
+        # Base64 is decoded in groups of 4 characters
+        aligned = len(pending) - len(pending) % 4
+        if aligned :
+            yield base64.urlsafe_b64decode(pending[:aligned])
+            pending = pending[aligned:]
+    if pending :
+        yield base64.urlsafe_b64decode(pending + b'=' * (-len(pending) % 4))
+
+def aes_decrypt_chunks(chunks, key, iv) :
+    """
+    Decrypt an AES-CBC message in chunks.
+
+    Args:
+        chunks (iterable of :obj:`bytes`): Encrypted message.
+        key (:obj:`bytes`): AES key.
+        iv (:obj:`bytes`): AES IV.
+
+    Yields:
+        :obj:`bytes`: Decrypted chunks.
+    """
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    for chunk in chunks :
+        plain = decryptor.update(chunk)
+        if plain :
+            yield plain
+    plain = decryptor.finalize()
+    if plain :
+        yield plain
+
+
+class ChunksReader(io.RawIOBase) :
+    """
+    Read-only binary stream over an iterable of :obj:`bytes` chunks.
+
+    Args:
+        chunks (iterable of :obj:`bytes`): Chunks of the stream.
+    """
+    def __init__(self, chunks) :
+        self.__chunks = iter(chunks)
+        self.__pending = memoryview(b'')
+
+    def readable(self) :
+        return True
+
+    def readinto(self, b) :
+        while not self.__pending :
+            chunk = next(self.__chunks, None)
+            if chunk is None :
+                return 0
+            self.__pending = memoryview(chunk)
+        size = min(len(b), len(self.__pending))
+        b[:size] = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+        return size
+
 
 
 class LimitedRange :
@@ -258,6 +350,176 @@ class LimitedRange :
         """
         return other.start in self or other.end in self or self in other
 
+
+class LimitedRangeSet :
+    """
+    A set of integers stored as sorted and disjoint closed intervals.
+
+    Overlapping and adjacent ranges are merged when added, so membership and overlap
+    queries are answered with a binary search (:obj:`bisect`) over the interval starts.
+
+    Args:
+        ranges (iterable of :obj:`LimitedRange`/:obj:`str`/:obj:`int`, optional): Initial ranges.
+            Strings are parsed with :obj:`LimitedRange.resolve`.
+
+    Example:
+        >>> reserved = LimitedRangeSet(['[300-399]', '[500]'])
+        >>> reserved.add(LimitedRange(400, 50))
+        >>> str(reserved)
+        '[300-449], [500]'
+        >>> 420 in reserved, reserved.overlaps(LimitedRange(450, end=499))
+        (True, False)
+    """
+    def __init__(self, ranges=None) :
+        self.__starts = []
+        self.__ends = []
+        if ranges is not None :
+            for item in ranges :
+                self.add(item)
+
+    @staticmethod
+    def __as_range(item) :
+        if isinstance(item, LimitedRange) :
+            return item
+        if isinstance(item, str) :
+            return LimitedRange.resolve(item)
+        return LimitedRange(item)
+
+    def add(self, item) :
+        """
+        Add a range to the set.
+
+        Args:
+            item (:obj:`LimitedRange`/:obj:`str`/:obj:`int`): Range or single value.
+        """
+        item = self.__as_range(item)
+        start, end = item.start, item.end
+        # First and last intervals overlapping or adjacent to the new range
+        lo = bisect.bisect_left(self.__ends, start - 1)
+        hi = bisect.bisect_right(self.__starts, end + 1)
+        if lo < hi :
+            start = min(start, self.__starts[lo])
+            end = max(end, self.__ends[hi - 1])
+        self.__starts[lo:hi] = [start]
+        self.__ends[lo:hi] = [end]
+
+    def remove(self, item) :
+        """
+        Remove a range from the set. Values not in the set are ignored.
+
+        Args:
+            item (:obj:`LimitedRange`/:obj:`str`/:obj:`int`): Range or single value.
+        """
+        item = self.__as_range(item)
+        lo = bisect.bisect_left(self.__ends, item.start)
+        hi = bisect.bisect_right(self.__starts, item.end)
+        if lo >= hi :
+            return
+        starts, ends = [], []
+        if self.__starts[lo] < item.start :
+            starts.append(self.__starts[lo])
+            ends.append(item.start - 1)
+        if self.__ends[hi - 1] > item.end :
+            starts.append(item.end + 1)
+            ends.append(self.__ends[hi - 1])
+        self.__starts[lo:hi] = starts
+        self.__ends[lo:hi] = ends
+
+    def overlaps(self, item) :
+        """
+        Check if a range has any value in the set.
+
+        Args:
+            item (:obj:`LimitedRange`/:obj:`str`/:obj:`int`): Range or single value.
+
+        Returns:
+            :obj:`bool`: Return True if there is an overlap.
+        """
+        item = self.__as_range(item)
+        i = bisect.bisect_left(self.__ends, item.start)
+        return i < len(self.__starts) and self.__starts[i] <= item.end
+
+    def union(self, other) :
+        """
+        Return a new set with the values of self and other.
+
+        Args:
+            other (:obj:`LimitedRangeSet`/iterable of :obj:`LimitedRange`): Other set.
+
+        Returns:
+            :obj:`LimitedRangeSet`: Union of the sets.
+        """
+        result = self.copy()
+        for item in other :
+            result.add(item)
+        return result
+
+    def difference(self, other) :
+        """
+        Return a new set with the values of self that are not in other.
+
+        Args:
+            other (:obj:`LimitedRangeSet`/iterable of :obj:`LimitedRange`): Other set.
+
+        Returns:
+            :obj:`LimitedRangeSet`: Difference of the sets.
+        """
+        result = self.copy()
+        for item in other :
+            result.remove(item)
+        return result
+
+    def copy(self) :
+        """
+        Return a copy of the set.
+
+        Returns:
+            :obj:`LimitedRangeSet`: Shallow copy of the set.
+        """
+        result = LimitedRangeSet()
+        result.__starts = list(self.__starts)
+        result.__ends = list(self.__ends)
+        return result
+
+    @property
+    def count(self) :
+        """:obj:`int`: Number of values in the set."""
+        return sum(end - start + 1 for start, end in zip(self.__starts, self.__ends))
+
+    def __or__(self, other) :
+        return self.union(other)
+
+    def __sub__(self, other) :
+        return self.difference(other)
+
+    def __contains__(self, item) :
+        """
+        Check if a value (or all values of a range) is in self.
+
+        Args:
+            item (:obj:`int`/:obj:`LimitedRange`): Item to check if is in self.
+
+        Returns:
+            :obj:`bool`: Return item in self.
+        """
+        item = self.__as_range(item)
+        i = bisect.bisect_right(self.__starts, item.start) - 1
+        return i >= 0 and item.end <= self.__ends[i]
+
+    def __iter__(self) :
+        for start, end in zip(self.__starts, self.__ends) :
+            yield LimitedRange(start, end=end)
+
+    def __len__(self) :
+        """ :obj:`int`: Number of disjoint ranges."""
+        return len(self.__starts)
+
+    def __eq__(self, other) :
+        return isinstance(other, LimitedRangeSet) and list(self) == list(other)
+
+    def __str__(self) :
+        return ', '.join(str(item) for item in self)
+
 class SimpleUri:
     """
     A simple class to treat URI for IL2 nodes.
@@ -352,14 +614,51 @@ class PKCS12Certificate:
     Args:
             path (:obj:`str`): Path to the .pfx certificate. 
             password (:obj:`str`): Password of the .pfx certificate.
+
+    *Note:* The properties derived from the certificate are computed only once. Use :obj:`PKCS12Certificate.load`
+    to share the same instance among all users of the same .pfx file.
     """
+    _registry = {}
+    _registry_lock = threading.Lock()
+
     def __init__(self, path, password) :
+        self._memo_lock = threading.RLock()
         self.__pkcs12_cert = self.__get_cert_from_file(path, password)
         self.__friendly_name = ''
+
+    @classmethod
+    def load(cls, path, password) :
+        """
+        Get a certificate from the process-wide registry, reading the .pfx file only if
+        it was not loaded yet or it has changed since it was loaded.
+
+        Args:
+            path (:obj:`str`): Path to the .pfx certificate. 
+            password (:obj:`str`): Password of the .pfx certificate.
+
+        Returns:
+            :obj:`PKCS12Certificate`: Certificate.
+        """
+        realpath = os.path.realpath(os.path.expanduser(path))
+        st = os.stat(realpath)
+        stamp = (st.st_mtime_ns, st.st_size, hashlib.sha256(password.encode()).digest())
+        with cls._registry_lock :
+            entry = cls._registry.get(realpath)
+            if entry is None or entry[0] != stamp :
+                entry = (stamp, cls(realpath, password))
+                cls._registry[realpath] = entry
+            return entry[1]
+
+    @classmethod
+    def clear_registry(cls) :
+        """ Remove all certificates from the process-wide registry."""
+        with cls._registry_lock :
+            cls._registry.clear()
     
-    @property
+    @_memoized_property
     def common_name(self):
         """:obj:`str`: Certificate Common Name. If none found, return empty string."""
+        from cryptography.x509 import NameOID
         cn = self.__pkcs12_cert[1].subject.get_attributes_for_oid(NameOID.COMMON_NAME)
         if not cn :
             return ''
@@ -371,33 +670,46 @@ class PKCS12Certificate:
         #return self.__pkcs12_cert.get_friendlyname()
         return self.__friendly_name
 
-    @property
+    @_memoized_property
     def private_key(self) :
         """:obj:`bytes`: Certificate private key."""
-        #return crypto.dump_privatekey(crypto.FILETYPE_PEM, self.__pkcs12_cert.get_privatekey())
+        from cryptography.hazmat.primitives import serialization
         return self.__pkcs12_cert[0].private_bytes(encoding=serialization.Encoding.PEM,
                     format=serialization.PrivateFormat.PKCS8,
                     encryption_algorithm=serialization.NoEncryption())
     
-    @property
+    @_memoized_property
     def public_certificate(self) :
         """:obj:`bytes`: Certificate public certificate."""
-        #return crypto.dump_certificate(crypto.FILETYPE_PEM, self.__pkcs12_cert.get_certificate())
+        from cryptography.hazmat.primitives import serialization
         return self.__pkcs12_cert[1].public_bytes(encoding=serialization.Encoding.PEM)
 
-    @property
+    @_memoized_property
+    def public_certificate_in_x509(self) :
+        """:obj:`bytes`: Public certificate in X509 format (PEM without the header, footer and line breaks)."""
+        return (
+            self.public_certificate
+                .replace(b'-----BEGIN CERTIFICATE-----\n', b'')
+                .replace(b'-----END CERTIFICATE-----\n', b'')
+                .replace(b'\n', b'')
+        )
+
+    @_memoized_property
     def key_id(self) :
         """:obj:`str`: Id of the key."""
+        from cryptography.hazmat.primitives import hashes, serialization
         digest = hashes.Hash(hashes.SHA1())
         digest.update(self.__pkcs12_cert[1].public_bytes(encoding=serialization.Encoding.DER))
         s = base64.urlsafe_b64encode(digest.finalize()).decode().replace('=','')
         return f'Key!{s}#SHA1'
 
-    @property
+    @_memoized_property
     def pub_key_hash(self) :
         """:obj:`str`: Public key hash in IL2 text representation."""
         if not self.__pkcs12_cert[1] :
             return None
+        import pyiltags
+        from cryptography.hazmat.primitives import hashes
         modulus = self.__pkcs12_cert[1].public_key().public_numbers().n
         exponet = self.__pkcs12_cert[1].public_key().public_numbers().e
         
@@ -423,12 +735,12 @@ class PKCS12Certificate:
         return f'{s}#SHA256'
         
 
-    @property
+    @_memoized_property
     def public_modulus(self) :
         """:obj:`int`: Public modulus."""
         return self.__pkcs12_cert[1].public_key().public_numbers().n
 
-    @property
+    @_memoized_property
     def public_exponent(self) :
         """:obj:`int`: Public exponent."""
         return self.__pkcs12_cert[1].public_key().public_numbers().e
@@ -452,6 +764,8 @@ class PKCS12Certificate:
         Returns:
             :obj:`bytes`: Decrypted message.
         """        
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
         msg = self.__pkcs12_cert[0].decrypt(cypher_text, padding=padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA1()),
             algorithm=hashes.SHA1(),
@@ -460,8 +774,9 @@ class PKCS12Certificate:
         return msg
 
     def __get_cert_from_file(self, cert_path, cert_pass) :
+        from cryptography.hazmat.primitives.serialization import pkcs12
         with open(os.path.expanduser(cert_path), 'rb') as f :
-            pkcs_cert = serialization.pkcs12.load_key_and_certificates(f.read(), cert_pass.encode())
+            pkcs_cert = pkcs12.load_key_and_certificates(f.read(), cert_pass.encode())
         return pkcs_cert
 
 
@@ -488,5 +803,26 @@ if __name__ == '__main__' :
         print(c.overlaps_with(b))
 
     
+    def benchmark_limited_range_set(n=5000) :
+        import random
+        import timeit
+        random.seed(0)
+        ranges = [LimitedRange(i * 1000 + random.randrange(500), random.randrange(1, 400)) for i in range(n)]
+        new_ranges = [LimitedRange(random.randrange(n * 1000), random.randrange(1, 400)) for i in range(100)]
+        reserved = LimitedRangeSet(ranges)
+
+        def pairwise() :
+            return [any(r.overlaps_with(other) for other in ranges) for r in new_ranges]
+
+        def with_set() :
+            return [reserved.overlaps(r) for r in new_ranges]
+
+        assert pairwise() == with_set()
+        print(f'{n} ranges, {len(new_ranges)} checks')
+        print(f'  build:    {timeit.timeit(lambda : LimitedRangeSet(ranges), number=10) / 10 * 1000:.2f} ms')
+        print(f'  pairwise: {timeit.timeit(pairwise, number=10) / 10 * 1000:.2f} ms')
+        print(f'  set:      {timeit.timeit(with_set, number=10) / 10 * 1000:.2f} ms')
+
     test_limited_range()
+    benchmark_limited_range_set()
     
\ No newline at end of file
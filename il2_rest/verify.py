@@ -0,0 +1,285 @@
+# Copyright (c) 2018-2020 InterlockLedger Network
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Client-side verification of the records of a chain.
+"""
+
+import os
+import base64
+import hashlib
+import collections
+import concurrent.futures
+
+from .enumerations import HashAlgorithms
+
+
+_HASHLIB_NAMES = {
+    HashAlgorithms.SHA1: 'sha1',
+    HashAlgorithms.SHA256: 'sha256',
+    HashAlgorithms.SHA512: 'sha512',
+    HashAlgorithms.SHA3_256: 'sha3_256',
+    HashAlgorithms.SHA3_512: 'sha3_512',
+}
+
+
+def parse_hash(text) :
+    """
+    Parse a hash in the IL2 text representation ('<URL-safe base64 digest>#<algorithm>').
+
+    Args:
+        text (:obj:`str`): Hash text.
+
+    Returns:
+        (:obj:`bytes`, :obj:`il2_rest.enumerations.HashAlgorithms`): Digest and hash algorithm.
+
+    Raises:
+        ValueError: If the text is not a valid hash.
+    """
+    if not text or '#' not in text :
+        raise ValueError(f'Invalid hash {text!r}.')
+    encoded, algorithm = text.rsplit('#', 1)
+    algorithm = HashAlgorithms(algorithm)
+    digest = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+    if algorithm in _HASHLIB_NAMES and len(digest) != hashlib.new(_HASHLIB_NAMES[algorithm]).digest_size :
+        raise ValueError(f'Invalid {algorithm.value} digest size in hash {text!r}.')
+    return digest, algorithm
+
+
+def compute_hash(data, algorithm=HashAlgorithms.SHA256) :
+    """
+    Compute the digest of some data.
+
+    Args:
+        data (:obj:`bytes`): Data to be hashed.
+        algorithm (:obj:`il2_rest.enumerations.HashAlgorithms`, optional): Hash algorithm.
+
+    Returns:
+        :obj:`bytes`: Digest.
+    """
+    if algorithm == HashAlgorithms.Copy :
+        return bytes(data)
+    return hashlib.new(_HASHLIB_NAMES[algorithm], data).digest()
+
+
+def _first_hash_mismatch(items) :
+    """ Return the serial of the first item where the digest of the data does not match the expected digest."""
+    for serial, data, digest, algorithm in items :
+        if compute_hash(data, HashAlgorithms(algorithm)) != digest :
+            return serial
+    return None
+
+
+class VerificationResult :
+    """
+    Result of a chain verification.
+
+    Attributes:
+        verified (:obj:`int`): Number of records verified before the first broken record.
+        last_serial (:obj:`int`): Serial number of the last verified record.
+        broken_serial (:obj:`int`): Serial number of the first broken record (`None` if all records are valid).
+        reason (:obj:`str`): Reason why the record is broken.
+        hashes_verified (:obj:`bool`): True if the hashes were recomputed from the record bytes. If False, only
+            the structure of the records returned by the node was checked.
+    """
+    def __init__(self, verified=0, last_serial=None, broken_serial=None, reason=None, hashes_verified=False) :
+        self.verified = verified
+        self.last_serial = last_serial
+        self.broken_serial = broken_serial
+        self.reason = reason
+        self.hashes_verified = hashes_verified
+
+    @property
+    def ok(self) :
+        """:obj:`bool`: True if no broken record was found."""
+        return self.broken_serial is None
+
+    def __str__(self) :
+        if self.ok :
+            checks = '' if self.hashes_verified else ', structure only, hashes not checked'
+            return f'{self.verified} records verified (last serial: {self.last_serial}{checks})'
+        return f'Record #{self.broken_serial} is broken: {self.reason}'
+
+
+class ChainVerifier :
+    """
+    Check the records of a chain, recomputing their hashes when the record bytes are available.
+
+    The structural checks are always done: serial numbers must be continuous, records must belong
+    to the chain, creation times must not go back and hashes must be valid (see :obj:`parse_hash`).
+    These checks only use data returned by the node, so they do not replace an audit.
+
+    The hash of a record covers its full encoding, which is not returned by the REST API. If the
+    encoded bytes of the records are available (e.g. from an export of the chain), `hasher` must
+    return them, so the hashes are recomputed in a process pool and compared with the records hashes.
+    Only then the result does not depend on trusting the node (see :obj:`VerificationResult.hashes_verified`).
+
+    Args:
+        chain (:obj:`il2_rest.RestChain`): Chain to be verified.
+        hasher (:obj:`callable`, optional): Function returning the bytes hashed for a record (:obj:`il2_rest.models.RecordModel`).
+        max_workers (:obj:`int`, optional): Number of worker processes to compute the hashes.
+            If 0, the hashes are computed in the current process.
+        page_size (:obj:`int`, optional): Number of records requested at once.
+        batch_size (:obj:`int`, optional): Number of records hashed at once by each worker process.
+
+    Example:
+        >>> result = ChainVerifier(chain, hasher=lambda record : exported_bytes[record.serial]).verify()
+        >>> if not result.ok :
+        ...     print(result)
+        Record #15 is broken: serial 16 found after 14
+    """
+    def __init__(self, chain, hasher=None, max_workers=None, page_size=100, batch_size=256) :
+        self.chain = chain
+        self.hasher = hasher
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.batch_size = batch_size
+
+    def iter_records(self, first_serial=0, last_serial=None) :
+        """
+        Iterate over the records of the chain, requesting them page by page.
+
+        Args:
+            first_serial (:obj:`int`, optional): Starting serial number.
+            last_serial (:obj:`int`, optional): Last serial number. If omitted, uses the last record of the chain summary.
+
+        Yields:
+            :obj:`il2_rest.models.RecordModel`: Records.
+        """
+        if last_serial is None :
+            last_serial = self.chain.summary.lastRecord
+        while last_serial is not None and first_serial <= last_serial :
+            records = [record for record in self.chain.records(firstSerial=first_serial, lastSerial=last_serial, pageSize=self.page_size).items
+                       if record.serial >= first_serial]
+            if not records :
+                return
+            yield from records
+            first_serial = records[-1].serial + 1
+
+    def verify(self, first_serial=0, last_serial=None) :
+        """
+        Verify a range of records of the chain.
+
+        Args:
+            first_serial (:obj:`int`, optional): Starting serial number.
+            last_serial (:obj:`int`, optional): Last serial number. If omitted, uses the last record of the chain summary.
+
+        Returns:
+            :obj:`VerificationResult`: Verification result.
+        """
+        if last_serial is None :
+            last_serial = self.chain.summary.lastRecord
+        result = self.verify_records(self.iter_records(first_serial, last_serial), first_serial)
+        if result.ok and last_serial is not None and (result.last_serial is None or result.last_serial < last_serial) :
+            missing = first_serial if result.last_serial is None else result.last_serial + 1
+            return VerificationResult(result.verified, result.last_serial, missing, 'record not returned by the node', result.hashes_verified)
+        return result
+
+    def verify_records(self, records, first_serial=None) :
+        """
+        Verify a sequence of records.
+
+        Args:
+            records (iterable of :obj:`il2_rest.models.RecordModel`): Records sorted by serial.
+            first_serial (:obj:`int`, optional): Expected serial number of the first record.
+
+        Returns:
+            :obj:`VerificationResult`: Verification result.
+        """
+        if self.hasher is None or self.max_workers == 0 :
+            return self.__verify(records, first_serial, None)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor :
+            return self.__verify(records, first_serial, executor)
+
+    def __verify(self, records, first_serial, executor) :
+        # Batches of hashes being computed, in serial order
+        pending = collections.deque()
+        # ProcessPoolExecutor uses the number of CPUs if max_workers is None
+        max_pending = 2 * ((self.max_workers or os.cpu_count() or 1) if executor else 1)
+        batch = []
+        start = None
+        previous = None
+        broken = None
+        hash_broken = None
+        for record in records :
+            if start is None :
+                start = record.serial
+            broken = self.__check_structure(record, previous, first_serial)
+            if broken :
+                break
+            if self.hasher is not None :
+                digest, algorithm = parse_hash(record.hash)
+                batch.append((record.serial, self.hasher(record), digest, algorithm.value))
+                if len(batch) >= self.batch_size :
+                    pending.append(self.__submit(executor, batch))
+                    batch = []
+                while len(pending) > max_pending and hash_broken is None :
+                    hash_broken = self.__result(pending.popleft())
+                if hash_broken is not None :
+                    break
+            previous = record
+        if batch and hash_broken is None :
+            pending.append(self.__submit(executor, batch))
+        while pending and hash_broken is None :
+            hash_broken = self.__result(pending.popleft())
+
+        if hash_broken is not None and (broken is None or hash_broken < broken[0]) :
+            broken = (hash_broken, 'hash does not match the record bytes')
+        if broken is None :
+            return VerificationResult(0 if previous is None else previous.serial - start + 1, previous.serial if previous else None,
+                                      hashes_verified=self.hasher is not None)
+        verified = 0 if start is None else max(0, broken[0] - start)
+        return VerificationResult(verified, broken[0] - 1 if verified else None, broken[0], broken[1], self.hasher is not None)
+
+    @staticmethod
+    def __submit(executor, batch) :
+        if executor :
+            return executor.submit(_first_hash_mismatch, batch)
+        return _first_hash_mismatch(batch)
+
+    @staticmethod
+    def __result(item) :
+        return item.result() if isinstance(item, concurrent.futures.Future) else item
+
+    def __check_structure(self, record, previous, first_serial) :
+        serial = record.serial
+        if previous is None :
+            if first_serial is not None and serial != first_serial :
+                return (first_serial, f'serial {serial} found instead of {first_serial}')
+        else :
+            if serial != previous.serial + 1 :
+                return (previous.serial + 1, f'serial {serial} found after {previous.serial}')
+            if record.createdAt and previous.createdAt and record.createdAt < previous.createdAt :
+                return (serial, 'created before the previous record')
+        if record.chainId is not None and record.chainId != self.chain.id :
+            return (serial, f'record belongs to chain {record.chainId}')
+        try :
+            parse_hash(record.hash)
+        except ValueError as e :
+            return (serial, str(e))
+        return None
@@ -41,6 +41,13 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     packages=setuptools.find_packages(),
+    entry_points={
+        'console_scripts': [
+            'il2=il2_rest.cli:main',
+            'il2-broker=il2_rest.broker:main',
+            'il2-import=il2_rest.importer:main',
+        ],
+    },
     install_requires=[
           'colour>=0.1.5',
           'packaging>=19.2',
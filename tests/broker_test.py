@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+import requests
+
+from .util import *
+
+from il2_rest import RestNode
+from il2_rest.broker import NodeBroker
+from il2_rest.util import PKCS12Certificate
+
+
+class _Session :
+    """ Answers the requests with the request details, like a warm requests.Session of the broker."""
+    def __init__(self) :
+        self.calls = []
+
+    def request(self, method, url, headers=None, params=None, data=None, timeout=None) :
+        self.calls.append((method, url))
+        response = requests.Response()
+        response.url = url
+        if url.endswith('/missing') :
+            response.status_code = 404
+            response.reason = 'Not Found'
+            response._content = b'Chain not found'
+            return response
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        response._content = json.dumps({'method': method, 'params': params, 'timeout': list(timeout),
+                                        'body': None if data is None else data.decode('utf-8')}).encode('utf-8')
+        return response
+
+
+class _WarmNode(RestNode) :
+    def __init__(self, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.session = _Session()
+
+    def _get_session(self) :
+        return self.session
+
+
+class TestNodeBroker(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'broker.sock')
+        self.broker = NodeBroker(self.path, node_factory=_WarmNode)
+        self.thread = self.broker.start()
+
+    def tearDown(self) :
+        self.broker.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.folder)
+
+    def client(self, **kwargs) :
+        return RestNode(cert_file=self.cert_path, cert_pass=kwargs.pop('cert_pass', self.cert_pass), port=32020, broker_path=self.path, **kwargs)
+
+    def test_socket_permissions(self) :
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_forwarded_requests(self) :
+        node = self.client(connect_timeout=3, read_timeout=7)
+        reply = node._get('/chain', params={'pageSize': 10})
+        self.assertEqual(reply, {'method': 'GET', 'params': {'pageSize': 10}, 'timeout': [3, 7], 'body': None})
+        reply = node._post('/chain', {'name': 'chain'})
+        self.assertEqual(reply['method'], 'POST')
+        self.assertEqual(json.loads(reply['body']), {'name': 'chain'})
+        self.assertEqual(node._call_api_plain_doc('/chain', 'GET')[:1], '{')
+
+    def test_warm_node_is_shared(self) :
+        self.client()._get('/chain')
+        self.client()._get('/chain')
+        self.assertEqual(self.broker.stats, {'nodes': 1, 'created': 1, 'requests': 2})
+        self.client(address='127.0.0.1')._get('/chain')
+        self.assertEqual(self.broker.stats['created'], 2)
+
+    def test_thin_client_does_not_load_certificate(self) :
+        # The broker runs in this process, so its node is created first
+        self.client()._get('/chain')
+        with mock.patch.object(PKCS12Certificate, 'load') as load :
+            node = self.client()
+            node._get('/chain')
+        load.assert_not_called()
+
+    def test_http_error(self) :
+        with self.assertRaises(requests.HTTPError) as cm :
+            self.client()._get('/missing')
+        self.assertEqual(cm.exception.response.status_code, 404)
+        self.assertEqual(str(cm.exception), 'Chain not found')
+
+    def test_wrong_password(self) :
+        with self.assertRaises(ValueError) :
+            self.client(cert_pass='wrong')._get('/chain')
+        self.assertEqual(self.broker.stats['nodes'], 0)
+
+    def test_broker_not_running(self) :
+        node = RestNode(cert_file=self.cert_path, cert_pass=self.cert_pass, broker_path=os.path.join(self.folder, 'none.sock'))
+        with self.assertRaises(requests.ConnectionError) :
+            node._get('/chain')
+
+    def test_idle_nodes_are_discarded(self) :
+        self.broker.idle_timeout = 0
+        self.client()._get('/chain')
+        self.client(address='127.0.0.1')._get('/chain')
+        self.assertEqual(self.broker.stats['nodes'], 1)
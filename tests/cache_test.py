@@ -0,0 +1,268 @@
+import os
+import json
+import shelve
+import tempfile
+
+from .util import *
+
+from il2_rest import RestNode, RestChain
+from il2_rest.models import ChainIdModel
+from il2_rest.cache import *
+
+
+class FakeClock :
+    def __init__(self) :
+        self.now = 0.0
+    def __call__(self) :
+        return self.now
+
+
+class TestTTLCache(BaseTest) :
+    def test_expiration(self) :
+        clock = FakeClock()
+        cache = TTLCache(10, clock=clock)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 9.9
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats.hits, 2)
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_get_or_load(self) :
+        cache = TTLCache(10, clock=FakeClock())
+        calls = []
+        loader = lambda: calls.append(1) or 'value'
+        self.assertEqual(cache.get_or_load('a', loader), 'value')
+        self.assertEqual(cache.get_or_load('a', loader), 'value')
+        self.assertEqual(len(calls), 1)
+        cache.invalidate()
+        self.assertEqual(cache.get_or_load('a', loader), 'value')
+        self.assertEqual(len(calls), 2)
+
+    def test_disabled(self) :
+        cache = TTLCache(0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class TestLRUCache(BaseTest) :
+    def test_eviction(self) :
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_store(self) :
+        with tempfile.TemporaryDirectory() as folder :
+            path = os.path.join(folder, 'cache')
+            cache = LRUCache(1, store=shelve.open(path))
+            cache.put('a', {'value': 1})
+            cache.put('b', {'value': 2})
+            self.assertEqual(cache.get('a'), {'value': 1})
+            self.assertEqual(cache.stats.hits, 1)
+            cache.close()
+
+            cache = LRUCache(1, store=shelve.open(path))
+            self.assertEqual(cache.get('b'), {'value': 2})
+            self.assertIsNone(cache.get('c'))
+            self.assertEqual(cache.stats.misses, 1)
+            cache.close()
+
+    def test_max_bytes(self) :
+        cache = LRUCache(None, max_bytes=10)
+        cache.put('a', 'aaaa')
+        cache.put('b', 'bbbb')
+        cache.put('a', 'aaa')
+        self.assertEqual(cache.currbytes, 7)
+        cache.put('c', 'cccc')
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.currbytes, 7)
+        cache.put('d', 'd' * 11)
+        self.assertNotIn('d', cache)
+        self.assertEqual(cache.stats.evictions, 1)
+        cache.invalidate('a')
+        self.assertEqual(cache.currbytes, 4)
+
+
+class _Response :
+    def __init__(self, text) :
+        self.text = text
+    def json(self) :
+        return json.loads(self.text)
+
+
+class _RecordsNode(RestNode) :
+    """ Counts the requests of records."""
+    def __init__(self, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.urls = []
+
+    def _call_api(self, url, method, accept="application/json", params={}) :
+        self.urls.append(url)
+        return _Response('{"serial": %s, "createdAt": "2020-01-01T00:00:00+00:00", "payloadBytes": "AQID", "payload": {}}' % url.split('/')[2])
+
+
+class TestRecordCache(BaseTest) :
+    def test_shared_by_chains(self) :
+        node = _RecordsNode(cert_file=self.cert_path, cert_pass=self.cert_pass, record_cache_bytes=1024)
+        chain = RestChain(node, ChainIdModel(id='chain'))
+        self.assertEqual(chain.record_at(1).payloadBytes, b'\x01\x02\x03')
+        self.assertEqual(RestChain(node, ChainIdModel(id='chain')).record_at(1).payloadBytes, b'\x01\x02\x03')
+        chain.record_at_as_json(1)
+        RestChain(node, ChainIdModel(id='other')).record_at(1)
+        self.assertEqual(len(node.urls), 3)
+        self.assertEqual(node.cache_stats['records'].hits, 1)
+
+    def test_size_in_bytes(self) :
+        text = '{"serial": 1, "createdAt": "2020-01-01T00:00:00+00:00", "payloadBytes": "AQID", "payload": {"text": "%s"}}' % ('é' * 100)
+        size = len(text.encode('utf-8'))
+        for max_bytes, cached in [(len(text) + 50, False), (size, True)] :
+            node = _RecordsNode(cert_file=self.cert_path, cert_pass=self.cert_pass, record_cache_bytes=max_bytes)
+            node._call_api = lambda url, method, **kwargs : _Response(text)
+            chain = RestChain(node, ChainIdModel(id='chain'))
+            self.assertEqual(chain.record_at_as_json(1).payload, {'text': 'é' * 100})
+            self.assertLessEqual(node._record_cache.currbytes, max_bytes)
+            self.assertEqual(node._record_cache.currbytes, size if cached else 0)
+
+    def test_disabled(self) :
+        node = _RecordsNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        chain = RestChain(node, ChainIdModel(id='chain'))
+        chain.record_at(1)
+        chain.record_at(1)
+        self.assertEqual(len(node.urls), 2)
+        self.assertNotIn('records', node.cache_stats)
+
+
+class _HttpResponse :
+    def __init__(self, status_code, text='', headers=None) :
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+    def json(self) :
+        return json.loads(self.text)
+
+
+class _ConditionalNode(RestNode) :
+    """ Serves the chains with an ETag and records the request headers."""
+    def __init__(self, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.requests = []
+        self.etag = '"1"'
+
+    def _prepare_request(self, url, method, accept, params={}, headers=None) :
+        self.requests.append((url, dict(headers or {})))
+        if headers and headers.get('If-None-Match') == self.etag :
+            return _HttpResponse(304)
+        return _HttpResponse(200, '[{"id": "chain", "name": "Chain"}]', {'ETag': self.etag})
+
+
+class TestResponseCache(BaseTest) :
+    def test_ttl_without_validators(self) :
+        clock = FakeClock()
+        cache = ResponseCache(10, clock=clock)
+        calls = []
+        fetch = lambda headers : calls.append(headers) or _HttpResponse(200, str(len(calls)))
+        self.assertEqual(cache.get('/peers', fetch), '1')
+        self.assertEqual(cache.get('/peers', fetch), '1')
+        clock.now = 10
+        self.assertEqual(cache.get('/peers', fetch), '2')
+        self.assertEqual(calls, [{}, {}])
+        cache.invalidate('/peers')
+        self.assertEqual(cache.get('/peers', fetch), '3')
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 3))
+
+    def test_revalidation(self) :
+        clock = FakeClock()
+        cache = ResponseCache(10, clock=clock)
+        headers = {'ETag': '"a"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        self.assertEqual(cache.get('/', lambda h : _HttpResponse(200, 'body', headers)), 'body')
+        clock.now = 10
+        sent = []
+        self.assertEqual(cache.get('/', lambda h : sent.append(h) or _HttpResponse(304)), 'body')
+        self.assertEqual(sent, [{'If-None-Match': '"a"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}])
+        self.assertEqual(cache.revalidations, 1)
+        # The revalidated response is fresh again
+        self.assertEqual(cache.get('/', lambda h : self.fail('not expected')), 'body')
+
+    def test_node(self) :
+        node = _ConditionalNode(cert_file=self.cert_path, cert_pass=self.cert_pass, response_cache_ttl=60)
+        clock = FakeClock()
+        node._response_cache = ResponseCache(60, clock=clock)
+        self.assertEqual(node.chains[0].name, 'Chain')
+        self.assertEqual(node.chains[0].name, 'Chain')
+        self.assertEqual(len(node.requests), 1)
+        clock.now = 60
+        self.assertEqual(node.chains[0].name, 'Chain')
+        self.assertEqual(node.requests[-1], ('/chain', {'If-None-Match': '"1"'}))
+        self.assertEqual(node.cache_stats['responses'].hits, 2)
+
+    def test_node_disabled(self) :
+        node = _ConditionalNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        node.chains
+        node.chains
+        self.assertEqual(len(node.requests), 2)
+        self.assertNotIn('responses', node.cache_stats)
+
+
+class _ChainsNode(RestNode) :
+    """ Serves the chain list and summaries, counting the requests."""
+    def __init__(self, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.urls = []
+        self.last_record = 10
+
+    def _get(self, url, params={}) :
+        self.urls.append(url)
+        if url == '/chain' :
+            return [{'id': 'a', 'name': 'A'}, {'id': 'b', 'name': 'B'}]
+        return {'id': url.split('/')[2], 'name': 'Renamed', 'lastRecord': self.last_record}
+
+    def _call_api(self, url, method, accept="application/json", params={}) :
+        return _Response(json.dumps(self._get(url)))
+
+    def _post(self, url, body, params={}) :
+        self.last_record += 1
+        return {'serial': self.last_record, 'createdAt': '2020-01-01T00:00:00+00:00', 'payloadBytes': 'AQID'}
+
+
+class TestChainHandles(BaseTest) :
+    def test_registry(self) :
+        node = _ChainsNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        a, b = node.chains
+        self.assertEqual(node.chains, [a, b])
+        chain = node.chain_by_id('a')
+        self.assertIs(chain, a)
+        self.assertEqual(a.name, 'Renamed')
+
+    def test_summary_snapshot(self) :
+        node = _ChainsNode(cert_file=self.cert_path, cert_pass=self.cert_pass, summary_ttl=60)
+        chain = node.chain_by_id('a')
+        self.assertEqual(chain.summary.lastRecord, 10)
+        self.assertEqual(chain.summary.lastRecord, 10)
+        self.assertEqual(node.urls, ['/chain/a'])
+        node.last_record = 12
+        self.assertEqual(chain.summary.lastRecord, 10)
+        self.assertEqual(chain.refresh().lastRecord, 12)
+        # Adding a record discards the snapshot
+        chain.add_record(None)
+        self.assertEqual(chain.summary.lastRecord, 13)
+        node.last_record = 14
+        node.refresh()
+        self.assertEqual(chain.summary.lastRecord, 14)
+        self.assertEqual(node.urls.count('/chain/a'), 4)
+
+    def test_summary_not_cached(self) :
+        node = _ChainsNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        chain = node.chains[0]
+        chain.summary
+        chain.summary
+        self.assertEqual(node.urls.count('/chain/a'), 2)
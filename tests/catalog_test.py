@@ -0,0 +1,89 @@
+import json
+
+from .util import *
+
+from il2_rest import RestNode
+from il2_rest.util import LimitedRange
+from il2_rest.catalog import AppCatalog
+
+
+def _app(app_id, app_version, ranges, models=()) :
+    return {
+        'id': app_id,
+        'name': f'App{app_id}',
+        'appVersion': app_version,
+        'publisherName': 'Publisher',
+        'start': '2020-01-01T00:00:00+00:00',
+        'reservedILTagIds': ranges,
+        'dataModels': [{'payloadName': name, 'payloadTagId': tag_id, 'dataFields': [{'name': 'Version', 'tagId': 5}]} for name, tag_id in models],
+    }
+
+
+class _AppsNode :
+    """ Serves a list of apps and counts the requests."""
+    def __init__(self, apps) :
+        self.apps = apps
+        self.requests = 0
+
+    def _get_cached_text(self, url) :
+        self.requests += 1
+        return json.dumps({'network': 'Test', 'validApps': self.apps})
+
+
+class _Clock :
+    def __init__(self) :
+        self.now = 0.0
+
+    def __call__(self) :
+        return self.now
+
+
+class TestAppCatalog(BaseTest) :
+    apps = [
+        _app(1, '1.0.0.0', ['[300-399]'], [('Old', 300)]),
+        _app(1, '1.1.0.0', ['[300-399]', '[1000]'], [('Permissions', 300), ('Other', 1000)]),
+        _app(4, '1.0.0.0', ['[500-599]', '[2000-2999]'], [('Document', 500)]),
+    ]
+
+    def test_indexes(self) :
+        catalog = AppCatalog(_AppsNode(self.apps))
+        self.assertEqual(len(catalog), 3)
+        self.assertEqual(str(catalog.app(1).appVersion), '1.1.0.0')
+        self.assertEqual(str(catalog.app(1, '1.0.0.0').appVersion), '1.0.0.0')
+        self.assertIsNone(catalog.app(1, '2.0'))
+        self.assertIsNone(catalog.app(2))
+        self.assertEqual(catalog.data_model(300).payloadName, 'Permissions')
+        self.assertIsNone(catalog.data_model(301))
+        self.assertEqual(catalog.codec(500).decode(bytes([248, 252, 3, 5, 0, 1])), {'Version': 1})
+        self.assertIs(catalog.codec(500), catalog.codec(500))
+        for tag_id, app_id in [(300, 1), (399, 1), (1000, 1), (500, 4), (2500, 4), (299, None), (400, None), (1001, None), (3000, None)] :
+            app = catalog.app_of_tag(tag_id)
+            self.assertEqual(app.id if app else None, app_id)
+
+    def test_reserved_ranges(self) :
+        catalog = AppCatalog(_AppsNode(self.apps))
+        self.assertEqual(str(catalog.reserved_ranges), '[300-399], [500-599], [1000], [2000-2999]')
+        self.assertEqual([app.id for app in catalog.conflicts(['[0-299]', '[400-499]'])], [])
+        self.assertEqual([app.id for app in catalog.conflicts(['[399-500]'])], [4, 1])
+        self.assertEqual([app.id for app in catalog.conflicts([LimitedRange(2999, 10)])], [4])
+
+    def test_refresh(self) :
+        node = _AppsNode(self.apps)
+        clock = _Clock()
+        catalog = AppCatalog(node, ttl=10, clock=clock)
+        apps = catalog.apps
+        self.assertIs(catalog.apps, apps)
+        self.assertEqual(node.requests, 1)
+        # Expired but not changed: the apps are not parsed again
+        clock.now = 10
+        self.assertIs(catalog.apps, apps)
+        self.assertEqual(node.requests, 2)
+        node.apps = self.apps[:1]
+        self.assertTrue(catalog.refresh())
+        self.assertEqual(node.requests, 3)
+        self.assertIsNone(catalog.app(4))
+        self.assertIsNone(catalog.app_of_tag(500))
+
+    def test_network(self) :
+        node = RestNode(cert_file=self.cert_path, cert_pass=self.cert_pass, apps_ttl=30)
+        self.assertEqual(node.network.catalog.ttl, 30)
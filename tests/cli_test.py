@@ -0,0 +1,72 @@
+import io
+import os
+import json
+import tempfile
+import contextlib
+from unittest import mock
+
+from .util import *
+from .mirror_test import _RecordsChain
+from .follow_test import _RecordsNode
+
+from il2_rest import cli
+
+
+class TestCli(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.source = _RecordsChain(5)
+        self.node = _RecordsNode(self.source, cert_file=self.cert_path, cert_pass=self.cert_pass)
+        self.patch = mock.patch('il2_rest.cli._node', return_value=self.node)
+        self.patch.start()
+
+    def tearDown(self) :
+        self.patch.stop()
+
+    def run_cli(self, *argv) :
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output) :
+            code = cli.main(list(argv))
+        return code, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_environment_defaults(self) :
+        with mock.patch.dict(os.environ, {'IL2_CERT': 'rest.pfx', 'IL2_CERT_PASS': 'secret', 'IL2_PORT': '32020'}) :
+            args = cli.build_parser().parse_args(['summary'])
+        self.assertEqual(args.certificate_path, 'rest.pfx')
+        self.assertEqual(args.certificate_pass, 'secret')
+        self.assertEqual(args.api_port, 32020)
+        self.assertEqual(args.address, 'localhost')
+        self.assertTrue(args.verify_ca)
+
+    def test_missing_certificate(self) :
+        self.patch.stop()
+        try :
+            with mock.patch.dict(os.environ, {}, clear=True), self.assertRaises(SystemExit) :
+                cli.main(['summary', self.source.id])
+        finally :
+            self.patch.start()
+
+    def test_summary(self) :
+        code, lines = self.run_cli('summary', self.source.id)
+        self.assertEqual(code, 0)
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['id'], self.source.id)
+        self.assertEqual(lines[0]['lastRecord'], 4)
+
+    def test_tail(self) :
+        code, lines = self.run_cli('tail', self.source.id, '--from', '1', '--count', '3')
+        self.assertEqual(code, 0)
+        self.assertEqual([line['serial'] for line in lines], [1, 2, 3])
+
+    def test_export(self) :
+        with tempfile.TemporaryDirectory() as folder :
+            prefix = os.path.join(folder, 'records')
+            code, lines = self.run_cli('export', self.source.id, prefix)
+            self.assertEqual(code, 0)
+            self.assertEqual(lines[0]['exported'], 5)
+            self.assertEqual(lines[0]['lastSerial'], 4)
+            with open(lines[0]['files'][0]) as f :
+                self.assertEqual([json.loads(line)['serial'] for line in f], [0, 1, 2, 3, 4])
+            # Resumes from the checkpoint
+            code, lines = self.run_cli('export', self.source.id, prefix)
+            self.assertEqual(lines[0]['exported'], 0)
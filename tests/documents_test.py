@@ -0,0 +1,221 @@
+import io
+import zipfile
+import gzip
+import hashlib
+import datetime
+import requests
+
+from .util import *
+
+from il2_rest.models import DocumentsMetadataModel, DocumentsTransactionModel
+from il2_rest.enumerations import DocumentsCompression
+from il2_rest.documents import *
+
+
+def chunked(data, size) :
+    for i in range(0, len(data), size) :
+        yield data[i:i+size]
+
+
+class _Unseekable(io.RawIOBase) :
+    def __init__(self) :
+        self.buffer = io.BytesIO()
+    def writable(self) :
+        return True
+    def write(self, b) :
+        return self.buffer.write(b)
+
+
+class TestZipStreamReader(BaseTest) :
+    files = {
+        'item1.txt': b'first document',
+        'folder/item2.txt': b'second document ' * 1000,
+        'empty.txt': b'',
+    }
+
+    def build_zip(self, compression, seekable=True) :
+        out = io.BytesIO() if seekable else _Unseekable()
+        with zipfile.ZipFile(out, 'w', compression=compression) as z :
+            for name, content in self.files.items() :
+                z.writestr(name, content)
+        return out.getvalue() if seekable else out.buffer.getvalue()
+
+    def read_all(self, data, chunk_size=7, directory=None) :
+        return {entry.name: (entry, f.read()) for entry, f in ZipStreamReader(chunked(data, chunk_size), directory)}
+
+    def test_stored(self) :
+        ret = self.read_all(self.build_zip(zipfile.ZIP_STORED))
+        self.assertEqual(ret['item1.txt'][1], self.files['item1.txt'])
+        self.assertEqual(ret['item2.txt'][1], self.files['folder/item2.txt'])
+        self.assertEqual(ret['item2.txt'][0].path, '/folder')
+        self.assertEqual(ret['empty.txt'][1], b'')
+
+    def test_deflated(self) :
+        ret = self.read_all(self.build_zip(zipfile.ZIP_DEFLATED), chunk_size=1000)
+        self.assertEqual(len(ret), 3)
+        self.assertEqual(ret['item2.txt'][1], self.files['folder/item2.txt'])
+
+    def test_data_descriptor(self) :
+        ret = self.read_all(self.build_zip(zipfile.ZIP_DEFLATED, seekable=False), chunk_size=13)
+        self.assertEqual(ret['item1.txt'][1], self.files['item1.txt'])
+        self.assertEqual(ret['item2.txt'][1], self.files['folder/item2.txt'])
+
+    def test_skip_unread(self) :
+        data = self.build_zip(zipfile.ZIP_DEFLATED)
+        names = [entry.name for entry, f in ZipStreamReader(chunked(data, 100))]
+        self.assertEqual(names, ['item1.txt', 'item2.txt', 'empty.txt'])
+
+    def test_public_directory(self) :
+        directory = [
+            DocumentsMetadataModel.DirectoryEntry(name='item2.txt', comment='Second', mimeType='text/plain', path='/folder'),
+            DocumentsMetadataModel.DirectoryEntry(name='item1.txt', comment='First', mimeType='text/plain', path='/'),
+        ]
+        ret = self.read_all(self.build_zip(zipfile.ZIP_STORED), directory=directory)
+        self.assertIs(ret['item1.txt'][0], directory[1])
+        self.assertIs(ret['item2.txt'][0], directory[0])
+        self.assertIsNone(ret['empty.txt'][0].comment)
+
+    def test_corrupted(self) :
+        data = bytearray(self.build_zip(zipfile.ZIP_STORED))
+        data[40] ^= 0xFF
+        with self.assertRaises(ValueError) :
+            self.read_all(bytes(data))
+
+
+class _UploadChain :
+    """ Collects the bodies sent by the DocumentUploader."""
+    def __init__(self) :
+        self.bodies = {}
+
+    def documents_transaction_add_stream(self, transaction_id, name, comment, stream, content_type, relative_path="/", content_encoding=None) :
+        length = len(stream) if hasattr(stream, '__len__') else None
+        self.bodies[name] = (b''.join(stream), content_encoding, length)
+        return DocumentsMetadataModel.DirectoryEntry(name=name)
+
+
+class TestDocumentUploader(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.filepath = './tests/test.txt'
+        with open(self.filepath, 'rb') as f :
+            self.content = f.read()
+
+    def test_upload_digest(self) :
+        chain = _UploadChain()
+        uploader = DocumentUploader(chain, chunk_size=4)
+        uploader.add_item('transaction', 'item.txt', 'comment', self.filepath, relative_path='/folder')
+        body, encoding, length = chain.bodies['item.txt']
+        self.assertEqual(body, self.content)
+        self.assertIsNone(encoding)
+        self.assertEqual(length, len(self.content))
+        digest = uploader.digest_for('folder/item.txt')
+        self.assertEqual(digest.size, len(self.content))
+        self.assertEqual(digest.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertTrue(uploader.verify('/folder/item.txt', io.BytesIO(self.content)))
+        self.assertFalse(uploader.verify('folder/item.txt', io.BytesIO(b'other')))
+        with self.assertRaises(KeyError) :
+            uploader.verify('item.txt', io.BytesIO(self.content))
+
+    def test_upload_gzip(self) :
+        chain = _UploadChain()
+        uploader = DocumentUploader(chain, compression=DocumentsCompression.GZIP, chunk_size=3, max_pending_chunks=1)
+        uploader.add_item('transaction', 'item.txt', 'comment', self.filepath)
+        body, encoding, length = chain.bodies['item.txt']
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.decompress(body), self.content)
+        digest = uploader.digest_for('item.txt')
+        self.assertEqual(digest.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(digest.sent_size, len(body))
+
+
+class _TransactionChain :
+    """ Simulates the documents transactions of a node."""
+    def __init__(self, clock, timeout=60, fail_uploads=(), expire_on_upload=None) :
+        self.clock = clock
+        self.timeout = timeout
+        self.fail_uploads = list(fail_uploads)
+        self.expire_on_upload = expire_on_upload
+        self.transactions = {}
+        self.uploads = []
+
+    def documents_begin_transaction(self, **kwargs) :
+        transaction_id = f'T{len(self.transactions)}'
+        self.transactions[transaction_id] = {'documents': [], 'limit': self.clock() + datetime.timedelta(seconds=self.timeout)}
+        return self.documents_transaction_status(transaction_id)
+
+    def documents_transaction_status(self, transaction_id) :
+        t = self.transactions[transaction_id]
+        if t['limit'] <= self.clock() :
+            raise requests.HTTPError('Transaction expired')
+        return DocumentsTransactionModel(chain='chain', transactionId=transaction_id, canCommitNow=True, 
+                                         countOfUploadedDocuments=len(t['documents']), timeOutLimit=t['limit'])
+
+    def documents_transaction_add_stream(self, transaction_id, name, comment, stream, content_type, relative_path="/", content_encoding=None) :
+        b''.join(stream)
+        self.uploads.append((transaction_id, name))
+        t = self.transactions[transaction_id]
+        if self.expire_on_upload == len(self.uploads) :
+            t['limit'] = self.clock()
+        if t['limit'] <= self.clock() :
+            raise requests.HTTPError('Transaction expired')
+        t['documents'].append(name)
+        if self.fail_uploads and self.fail_uploads[0] == len(self.uploads) :
+            # Stored by the node, but the response is lost
+            self.fail_uploads.pop(0)
+            raise requests.ConnectionError('Connection lost')
+        return self.documents_transaction_status(transaction_id)
+
+    def documents_transaction_commit(self, transaction_id) :
+        self.documents_transaction_status(transaction_id)
+        return f'locator-{transaction_id}-{len(self.transactions[transaction_id]["documents"])}'
+
+
+class TestDocumentsTransaction(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.now = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.clock = lambda: self.now
+
+    def test_commit(self) :
+        chain = _TransactionChain(self.clock)
+        with DocumentsTransaction(chain, clock=self.clock) as transaction :
+            transaction.add_item('item1.txt', 'First', './tests/test.txt')
+            transaction.add_item('item2.txt', 'Second', './tests/test.txt')
+            self.assertIsNone(transaction.transaction)
+        self.assertEqual(transaction.locator, 'locator-T0-2')
+        self.assertEqual(transaction.restarts, 0)
+        self.assertEqual(len(transaction.uploader.digests), 2)
+
+    def test_lost_response(self) :
+        chain = _TransactionChain(self.clock, fail_uploads=[1])
+        with DocumentsTransaction(chain, clock=self.clock) as transaction :
+            transaction.add_item('item1.txt', 'First', './tests/test.txt')
+            transaction.add_item('item2.txt', 'Second', './tests/test.txt')
+        # The first document was accounted by the node, so it is not uploaded again
+        self.assertEqual(chain.uploads, [('T0', 'item1.txt'), ('T0', 'item2.txt')])
+        self.assertEqual(transaction.locator, 'locator-T0-2')
+
+    def test_expired(self) :
+        chain = _TransactionChain(self.clock, expire_on_upload=2)
+        with DocumentsTransaction(chain, clock=self.clock) as transaction :
+            transaction.add_item('item1.txt', 'First', './tests/test.txt')
+            transaction.add_item('item2.txt', 'Second', './tests/test.txt')
+        self.assertEqual(transaction.restarts, 1)
+        self.assertEqual(chain.uploads[2:], [('T1', 'item1.txt'), ('T1', 'item2.txt')])
+        self.assertEqual(transaction.locator, 'locator-T1-2')
+
+    def test_not_enough_time(self) :
+        chain = _TransactionChain(self.clock, timeout=2)
+        transaction = DocumentsTransaction(chain, clock=self.clock, safety_margin=5)
+        transaction.add_item('item1.txt', 'First', './tests/test.txt')
+        with self.assertRaises(TimeoutError) :
+            transaction.commit()
+        self.assertEqual(chain.uploads, [])
+
+    def test_exception_does_not_commit(self) :
+        chain = _TransactionChain(self.clock)
+        with self.assertRaises(RuntimeError) :
+            with DocumentsTransaction(chain, clock=self.clock) as transaction :
+                transaction.add_item('item1.txt', 'First', './tests/test.txt')
+                raise RuntimeError()
+        self.assertEqual(chain.transactions, {})
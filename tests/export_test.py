@@ -0,0 +1,155 @@
+import os
+import sys
+import gzip
+import json
+import shutil
+import tempfile
+import importlib.util
+import unittest
+from unittest import mock
+
+from .util import *
+from .mirror_test import _RecordsChain
+
+from il2_rest.enumerations import DocumentsCompression
+from il2_rest.export import ChainExporter
+
+
+class _FailingChain(_RecordsChain) :
+    """ Fails after some pages are requested."""
+    def __init__(self, count, pages) :
+        super().__init__(count)
+        self.pages = pages
+
+    def records(self, *args, **kwargs) :
+        if self.requests >= self.pages :
+            raise ConnectionError('connection lost')
+        return super().records(*args, **kwargs)
+
+
+class _StubTable :
+    def __init__(self, rows, schema) :
+        self.rows = rows
+        self.schema = schema
+
+    @classmethod
+    def from_pylist(cls, rows, schema=None) :
+        return cls(rows, schema or sorted(rows[0]))
+
+
+class _StubParquetWriter :
+    """ Truncates the file when opened, like pyarrow.parquet.ParquetWriter, and writes the rows as JSON lines."""
+    def __init__(self, path, schema) :
+        self.schema = schema
+        self.file = open(path, 'w')
+
+    def write_table(self, table) :
+        for row in table.rows :
+            self.file.write(json.dumps(row) + '\n')
+
+    def close(self) :
+        self.file.close()
+
+
+def _stub_pyarrow() :
+    parquet = mock.Mock(ParquetWriter=_StubParquetWriter)
+    pyarrow = mock.Mock(Table=_StubTable, parquet=parquet)
+    return mock.patch.dict(sys.modules, {'pyarrow': pyarrow, 'pyarrow.parquet': parquet})
+
+
+class TestChainExporter(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.prefix = os.path.join(self.folder, 'chain')
+
+    def read_serials(self, files, opener=open) :
+        serials = []
+        for path in files :
+            with opener(path, 'rt') as f :
+                serials.extend(json.loads(line)['serial'] for line in f)
+        return serials
+
+    def test_incremental(self) :
+        chain = _RecordsChain(25)
+        exporter = ChainExporter(chain, self.prefix, page_size=10)
+        self.assertEqual(exporter.export(), 25)
+        self.assertEqual(exporter.last_serial, 24)
+        self.assertEqual(exporter.export(), 0)
+        chain.records_json.extend(_RecordsChain(30).records_json[25:])
+        self.assertEqual(exporter.export(), 5)
+        self.assertEqual(exporter.files, [self.prefix + '-00000.ndjson'])
+        self.assertEqual(self.read_serials(exporter.files), list(range(30)))
+
+    def test_gzip_rotation(self) :
+        chain = _RecordsChain(25)
+        exporter = ChainExporter(chain, self.prefix, compression=DocumentsCompression.GZIP, page_size=5, rotate_records=10)
+        self.assertEqual(exporter.export(last_serial=12), 13)
+        self.assertEqual(exporter.export(), 12)
+        self.assertEqual(len(exporter.files), 3)
+        self.assertTrue(exporter.files[0].endswith('-00000.ndjson.gz'))
+        self.assertEqual(self.read_serials(exporter.files, gzip.open), list(range(25)))
+        self.assertEqual(len(self.read_serials(exporter.files[:1], gzip.open)), 10)
+
+    def test_rotation_splits_pages(self) :
+        exporter = ChainExporter(_RecordsChain(25), self.prefix, page_size=7, rotate_records=10)
+        self.assertEqual(exporter.export(), 25)
+        self.assertEqual([len(self.read_serials([path])) for path in exporter.files], [10, 10, 5])
+        self.assertEqual(self.read_serials(exporter.files), list(range(25)))
+
+    def test_parquet_incremental(self) :
+        chain = _RecordsChain(25)
+        with _stub_pyarrow() :
+            exporter = ChainExporter(chain, self.prefix, as_json=True, output_format='parquet', page_size=10)
+            self.assertEqual(exporter.export(), 25)
+            self.assertEqual(exporter.export(), 0)
+            chain.records_json.extend(_RecordsChain(30).records_json[25:])
+            self.assertEqual(exporter.export(), 5)
+        # Each export writes a new file, the files already exported are kept
+        self.assertEqual(exporter.files, [self.prefix + '-00000.parquet', self.prefix + '-00001.parquet'])
+        self.assertEqual(self.read_serials(exporter.files[:1]), list(range(25)))
+        self.assertEqual(self.read_serials(exporter.files), list(range(30)))
+        self.assertEqual(exporter.last_serial, 29)
+
+    def test_resume_after_failure(self) :
+        chain = _FailingChain(25, 2)
+        exporter = ChainExporter(chain, self.prefix, compression=DocumentsCompression.GZIP, page_size=5)
+        with self.assertRaises(ConnectionError) :
+            exporter.export()
+        self.assertEqual(exporter.last_serial, 9)
+        # Data written after the checkpoint (e.g. by a crashed process) is discarded
+        with open(exporter.files[0], 'ab') as f :
+            f.write(b'partial')
+        chain.pages = 100
+        self.assertEqual(exporter.export(), 15)
+        self.assertEqual(self.read_serials(exporter.files, gzip.open), list(range(25)))
+
+    def test_writer_failure(self) :
+        exporter = ChainExporter(_RecordsChain(50), os.path.join(self.folder, 'missing', 'chain'), page_size=5, queue_size=1)
+        with self.assertRaises(FileNotFoundError) :
+            exporter.export()
+
+    def test_other_chain(self) :
+        ChainExporter(_RecordsChain(5), self.prefix).export()
+        other = _RecordsChain(5)
+        other.id = 'other'
+        with self.assertRaises(ValueError) :
+            ChainExporter(other, self.prefix).export()
+
+    @unittest.skipUnless(importlib.util.find_spec('zstandard'), 'zstandard is not installed')
+    def test_zstd(self) :
+        import zstandard
+        exporter = ChainExporter(_RecordsChain(25), self.prefix, compression=DocumentsCompression.ZSTD, page_size=10)
+        exporter.export()
+        opener = lambda path, mode : zstandard.open(path, mode)
+        self.assertEqual(self.read_serials(exporter.files, opener), list(range(25)))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self) :
+        import pyarrow.parquet
+        exporter = ChainExporter(_RecordsChain(25), self.prefix, as_json=True, output_format='parquet', page_size=10, rotate_records=20)
+        self.assertEqual(exporter.export(), 25)
+        self.assertEqual(len(exporter.files), 2)
+        table = pyarrow.parquet.read_table(exporter.files[0])
+        self.assertEqual(table.column('serial').to_pylist(), list(range(20)))
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from .util import *
+from .mirror_test import _RecordsChain
+
+from il2_rest import RestNode, RestChain
+from il2_rest.models import ChainIdModel
+
+
+class _RecordsNode(RestNode) :
+    """ Serves the records of a simulated chain."""
+    def __init__(self, source, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.source = source
+
+    def _get(self, url, params={}) :
+        if url.startswith('/records@') :
+            first = params.get('firstSerial', 0)
+            return {'items': [dict(r) for r in self.source.records_json[first:first + params['pageSize']]], 'pageSize': params['pageSize']}
+        return {'id': self.source.id, 'lastRecord': len(self.source.records_json) - 1}
+
+
+class _Clock :
+    def __init__(self) :
+        self.now = 0.0
+
+    def __call__(self) :
+        return self.now
+
+
+class _StopAfter :
+    """ Stop event that advances the clock instead of waiting and stops after some waits."""
+    def __init__(self, clock, waits, on_wait=None) :
+        self.clock = clock
+        self.max_waits = waits
+        self.waits = []
+        self.on_wait = on_wait
+
+    def is_set(self) :
+        return len(self.waits) >= self.max_waits
+
+    def wait(self, timeout) :
+        self.waits.append(timeout)
+        self.clock.now += timeout
+        if self.on_wait :
+            self.on_wait(len(self.waits))
+        return self.is_set()
+
+
+class TestFollow(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.node = RestNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        self.clock = _Clock()
+        patcher = mock.patch('il2_rest.client.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_adaptive_polling(self) :
+        chain = _RecordsChain(25)
+        stop = _StopAfter(self.clock, 5)
+        serials = [record.serial for _, record in self.node.follow([chain], {chain.id: 0}, poll_interval=1, max_batch=10, max_interval=6, stop_event=stop)]
+        self.assertEqual(serials, list(range(25)))
+        # Full batches are requested right away, then the interval doubles while the chain is idle
+        self.assertEqual(stop.waits, [1, 2, 4, 6, 6])
+        self.assertEqual(chain.requests, 3 + 4)
+
+    def test_new_records(self) :
+        source = _RecordsChain(10)
+        node = _RecordsNode(source, cert_file=self.cert_path, cert_pass=self.cert_pass)
+        chain = RestChain(node, ChainIdModel(id=source.id))
+        def add_records(waits) :
+            if waits == 2 :
+                source.records_json.extend(_RecordsChain(13).records_json[10:])
+        stop = _StopAfter(self.clock, 4, add_records)
+        serials = [record.serial for record in chain.follow(poll_interval=1, max_batch=10, stop_event=stop)]
+        # Only the records added after the call are yielded
+        self.assertEqual(serials, [10, 11, 12])
+        self.assertEqual(stop.waits, [1, 2, 1, 2])
+
+    def test_many_chains(self) :
+        a, b = _RecordsChain(3), _RecordsChain(5)
+        b.id = 'other'
+        stop = _StopAfter(self.clock, 1)
+        received = [(chain.id, record.serial) for chain, record in self.node.follow([a, b], {'chain': 1, 'other': 3}, poll_interval=1, stop_event=stop)]
+        self.assertEqual(received, [('chain', 1), ('chain', 2), ('other', 3), ('other', 4)])
+
+    def test_invalid_batch(self) :
+        chain = _RecordsChain(3)
+        with self.assertRaises(ValueError) :
+            self.node.follow([chain], max_batch=0)
+        with self.assertRaises(ValueError) :
+            RestChain(self.node, ChainIdModel(id=chain.id)).follow(max_batch=0)
+
+    def test_page_limit_of_the_node(self) :
+        chain = _RecordsChain(25)
+        records = chain.records
+        # The node returns at most 5 records, fewer than max_batch
+        chain.records = lambda firstSerial=None, pageSize=10, **kwargs : records(firstSerial=firstSerial, pageSize=min(pageSize, 5))
+        stop = _StopAfter(self.clock, 1)
+        serials = [record.serial for _, record in self.node.follow([chain], {chain.id: 0}, poll_interval=1, max_batch=100, stop_event=stop)]
+        self.assertEqual(serials, list(range(25)))
+        # The pages are requested without waiting until the last record
+        self.assertEqual(stop.waits, [1])
+        self.assertEqual(chain.requests, 5)
@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .util import *
+
+from il2_rest.enumerations import RecordType
+from il2_rest.models import DataModel
+from il2_rest.payloads import PayloadCodec
+from il2_rest.importer import *
+
+
+class _Record :
+    def __init__(self, serial) :
+        self.serial = serial
+
+
+class _AppendChain :
+    """ Records the added payloads, optionally failing for some of them."""
+    def __init__(self, failures=None) :
+        self.records = []
+        self.failures = failures or {}
+        self.lock = threading.Lock()
+
+    def __add(self, value) :
+        error = self.failures.pop(value if not isinstance(value, dict) else value.get('n'), None)
+        if error is not None :
+            raise error
+        with self.lock :
+            self.records.append(value)
+            return _Record(len(self.records) - 1)
+
+    def add_record_as_json(self, applicationId=None, payloadTagId=None, payload=None, rec_type=RecordType.Data, model=None) :
+        return self.__add(dict(model.JSON, app=model.applicationId, tag=model.payloadTagId, type=model.type.value))
+
+    def add_record_unpacked(self, applicationId, payloadTagId, rec_bytes, rec_type=RecordType.Data) :
+        return self.__add(rec_bytes)
+
+
+def _http_error(status) :
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f'{status} error', response=response)
+
+
+class TestBulkImporter(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.journal = os.path.join(self.folder, 'import.journal')
+
+    def write(self, name, lines) :
+        path = os.path.join(self.folder, name)
+        with open(path, 'w') as f :
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_ndjson(self) :
+        path = self.write('items.ndjson', [json.dumps({'n': i}) for i in range(20)] + ['', json.dumps({'payload': {'n': 20}, 'applicationId': 8, 'type': 'Root'})])
+        chain = _AppendChain()
+        importer = BulkImporter(chain, self.journal, applicationId=4, payloadTagId=500, max_workers=4, max_pending=2)
+        result = importer.run(read_ndjson(path))
+        self.assertEqual(result.added, 21)
+        self.assertEqual(sorted(r['n'] for r in chain.records), list(range(21)))
+        self.assertIn({'n': 20, 'app': 8, 'tag': 500, 'type': 'Root'}, chain.records)
+        self.assertEqual(json.loads(json.dumps(result.json()))['added'], 21)
+        # Imported items are skipped
+        result = importer.run(read_ndjson(path))
+        self.assertEqual((result.added, result.skipped), (0, 21))
+        self.assertEqual(len(chain.records), 21)
+
+    def test_failures(self) :
+        path = self.write('items.ndjson', [json.dumps({'n': i}) for i in range(5)])
+        chain = _AppendChain({1: _http_error(400), 3: requests.Timeout('timeout')})
+        importer = BulkImporter(chain, self.journal, applicationId=4, payloadTagId=500)
+        result = importer.run(read_ndjson(path))
+        self.assertEqual(result.added, 3)
+        self.assertEqual([item for item, _ in result.errors], [1, 3])
+        # Rejected items are submitted again, but the timed out item may have been added
+        result = importer.run(read_ndjson(path))
+        self.assertEqual((result.added, result.skipped, result.uncertain), (1, 3, [3]))
+        result = importer.run(read_ndjson(path), retry_uncertain=True)
+        self.assertEqual((result.added, result.skipped), (1, 4))
+
+    def test_server_error_is_uncertain(self) :
+        path = self.write('items.ndjson', [json.dumps({'n': i}) for i in range(3)])
+        chain = _AppendChain({1: _http_error(504)})
+        importer = BulkImporter(chain, self.journal, applicationId=4, payloadTagId=500)
+        result = importer.run(read_ndjson(path))
+        self.assertEqual([item for item, _ in result.errors], [1])
+        # The gateway timed out, the node may have added the record
+        result = importer.run(read_ndjson(path))
+        self.assertEqual((result.added, result.skipped, result.uncertain), (0, 2, [1]))
+        result = importer.run(read_ndjson(path), retry_uncertain=True)
+        self.assertEqual((result.added, result.skipped), (1, 2))
+
+    def test_failures_before_sending(self) :
+        path = self.write('items.ndjson', [json.dumps({'n': i}) for i in range(4)])
+        refused = requests.ConnectionError(MaxRetryError(None, '/records', NewConnectionError(None, 'Connection refused')))
+        chain = _AppendChain({2: refused, 3: requests.ConnectionError('Connection aborted')})
+        invalid = [1]
+        def transform(item) :
+            if item['n'] in invalid :
+                invalid.remove(item['n'])
+                raise ValueError('invalid item')
+            return item
+        importer = BulkImporter(chain, self.journal, applicationId=4, payloadTagId=500, transform=transform, max_workers=1)
+        result = importer.run(read_ndjson(path))
+        self.assertEqual([item for item, _ in result.errors], [1, 2, 3])
+        # Items that never reached the node are submitted again, the aborted connection is uncertain
+        result = importer.run(read_ndjson(path))
+        self.assertEqual((result.added, result.skipped, result.uncertain), (2, 1, [3]))
+
+    def test_interrupted_journal(self) :
+        path = self.write('items.ndjson', [json.dumps({'n': i}) for i in range(3)])
+        with open(self.journal, 'w') as f :
+            f.write('S 0\nD 0 10\nS 1\nD 1')
+        result = BulkImporter(_AppendChain(), self.journal).run(read_ndjson(path))
+        self.assertEqual((result.added, result.skipped, result.uncertain), (1, 1, [1]))
+
+    def test_csv_with_codec(self) :
+        path = self.write('items.csv', ['version,apps', '0,4', '1,8'])
+        model = DataModel.from_json({'payloadTagId': 300, 'dataFields': [{'name': 'version', 'tagId': 5}, {'name': 'apps', 'tagId': 20}]})
+        transform = lambda row : {'version': int(row['version']), 'apps': [int(row['apps'])]}
+        chain = _AppendChain()
+        importer = BulkImporter(chain, self.journal, 1, 300, codec=PayloadCodec(model), transform=transform, max_workers=1)
+        result = importer.run(read_csv(path))
+        self.assertEqual(result.added, 2)
+        self.assertEqual(chain.records, [bytes([5, 0, 0, 20, 2, 1, 4]), bytes([5, 0, 1, 20, 2, 1, 8])])
+
+    def test_payload_bytes(self) :
+        path = self.write('items.ndjson', [json.dumps({'payloadBytes': 'BQAAFAIBBA=='})])
+        chain = _AppendChain()
+        BulkImporter(chain, self.journal, 1, 300).run(read_ndjson(path))
+        self.assertEqual(chain.records, [bytes([5, 0, 0, 20, 2, 1, 4])])
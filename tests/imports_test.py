@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import subprocess
+
+from .util import *
+
+import il2_rest
+
+
+# Heavy dependencies that must only be loaded when they are used
+HEAVY_MODULES = ['requests', 'OpenSSL', 'cryptography', 'colour', 'packaging', 'pyiltags']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(statement) :
+    """ Run an import in a new interpreter, returning its time in seconds and the heavy modules loaded."""
+    code = ('import sys, time, json\n'
+            't = time.perf_counter()\n'
+            f'{statement}\n'
+            't = time.perf_counter() - t\n'
+            f'print(json.dumps([t, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(output)
+
+
+class TestLazyImports(unittest.TestCase) :
+    def test_package(self) :
+        _, loaded = run_import('import il2_rest')
+        self.assertEqual(loaded, [])
+
+    def test_light_modules(self) :
+        _, loaded = run_import('import il2_rest.enumerations, il2_rest.cache, il2_rest.cli, il2_rest.broker')
+        self.assertEqual(loaded, [])
+
+    def test_client_defers_cryptography(self) :
+        _, loaded = run_import('from il2_rest import RestNode')
+        self.assertEqual(loaded, ['requests'])
+
+    def test_attributes(self) :
+        import il2_rest.client
+        self.assertIs(il2_rest.RestNode, il2_rest.client.RestNode)
+        self.assertIs(il2_rest.RestChain, il2_rest.client.RestChain)
+        self.assertIn('RestNetwork', dir(il2_rest))
+        with self.assertRaises(AttributeError) :
+            il2_rest.Unknown
+
+    def test_import_time(self) :
+        package_time = min(run_import('import il2_rest')[0] for _ in range(3))
+        client_time = min(run_import('import il2_rest.client')[0] for _ in range(3))
+        self.assertLess(package_time, client_time)
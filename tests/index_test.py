@@ -0,0 +1,52 @@
+import random
+import datetime
+
+from .util import *
+
+from il2_rest.models import RecordModel, PageOfModel
+from il2_rest.enumerations import RecordType
+from il2_rest.index import RecordIndex
+
+
+BASE_TIME = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+def make_record(serial) :
+    return RecordModel(applicationId=serial % 3, payloadTagId=300 + serial % 5, serial=serial, 
+                       rec_type=RecordType.Root if serial == 0 else RecordType.Data,
+                       createdAt=BASE_TIME + datetime.timedelta(minutes=serial), payloadBytes=b'\x01')
+
+
+class TestRecordIndex(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.records = [make_record(serial) for serial in range(200)]
+
+    def expected(self, app=None, tag=None, since=None, until=None, first=None, last=None) :
+        return [r.serial for r in self.records 
+                if (app is None or r.applicationId == app) and (tag is None or r.payloadTagId == tag)
+                and (since is None or r.createdAt >= since) and (until is None or r.createdAt < until)
+                and (first is None or r.serial >= first) and (last is None or r.serial <= last)]
+
+    def test_query(self) :
+        shuffled = list(self.records)
+        random.Random(1).shuffle(shuffled)
+        index = RecordIndex(shuffled[:100])
+        index.add(PageOfModel(items=[r.json() for r in shuffled[100:]], itemClass=RecordModel))
+        self.assertEqual(len(index), 200)
+        since = BASE_TIME + datetime.timedelta(minutes=20)
+        until = BASE_TIME + datetime.timedelta(minutes=150)
+        self.assertEqual(index.query(app=1), self.expected(app=1))
+        self.assertEqual(index.query(app=1, tag=302), self.expected(app=1, tag=302))
+        self.assertEqual(index.query(tag=301, since=since, until=until), self.expected(tag=301, since=since, until=until))
+        self.assertEqual(index.query(since=since, until=since + datetime.timedelta(minutes=3)), [20, 21, 22])
+        self.assertEqual(index.query(app=2, first_serial=50, last_serial=80), self.expected(app=2, first=50, last=80))
+        self.assertEqual(index.query(rec_type=RecordType.Root), [0])
+        self.assertEqual(index.query(app=7), [])
+
+    def test_records(self) :
+        index = RecordIndex(self.records)
+        self.assertEqual(index.add(self.records[:10]), 0)
+        self.assertIs(index.record(5), self.records[5])
+        self.assertEqual([r.serial for r in index.query(tag=300, last_serial=20, as_records=True)], [0, 5, 10, 15, 20])
+        self.assertIn(199, index)
+        self.assertNotIn(200, index)
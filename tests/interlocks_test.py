@@ -0,0 +1,67 @@
+import threading
+
+from .util import *
+
+from il2_rest.models import InterlockingRecordModel, PageOfModel
+from il2_rest.interlocks import InterlockGraph
+
+
+def interlock(chain_id, serial, target, target_serial) :
+    return InterlockingRecordModel(chainId=chain_id, serial=serial, createdAt='2020-01-01T00:00:00+00:00',
+                                   interlockedChainId=target, interlockedRecordSerial=target_serial,
+                                   interlockedRecordHash=f'{target}{target_serial}#SHA256')
+
+
+class _InterlocksChain :
+    def __init__(self, chain_id, interlocks) :
+        self.id = chain_id
+        self.interlocks_list = interlocks
+        self.calls = []
+        self.threads = set()
+
+    def interlocks(self, howManyFromLast=0, page=0, pageSize=10) :
+        self.calls.append(howManyFromLast)
+        self.threads.add(threading.get_ident())
+        items = self.interlocks_list[-howManyFromLast:] if howManyFromLast else self.interlocks_list
+        page = PageOfModel(itemClass=InterlockingRecordModel)
+        page.items = list(items)
+        return page
+
+
+class _InterlocksNode :
+    def __init__(self, chains, incoming) :
+        self.chains = chains
+        self.mirrors = []
+        self.incoming = incoming
+
+    def interlocks_of(self, chain) :
+        return self.incoming.get(chain, [])
+
+
+class TestInterlockGraph(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.a = _InterlocksChain('A', [interlock('A', serial, 'B', serial * 2) for serial in range(1, 6)])
+        self.b = _InterlocksChain('B', [interlock('B', 3, 'A', 1)])
+        self.node = _InterlocksNode([self.a, self.b], {'A': [interlock('C', 7, 'A', 4)]})
+
+    def test_queries(self) :
+        graph = InterlockGraph(self.node, incoming=True)
+        self.assertEqual(graph.refresh(), 7)
+        self.assertEqual(len(graph.interlocks_from('A')), 5)
+        self.assertEqual(graph.interlocked_chains('B'), {'A'})
+        self.assertEqual([r.chainId for r in graph.interlocks_to('A')], ['B', 'C'])
+        self.assertEqual(graph.first_covering('B', 5).interlockedRecordSerial, 6)
+        self.assertEqual(graph.latest_covering('B', 5).interlockedRecordSerial, 10)
+        self.assertIsNone(graph.first_covering('B', 11))
+        self.assertIsNone(graph.latest_covering('C', 1))
+        self.assertEqual(graph.find_by_hash('B4#SHA256')[0].serial, 2)
+
+    def test_incremental_refresh(self) :
+        graph = InterlockGraph(self.node)
+        graph.refresh()
+        self.a.interlocks_list += [interlock('A', serial, 'B', serial * 2) for serial in range(6, 16)]
+        self.assertEqual(graph.refresh(), 10)
+        self.assertEqual(self.a.calls, [0, 8, 16])
+        self.assertEqual(graph.refresh(), 0)
+        self.assertEqual(len(graph), 16)
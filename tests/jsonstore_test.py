@@ -0,0 +1,101 @@
+import os
+import json
+import tempfile
+import datetime
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from .util import *
+from .models_test import encrypt_json
+
+from il2_rest import RestNode, RestChain
+from il2_rest.models import ChainIdModel
+from il2_rest.util import PKCS12Certificate
+from il2_rest.jsonstore import JsonDocumentStore
+
+
+def create_pfx(path, password) :
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'other')])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    with open(path, 'wb') as f :
+        f.write(serialization.pkcs12.serialize_key_and_certificates(b'other', key, cert, None, 
+                serialization.BestAvailableEncryption(password.encode())))
+
+
+class TestJsonDocumentStore(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.certificate = PKCS12Certificate(path=self.cert_path, password=self.cert_pass)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'documents.db')
+
+    def tearDown(self) :
+        self.tmpdir.cleanup()
+
+    def test_put_get(self) :
+        store = JsonDocumentStore(self.certificate)
+        store.put('chain', 10, {'value': 1})
+        self.assertEqual(store.get('chain', 10), {'value': 1})
+        self.assertIsNone(store.get('chain', 11))
+        self.assertIsNone(store.get('other', 10))
+        self.assertIn(('chain', 10), store)
+        store.delete('chain', 10)
+        self.assertEqual(len(store), 0)
+
+    def test_encrypted_at_rest(self) :
+        store = JsonDocumentStore(self.certificate, self.path)
+        store.put('chain', 1, {'secret': 'plaintext value'})
+        store.close()
+        with open(self.path, 'rb') as f :
+            self.assertNotIn(b'plaintext value', f.read())
+        store = JsonDocumentStore(self.certificate, self.path)
+        self.assertEqual(store.get('chain', 1), {'secret': 'plaintext value'})
+        store.close()
+
+    def test_other_certificate(self) :
+        JsonDocumentStore(self.certificate, self.path).close()
+        pfx = os.path.join(self.tmpdir.name, 'other.pfx')
+        create_pfx(pfx, 'password')
+        with self.assertRaises(ValueError) :
+            JsonDocumentStore(PKCS12Certificate(pfx, 'password'), self.path)
+
+
+class _JsonDocumentsNode(RestNode) :
+    """ Simulates the JSON documents API of a node."""
+    def __init__(self, *args, **kwargs) :
+        super().__init__(*args, **kwargs)
+        self.documents = []
+        self.requests = 0
+
+    def _post(self, url, body, params={}) :
+        self.requests += 1
+        self.documents.append(encrypt_json(self.certificate, body))
+        return {'serial': len(self.documents) - 1, 'createdAt': '2020-01-01T00:00:00+00:00'}
+
+    def _get(self, url, params={}) :
+        self.requests += 1
+        serial = int(url.split('/')[-1])
+        return {'serial': serial, 'createdAt': '2020-01-01T00:00:00+00:00', 'encryptedJson': self.documents[serial]}
+
+
+class TestJsonDocumentStoreClient(BaseTest) :
+    def test_read_after_write(self) :
+        node = _JsonDocumentsNode(cert_file=self.cert_path, cert_pass=self.cert_pass, json_store_path=':memory:')
+        chain = RestChain(node, ChainIdModel(id='chain'))
+        record = chain.store_json_document({'value': 1})
+        self.assertEqual(chain.json_document_content_at(record.serial), {'value': 1})
+        self.assertEqual(node.requests, 1)
+
+    def test_read_from_node(self) :
+        node = _JsonDocumentsNode(cert_file=self.cert_path, cert_pass=self.cert_pass)
+        chain = RestChain(node, ChainIdModel(id='chain'))
+        chain.store_json_document({'value': 1})
+        self.assertEqual(chain.json_document_content_at(0), {'value': 1})
+        self.assertEqual(node.requests, 2)
@@ -0,0 +1,94 @@
+import os
+import tempfile
+
+from .util import *
+
+from il2_rest.models import RecordModel, RecordModelAsJson, ChainSummaryModel, PageOfModel
+from il2_rest.enumerations import RecordType
+from il2_rest.mirror import LocalRecordMirror
+
+
+class _RecordsChain :
+    """ Simulates the records API of a chain."""
+    def __init__(self, count) :
+        self.id = 'chain'
+        self.requests = 0
+        self.records_json = [{
+            'applicationId': 1 if serial == 0 else 4,
+            'chainId': self.id,
+            'createdAt': f'2020-01-01T00:00:{serial % 60:02d}.123456-03:00',
+            'hash': f'hash{serial}#SHA256',
+            'payloadTagId': 300 + serial % 2,
+            'serial': serial,
+            'type': 'Root' if serial == 0 else 'Data',
+            'version': 1,
+            'payloadBytes': 'AQID',
+            'payload': {'value': serial},
+        } for serial in range(count)]
+
+    @property
+    def summary(self) :
+        return ChainSummaryModel(chain_id=self.id, lastRecord=len(self.records_json) - 1)
+
+    def refresh(self) :
+        return self.summary
+
+    def __page(self, itemClass, firstSerial, lastSerial, pageSize) :
+        self.requests += 1
+        items = [dict(r) for r in self.records_json[firstSerial or 0:None if lastSerial is None else lastSerial + 1][:pageSize]]
+        return PageOfModel(items=items, pageSize=pageSize, itemClass=itemClass)
+
+    def records(self, firstSerial=None, lastSerial=None, page=0, pageSize=10, lastToFirst=False) :
+        return self.__page(RecordModel, firstSerial, lastSerial, pageSize)
+
+    def records_as_json(self, firstSerial=None, lastSerial=None, page=0, pageSize=10, lastToFirst=False) :
+        return self.__page(RecordModelAsJson, firstSerial, lastSerial, pageSize)
+
+    def record_at(self, serial) :
+        self.requests += 1
+        return RecordModel.from_json(dict(self.records_json[serial]))
+
+
+class TestLocalRecordMirror(BaseTest) :
+    def test_sync_incremental(self) :
+        chain = _RecordsChain(25)
+        mirror = LocalRecordMirror(chain, page_size=10)
+        self.assertEqual(mirror.sync(), 25)
+        self.assertEqual(chain.requests, 3)
+        self.assertEqual(mirror.last_serial, 24)
+        self.assertEqual(mirror.sync(), 0)
+        chain.records_json.extend(_RecordsChain(30).records_json[25:])
+        self.assertEqual(mirror.sync(), 5)
+        self.assertEqual(len(mirror), 30)
+
+    def test_queries(self) :
+        chain = _RecordsChain(20)
+        mirror = LocalRecordMirror(chain, page_size=7)
+        mirror.sync()
+        requests = chain.requests
+        record = mirror.record_at(5)
+        self.assertEqual(record.serial, 5)
+        self.assertEqual(record.payloadBytes, b'\x01\x02\x03')
+        self.assertEqual(record.createdAt, RecordModel.from_json(dict(chain.records_json[5])).createdAt)
+        self.assertEqual([r.serial for r in mirror.records(firstSerial=3, lastSerial=6)], [3, 4, 5, 6])
+        self.assertEqual([r.serial for r in mirror.records(payloadTagId=301, lastSerial=7, lastToFirst=True)], [7, 5, 3, 1])
+        self.assertEqual([r.serial for r in mirror.records(applicationId=1)], [0])
+        self.assertEqual([r.serial for r in mirror.records(rec_type=RecordType.Root)], [0])
+        self.assertEqual(chain.requests, requests)
+        # Not mirrored yet
+        chain.records_json.extend(_RecordsChain(21).records_json[20:])
+        self.assertEqual(mirror.record_at(20).serial, 20)
+        self.assertEqual(chain.requests, requests + 1)
+
+    def test_as_json_persistent(self) :
+        with tempfile.TemporaryDirectory() as tmpdir :
+            path = os.path.join(tmpdir, 'records.db')
+            mirror = LocalRecordMirror(_RecordsChain(5), path, as_json=True)
+            mirror.sync()
+            mirror.close()
+            mirror = LocalRecordMirror(_RecordsChain(5), path, as_json=True)
+            self.assertEqual(mirror.sync(), 0)
+            record = mirror.record_at(3)
+            self.assertIsInstance(record, RecordModelAsJson)
+            self.assertEqual(record.payload, {'value': 3})
+            mirror.close()
@@ -1,3 +1,12 @@
+import os
+import json
+import base64
+from pyilint import ilint_encode
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, padding as sym_padding
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
 from .util import *
 
 from il2_rest import RestNode, RestChain
@@ -264,4 +273,76 @@ class TestCertificatePermitModel(BaseTest) :
                 permissions=permissions,
                 purposes=purposes,
                 pkcs12_certificate=certificate
-            )
\ No newline at end of file
+            )
+
+def encrypt_json(certificate, json_data, aes_key=None, aes_iv=None) :
+    aes_key = aes_key or os.urandom(32)
+    aes_iv = aes_iv or os.urandom(16)
+    text = json.dumps(json_data).encode('utf-8')
+    plain = bytearray([17])
+    ilint_encode(len(text), plain)
+    plain += text
+    padder = sym_padding.PKCS7(128).padder()
+    plain = padder.update(bytes(plain)) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(aes_key), modes.CBC(aes_iv)).encryptor()
+    cipher_text = encryptor.update(plain) + encryptor.finalize()
+    public_key = x509.load_pem_x509_certificate(certificate.public_certificate).public_key()
+    oaep = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA1()), algorithm=hashes.SHA1(), label=None)
+    return EncryptedTextModel(
+        cipher='AES256',
+        cipherText=base64.urlsafe_b64encode(cipher_text).decode(),
+        readingKeys=[ReadingKeyModel(
+            encryptedKey=base64.urlsafe_b64encode(public_key.encrypt(aes_key, oaep)).decode(),
+            encryptedIV=base64.urlsafe_b64encode(public_key.encrypt(aes_iv, oaep)).decode(),
+            publicKeyHash=certificate.pub_key_hash,
+            readerId=certificate.key_id
+        )]
+    )
+
+
+class TestJsonDocumentDecryptor(BaseTest) :
+    def setUp(self) :
+        super().setUp()
+        self.certificate = PKCS12Certificate(path=self.cert_path, password=self.cert_pass)
+        key, iv = b'k' * 32, b'i' * 16
+        self.documents = [{'number': i} for i in range(20)]
+        self.encrypted = [encrypt_json(self.certificate, d, key, iv) for d in self.documents]
+
+    def test_decode_with(self) :
+        self.assertEqual(self.encrypted[3].decode_with(self.certificate), self.documents[3])
+
+    def test_open_with(self) :
+        document = {'items': [{'number': i, 'text': 'x' * i} for i in range(500)]}
+        encrypted = encrypt_json(self.certificate, document)
+        with encrypted.open_with(self.certificate, chunk_size=64) as f :
+            first = f.read(10)
+            self.assertEqual(first, b'{"items": ')
+            self.assertEqual(json.loads(first + f.read()), document)
+        self.assertEqual(encrypted.decode_with(self.certificate), document)
+
+    def test_open_json_text_chunks(self) :
+        key, iv = b'k' * 32, b'i' * 16
+        encrypted = encrypt_json(self.certificate, self.documents, key, iv)
+        chunks = (encrypted.cipherText[i:i+9] for i in range(0, len(encrypted.cipherText), 9))
+        self.assertEqual(json.load(open_json_text(chunks, key, iv, chunk_size=16)), self.documents)
+
+    def test_decrypt_many_in_process(self) :
+        decryptor = JsonDocumentDecryptor(self.certificate, max_workers=0)
+        records = [JsonDocumentRecordModel(createdAt='2020-01-01T00:00:00+00:00', encryptedJson=e) for e in self.encrypted[:5]]
+        self.assertEqual(decryptor.decrypt_many(records), self.documents[:5])
+        # Each encrypted item has its own RSA-wrapped copy of the same key
+        self.assertEqual(decryptor.key_cache.stats.misses, 5)
+        self.assertEqual(decryptor.decrypt(self.encrypted[0]), self.documents[0])
+        self.assertEqual(decryptor.key_cache.stats.hits, 1)
+
+    def test_decrypt_many_process_pool(self) :
+        with JsonDocumentDecryptor(self.certificate, max_workers=2, min_batch_size=4) as decryptor :
+            self.assertEqual(decryptor.decrypt_many(self.encrypted, chunksize=3), self.documents)
+
+    def test_not_authorized(self) :
+        encrypted = self.encrypted[0]
+        encrypted.readingKeys[0].readerId = 'Key!other#SHA1'
+        with self.assertRaises(ValueError) :
+            JsonDocumentDecryptor(self.certificate, max_workers=0).decrypt(encrypted)
+        with self.assertRaises(TypeError) :
+            JsonDocumentDecryptor(self.certificate, max_workers=0).decrypt('text')
@@ -0,0 +1,153 @@
+import io
+import datetime
+
+from pyiltags.standard import ILStringTag, ILTagArrayTag, ILTagSequenceTag, ILStandardTagFactory
+from pyilint import ilint_decode
+
+from .util import *
+
+from il2_rest.models import DataModel, RecordModel
+from il2_rest.payloads import *
+
+
+class TestPayloadHeaders(BaseTest) :
+    # Tag 300 with {version: 0, apps: [4]} (see RestChain.add_record_unpacked)
+    payload = bytes([248, 52, 7, 5, 0, 0, 20, 2, 1, 4])
+
+    def test_ilint(self) :
+        for data in [bytes([5]), bytes([247]), bytes([248, 0]), bytes([248, 52]), bytes([249, 1, 0]), bytes([255]) + bytes(range(1, 9))] :
+            self.assertEqual(ilint_decode_at(data), (ilint_decode(data)[0], len(data)))
+        with self.assertRaises(ValueError) :
+            ilint_decode_at(bytes([249, 1]))
+
+    def test_iltag_header(self) :
+        self.assertEqual(iltag_header_at(self.payload), (300, 3, 7))
+        self.assertEqual(iltag_header_at(bytes([4, 0, 0])), (4, 1, 2))
+        self.assertEqual(iltag_header_at(bytes([10, 249, 1, 0])), (10, 1, 3))
+        self.assertEqual(iltag_header_at(bytes([17, 2]) + b'ab'), (17, 2, 2))
+
+    def test_decode_list(self) :
+        payloads = [self.payload, bytes([17, 3]) + b'abc', bytes([16, 0]), bytes([248, 52, 7, 5, 0, 0, 20, 2, 1, 8])]
+        headers = decode_payload_headers(payloads)
+        self.assertEqual(len(headers), 4)
+        self.assertEqual(list(headers.tag_ids), [300, 17, 16, 300])
+        self.assertEqual(list(headers.lengths), [7, 3, 0, 7])
+        self.assertEqual(bytes(headers.value(1)), b'abc')
+        self.assertEqual([bytes(v) for t, v in headers][3], bytes([5, 0, 0, 20, 2, 1, 8]))
+        self.assertEqual(headers.indexes_of(300), [0, 3])
+
+    def test_decode_generator(self) :
+        payloads = [self.payload, bytes([17, 3]) + b'abc']
+        headers = decode_payload_headers(payload for payload in payloads)
+        self.assertEqual(list(headers.tag_ids), [300, 17])
+        self.assertEqual(bytes(headers.value(1)), b'abc')
+
+    def test_decode_buffer(self) :
+        buffer = bytes([17, 1]) + b'x' + self.payload
+        headers = decode_payload_headers(memoryview(buffer), [0, 3])
+        self.assertEqual(list(headers.tag_ids), [17, 300])
+        self.assertEqual(list(headers.offsets), [2, 6])
+
+    def test_truncated(self) :
+        for payload in [self.payload[:-1], b'', bytes([248])] :
+            with self.assertRaises(ValueError) :
+                decode_payload_headers([payload, bytes([16, 0])])
+
+
+class TestPayloadCodec(BaseTest) :
+    apps_model = DataModel.from_json({
+        'payloadName': 'AppPermissions',
+        'payloadTagId': 300,
+        'dataFields': [
+            {'name': 'Version', 'tagId': 5},
+            {'name': 'Apps', 'tagId': 20},
+        ],
+    })
+
+    model = DataModel.from_json({
+        'payloadName': 'Document',
+        'payloadTagId': 1000,
+        'dataFields': [
+            {'name': 'Version', 'tagId': 5},
+            {'name': 'Title', 'tagId': 17},
+            {'name': 'CreatedAt', 'tagId': 10, 'cast': 'DateTime'},
+            {'name': 'Author', 'tagId': 1001, 'subDataFields': [
+                {'name': 'Name', 'tagId': 17},
+                {'name': 'Age', 'tagId': 4},
+            ]},
+            {'name': 'Tags', 'tagId': 21, 'elementTagId': 17},
+            {'name': 'Blob', 'tagId': 16, 'isOpaque': True, 'isOptional': True},
+            {'name': 'Comment', 'tagId': 17, 'isOptional': True},
+        ],
+    })
+
+    values = {
+        'Version': 1,
+        'Title': 'Título',
+        'CreatedAt': datetime.datetime(2020, 2, 13, 19, 1, 37, tzinfo=datetime.timezone.utc),
+        'Author': {'Name': 'Ana', 'Age': -2},
+        'Tags': ['a', 'bc'],
+        'Blob': None,
+        'Comment': 'ok',
+    }
+
+    def test_example_payload(self) :
+        codec = PayloadCodec(self.apps_model)
+        payload = TestPayloadHeaders.payload
+        self.assertEqual(codec.decode(payload), {'Version': 0, 'Apps': [4]})
+        self.assertEqual(codec.encode_body({'Version': 0, 'Apps': [4]}), payload[3:])
+        self.assertEqual(codec.encode({'Version': 0, 'Apps': [4]}), payload)
+        self.assertEqual(codec.decode_record(RecordModel(createdAt=datetime.datetime.now(datetime.timezone.utc), payloadBytes=payload)), {'Version': 0, 'Apps': [4]})
+
+    def test_round_trip(self) :
+        codec = compile_data_models([self.apps_model, self.model])[1000]
+        payload = codec.encode(self.values)
+        self.assertEqual(codec.decode(payload), self.values)
+        self.assertEqual(codec.field_names, ['Version', 'Title', 'CreatedAt', 'Author', 'Tags', 'Blob', 'Comment'])
+        # Standard tags encoded as pyiltags does
+        writer = io.BytesIO()
+        ILStringTag(value='Título').serialize(writer)
+        self.assertIn(writer.getvalue(), payload)
+
+    def test_sequences_match_pyiltags(self) :
+        model = DataModel.from_json({
+            'payloadName': 'Lists',
+            'payloadTagId': 1002,
+            'dataFields': [
+                {'name': 'Sequence', 'tagId': 22},
+                {'name': 'Array', 'tagId': 21},
+                {'name': 'Nested', 'tagId': 22},
+            ],
+        })
+        codec = PayloadCodec(model)
+        strings = lambda : [ILStringTag(value='ab'), ILStringTag(value='cd')]
+        writer = io.BytesIO()
+        for tag in [ILTagSequenceTag(strings()), ILTagArrayTag(strings()), ILTagSequenceTag([ILTagSequenceTag(strings())])] :
+            tag.serialize(writer)
+        body = writer.getvalue()
+        values = {'Sequence': ['ab', 'cd'], 'Array': ['ab', 'cd'], 'Nested': [['ab', 'cd']]}
+        self.assertEqual(codec.decode_body(body), values)
+        self.assertEqual(codec.encode_body(values), body)
+        # The nested list is encoded as a sequence readable by pyiltags
+        reader = io.BytesIO(codec.encode_body(values))
+        tags = [ILStandardTagFactory().deserialize(reader) for _ in range(3)]
+        self.assertEqual([t.value for t in tags[2][0]], ['ab', 'cd'])
+
+    def test_optional(self) :
+        codec = PayloadCodec(self.model)
+        values = dict(self.values, Comment=None)
+        del values['Blob']
+        body = codec.encode_body(values)
+        # Trailing absent fields are not written
+        self.assertEqual(codec.decode_body(body), {k: v for k, v in values.items() if v is not None})
+        with self.assertRaises(ValueError) :
+            codec.encode_body(dict(self.values, Title=None))
+        with self.assertRaises(ValueError) :
+            codec.decode_body(body[:3])
+
+    def test_wrong_tag(self) :
+        codec = PayloadCodec(self.apps_model)
+        with self.assertRaises(ValueError) :
+            codec.decode(bytes([248, 52, 3, 4, 0, 0]))
+        with self.assertRaises(ValueError) :
+            codec.decode(bytes([17, 0]))
@@ -3,6 +3,21 @@ import unittest
 from .client_test import *
 from .models_test import *
 from .util_test import *
+from .documents_test import *
+from .cache_test import *
+from .jsonstore_test import *
+from .mirror_test import *
+from .index_test import *
+from .interlocks_test import *
+from .verify_test import *
+from .payloads_test import *
+from .catalog_test import *
+from .follow_test import *
+from .export_test import *
+from .importer_test import *
+from .cli_test import *
+from .imports_test import *
+from .broker_test import *
 
         
 
@@ -1,3 +1,7 @@
+import os
+import base64
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
 from .util import *
 
 from il2_rest.util import *
@@ -55,6 +59,57 @@ class TestSimpleUri(BaseTest):
     
     
 
+class TestLimitedRangeSet(BaseTest) :
+    def test_merge(self) :
+        ranges = LimitedRangeSet(['[10-19]', '[30-39]', 50])
+        self.assertEqual(str(ranges), '[10-19], [30-39], [50]')
+        ranges.add(LimitedRange(20, end=25))
+        ranges.add('[45-49]')
+        self.assertEqual(str(ranges), '[10-25], [30-39], [45-50]')
+        ranges.add('[0-100]')
+        self.assertEqual(str(ranges), '[0-100]')
+        self.assertEqual(ranges.count, 101)
+
+    def test_queries(self) :
+        ranges = LimitedRangeSet(['[10-19]', '[30-39]'])
+        for value, expected in [(9, False), (10, True), (19, True), (20, False), (35, True), (40, False)] :
+            self.assertEqual(value in ranges, expected)
+        self.assertIn(LimitedRange(31, 5), ranges)
+        self.assertNotIn(LimitedRange(15, end=31), ranges)
+        self.assertTrue(ranges.overlaps(LimitedRange(0, end=10)))
+        self.assertTrue(ranges.overlaps('[15-35]'))
+        self.assertFalse(ranges.overlaps('[20-29]'))
+        self.assertFalse(ranges.overlaps(40))
+        self.assertFalse(LimitedRangeSet().overlaps(1))
+
+    def test_union_difference(self) :
+        a = LimitedRangeSet(['[10-19]', '[30-39]'])
+        b = LimitedRangeSet(['[15-32]', '[50]'])
+        self.assertEqual(str(a | b), '[10-39], [50]')
+        self.assertEqual(str(a - b), '[10-14], [33-39]')
+        self.assertEqual(str(b - a), '[20-29], [50]')
+        self.assertEqual(a - a, LimitedRangeSet())
+        self.assertEqual(str(a), '[10-19], [30-39]')
+
+
+class TestChunkedDecryption(BaseTest) :
+    def test_b64_decode_chunks(self) :
+        data = os.urandom(1000)
+        text = base64.urlsafe_b64encode(data).decode()
+        self.assertEqual(b''.join(b64_decode_chunks(text, chunk_size=7)), data)
+        self.assertEqual(b''.join(b64_decode_chunks(text[i:i+5] for i in range(0, len(text), 5))), data)
+        self.assertEqual(b''.join(b64_decode_chunks(text.rstrip('='))), data)
+
+    def test_aes_decrypt_chunks(self) :
+        key, iv = os.urandom(32), os.urandom(16)
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+        data = os.urandom(16 * 100)
+        encrypted = encryptor.update(data) + encryptor.finalize()
+        chunks = [encrypted[i:i+10] for i in range(0, len(encrypted), 10)]
+        self.assertEqual(b''.join(aes_decrypt_chunks(chunks, key, iv)), aes_decrypt(encrypted, key, iv))
+        self.assertEqual(ChunksReader(aes_decrypt_chunks(chunks, key, iv)).readall(), data)
+
+
 #@unittest.SkipTest
 class TestPKCS12Certificate(BaseTest):
     def test_open_certificate(self):
@@ -66,3 +121,21 @@ class TestPKCS12Certificate(BaseTest):
         self.assertIsInstance(certificate.public_exponent, int)
         self.assertIsInstance(certificate.public_modulus, int)
 
+
+    def test_memoized_properties(self) :
+        certificate = PKCS12Certificate(path=self.cert_path, password = self.cert_pass)
+        self.assertIs(certificate.key_id, certificate.key_id)
+        self.assertIs(certificate.pub_key_hash, certificate.pub_key_hash)
+        self.assertIs(certificate.private_key, certificate.private_key)
+        x509 = certificate.public_certificate_in_x509
+        self.assertNotIn(b'\n', x509)
+        self.assertNotIn(b'CERTIFICATE', x509)
+
+    def test_registry(self) :
+        PKCS12Certificate.clear_registry()
+        certificate = PKCS12Certificate.load(self.cert_path, self.cert_pass)
+        self.assertIs(PKCS12Certificate.load(self.cert_path, self.cert_pass), certificate)
+        with self.assertRaises(ValueError) :
+            PKCS12Certificate.load(self.cert_path, 'wrong password')
+        PKCS12Certificate.clear_registry()
+        self.assertIsNot(PKCS12Certificate.load(self.cert_path, self.cert_pass), certificate)
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+
+from .util import *
+from .mirror_test import _RecordsChain
+
+from il2_rest.enumerations import HashAlgorithms
+from il2_rest.verify import *
+
+
+def record_bytes(record) :
+    return f'{record.serial}:{record.applicationId}'.encode() + record.payloadBytes
+
+def hash_text(data, algorithm='SHA256') :
+    return base64.urlsafe_b64encode(hashlib.new(algorithm.lower(), data).digest()).decode().rstrip('=') + '#' + algorithm
+
+
+class _HashedChain(_RecordsChain) :
+    def __init__(self, count) :
+        super().__init__(count)
+        for item in self.records_json :
+            item['hash'] = hash_text(f'{item["serial"]}:{item["applicationId"]}'.encode() + b'\x01\x02\x03')
+
+
+class TestParseHash(BaseTest) :
+    def test_parse(self) :
+        digest, algorithm = parse_hash(hash_text(b'abc', 'SHA512'))
+        self.assertEqual(algorithm, HashAlgorithms.SHA512)
+        self.assertEqual(digest, compute_hash(b'abc', HashAlgorithms.SHA512))
+        for text in ['abc', 'abc#MD5', 'YWJj#SHA256', None] :
+            with self.assertRaises(ValueError) :
+                parse_hash(text)
+
+
+class TestChainVerifier(BaseTest) :
+    def test_structure(self) :
+        chain = _HashedChain(30)
+        result = ChainVerifier(chain, page_size=7).verify()
+        self.assertTrue(result.ok)
+        self.assertEqual(result.verified, 30)
+        self.assertEqual(result.last_serial, 29)
+        self.assertFalse(result.hashes_verified)
+        self.assertIn('hashes not checked', str(result))
+        del chain.records_json[12]
+        result = ChainVerifier(chain, page_size=7).verify(last_serial=28)
+        self.assertEqual(result.broken_serial, 12)
+        self.assertEqual(result.verified, 12)
+
+    def test_hashes(self) :
+        chain = _HashedChain(40)
+        result = ChainVerifier(chain, hasher=record_bytes, max_workers=0, batch_size=4).verify()
+        self.assertTrue(result.ok)
+        self.assertTrue(result.hashes_verified)
+        self.assertEqual(str(result), '40 records verified (last serial: 39)')
+        chain.records_json[25]['applicationId'] = 9
+        result = ChainVerifier(chain, hasher=record_bytes, max_workers=0, batch_size=4).verify()
+        self.assertEqual(result.broken_serial, 25)
+        self.assertEqual(result.last_serial, 24)
+
+    def test_hashes_process_pool(self) :
+        chain = _HashedChain(40)
+        chain.records_json[17]['applicationId'] = 9
+        chain.records_json[30]['hash'] = 'invalid'
+        result = ChainVerifier(chain, hasher=record_bytes, max_workers=2, batch_size=5).verify(first_serial=3)
+        self.assertEqual(result.broken_serial, 17)
+        self.assertEqual(result.verified, 14)